@@ -5,11 +5,12 @@ import sys
 import signal
 
 from sadbot.app import App
+from sadbot.async_app import AsyncApp
 from sadbot.message import Message
 from sadbot import config
 
 
-__all__ = ["App", "Message", "run"]
+__all__ = ["App", "AsyncApp", "Message", "run"]
 
 
 def run() -> None:
@@ -23,6 +24,14 @@ def run() -> None:
         print(msg)
         sys.exit(0)
 
+    # the forked processes inherit it, so they exit cleanly on a stop too
     signal.signal(signal.SIGINT, handler)
-
-    App(token)
+    signal.signal(signal.SIGTERM, handler)
+
+    engine = os.getenv("ENGINE") or config.ENGINE
+    if engine == "asyncio":
+        AsyncApp(token)
+    elif engine == "multiprocessing":
+        App(token)
+    else:
+        sys.exit(f"Unknown engine: {engine}")
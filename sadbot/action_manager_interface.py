@@ -21,3 +21,6 @@ class ActionManagerInterface:
 
     def get_message_and_actions(self) -> Optional[List[List]]:
         """Returns the manager's actions"""
+
+    def get_scheduled_actions(self, job_data: Dict) -> Optional[List[List]]:
+        """Returns the actions of one of the manager's jobs, once it's due"""
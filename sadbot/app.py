@@ -1,6 +1,5 @@
 """This module contains the main app class and friends"""
 
-import datetime
 import glob
 import json
 import logging
@@ -10,10 +9,7 @@ import sqlite3
 import time
 from dataclasses import asdict, is_dataclass
 from os.path import basename, dirname, isfile, join
-from typing import Any, Dict, List, Optional
-from multiprocessing.managers import DictProxy
-
-import requests
+from typing import Any, Dict, List, Optional, cast
 
 from sadbot.message import (
     Message,
@@ -30,11 +26,11 @@ from sadbot.config import (
     OFFLINE_ANTIFLOOD_TIMEOUT,
     UPDATES_TIMEOUT,
     UPDATE_PROCESSING_MAX_TIMEOUT,
+    UPDATE_WORKERS_NUMBER,
+    OUTGOING_WORKERS_NUMBER,
     OUTGOING_REQUESTS_TIMEOUT,
-    MESSAGES_CHAT_RATE_NUMBER,
-    MESSAGES_CHAT_RATE_PERIOD,
-    MESSAGES_USER_RATE_NUMBER,
-    MESSAGES_USER_RATE_PERIOD,
+    RATE_LIMIT_MAX_DELAY,
+    RATE_LIMITER_PERSISTENCE_INTERVAL,
 )
 from sadbot.bot_action import (
     BotAction,
@@ -56,7 +52,7 @@ from sadbot.bot_action import (
     BOT_ACTION_TYPE_EDIT_MESSAGE_TEXT,
     # BOT_ACTION_PRIORITY_LOW,
     BOT_ACTION_PRIORITY_MEDIUM,
-    BOT_ACTION_PRIORITY_HIGH,
+    # BOT_ACTION_PRIORITY_HIGH,
 )
 from sadbot.command_interface import (
     BOT_HANDLER_TYPE_NEW_USER,
@@ -68,6 +64,23 @@ from sadbot.command_interface import (
 )
 from sadbot.chat_permissions import ChatPermissions
 from sadbot.classes.group_configs import GroupConfigs
+from sadbot.classes.file_cache import FileCache
+from sadbot.classes.chat_members import ChatMembers
+from sadbot.classes.assets import Assets
+from sadbot.classes.download_manager import DownloadManager
+from sadbot.classes.scheduler import Scheduler
+from sadbot.classes.asset_registry import (
+    AssetRegistry,
+    ASSET_FILE_TYPES,
+    get_sent_file,
+)
+from sadbot.worker_pool import WorkerPool
+from sadbot.bot_api import BotApi, UploadFile, is_wrong_file_id_error
+from sadbot.database import Database
+from sadbot.regex_sandbox import RegexSandbox
+from sadbot.command_dispatcher import CommandDispatcher
+from sadbot.outgoing_queue import OutgoingQueue
+from sadbot.rate_limiter import RateLimiter
 
 CHAT_MEMBER_STATUS_CREATOR = 0
 CHAT_MEMBER_STATUS_ADMIN = 1
@@ -76,6 +89,15 @@ CHAT_MEMBER_STATUS_LEFT = 3
 CHAT_MEMBER_STATUS_BANNED = 4  # kicked
 CHAT_MEMBER_STATUS_RESTRICTED = 5
 
+# the chat member updates have to be explicitly requested
+ALLOWED_UPDATES = [
+    "message",
+    "edited_message",
+    "callback_query",
+    "chat_member",
+    "my_chat_member",
+]
+
 
 def snake_to_pascal_case(snake_str: str):
     """Converts a given snake_case string to PascalCase"""
@@ -110,23 +132,43 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
     def __init__(self, token: str) -> None:
         logging.basicConfig(filename="sadbot.log", level=logging.WARNING)
         logging.info("Started sadbot")
-        self.base_url = f"https://api.telegram.org/bot{token}/"
-        self.base_file_url = f"https://api.telegram.org/file/bot{token}/"
+        self.bot_api = BotApi(token)
         self.user = self.get_me()
         self.update_id = None
-        self.classes: Dict[str, object] = {"App": self}
-        con = sqlite3.connect("./messages.db", check_same_thread=False)
+        self.classes: Dict[str, object] = {"App": self, "BotApi": self.bot_api}
+        self.file_cache = FileCache(self.bot_api)
+        self.classes["FileCache"] = self.file_cache
+        self.chat_members = ChatMembers(self.bot_api)
+        self.classes["ChatMembers"] = self.chat_members
+        self.database = Database("./messages.db")
+        self.classes["Database"] = self.database
+        # the classes asking for a connection get the per process/thread proxy
+        con = cast(sqlite3.Connection, self.database)
         self.classes["Connection"] = con
-        self.message_repository = MessageRepository(con)
+        self.regex_sandbox = RegexSandbox()
+        self.classes["RegexSandbox"] = self.regex_sandbox
+        self.message_repository = MessageRepository(self.database, self.regex_sandbox)
         self.classes["MessageRepository"] = self.message_repository
         self.group_configs = GroupConfigs(con)
+        self.rate_limiter = RateLimiter(con)
+        self.assets = Assets()
+        self.classes["Assets"] = self.assets
+        self.asset_registry = AssetRegistry(con)
+        self.classes["AssetRegistry"] = self.asset_registry
+        self.download_manager = DownloadManager(con)
+        self.classes["DownloadManager"] = self.download_manager
+        self.scheduler = Scheduler(con)
+        self.classes["Scheduler"] = self.scheduler
         self.classes["GroupConfigs"] = self.group_configs
+        self.command_dispatcher = CommandDispatcher()
+        self.classes["CommandDispatcher"] = self.command_dispatcher
         self.managers: Dict[str, object] = {}
         self.commands: List[Dict] = []
         self.command_list: List[str] = []
-        self.updates_workers: Dict[float, multiprocessing.Process] = {}
-        self.manager = multiprocessing.Manager()
-        self.outgoing_messages: DictProxy[float, List] = self.manager.dict()
+        self.updates_pool = WorkerPool(
+            self.handle_update, UPDATE_WORKERS_NUMBER, UPDATE_PROCESSING_MAX_TIMEOUT
+        )
+        self.outgoing_queue = OutgoingQueue(OUTGOING_WORKERS_NUMBER)
         self.load_commands()
         self.load_managers()
         self.start_bot()
@@ -142,6 +184,8 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
         if command_class.__init__.__class__.__name__ == "function":
             arguments_list = command_class.__init__.__annotations__
             for argument_name in arguments_list:
+                if argument_name == "return":
+                    continue
                 dependency_class_name = arguments_list[argument_name].__name__
                 if dependency_class_name in self.classes or self.load_class(
                     f"sadbot.classes.{pascal_to_snake_case(dependency_class_name)}",
@@ -165,17 +209,19 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
             if not self.load_class(f"sadbot.commands.{command_name}", class_name):
                 continue
             command_class = self.classes[class_name]
-            self.commands.append(
-                {
-                    "regex": getattr(command_class, "command_regex"),
-                    "class": command_class,
-                    "command_name": command_name,
-                    "compiled_regex": re.compile(
-                        getattr(command_class, "command_regex"), re.DOTALL
-                    ),
-                }
-            )
+            command = {
+                "regex": getattr(command_class, "command_regex"),
+                "class": command_class,
+                "command_name": command_name,
+                "compiled_regex": re.compile(
+                    getattr(command_class, "command_regex"), re.DOTALL
+                ),
+            }
+            self.commands.append(command)
+            if getattr(command_class, "handler_type") == BOT_HANDLER_TYPE_MESSAGE:
+                self.command_dispatcher.add_command(command)
             self.command_list.append(class_name)
+        self.command_dispatcher.start()
 
     def load_managers(self) -> None:
         """Loads the bot managers"""
@@ -191,72 +237,17 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
 
     def get_me(self):
         """Get information about the bot"""
-        api_method = "getMe"
-        try:
-            req = requests.post(
-                f"{self.base_url}{api_method}",
-                timeout=OUTGOING_REQUESTS_TIMEOUT,
-            )
-        except requests.exceptions.RequestException as c_exception:
-            logging.error("An error occurred sending the getChatMember request")
-            logging.error(c_exception)
-            return None
-        if not req.ok:
-            logging.error("Failed sending message - details: %s", req.json())
-            return None
-        return json.loads(req.content)
-
-    def get_chat_permissions_api_json(
-        self, chat_id: int, user_id: Optional[int] = None
-    ) -> Optional[Dict]:
-        """Returns the json list of a chat or a user's permissions"""
-        data = {"chat_id": chat_id}
-        api_method = "getChat"
-        if user_id is not None:
-            api_method = "getChatMember"
-            data.update({"user_id": user_id})
-        try:
-            req = requests.post(
-                f"{self.base_url}{api_method}",
-                data=data,
-                timeout=OUTGOING_REQUESTS_TIMEOUT,
-            )
-        except requests.exceptions.RequestException as c_exception:
-            logging.error("An error occurred sending the getChatMember request")
-            logging.error(c_exception)
-            return None
-        if not req.ok:
-            logging.error("Failed sending message - details: %s", req.json())
-            return None
-        return json.loads(req.content)
+        return self.bot_api.request("getMe")
 
     def get_chat_administrators(self, chat_id: int) -> Optional[Dict]:
         """Gets all the chat administrators"""
-        data = {"chat_id": chat_id}
-        api_method = "getChatAdministrators"
-        try:
-            req = requests.post(
-                f"{self.base_url}{api_method}",
-                data=data,
-                timeout=OUTGOING_REQUESTS_TIMEOUT,
-            )
-
-        except requests.exceptions.RequestException:
-            logging.error("An error occured sending the getChatAdministrators request")
-            return None
-        if not req.ok:
-            logging.error("Failed sending message - details: %s", req.json())
-            return None
-        return json.loads(req.content)
+        return self.bot_api.request("getChatAdministrators", {"chat_id": chat_id})
 
     def get_user_status_and_permissions(  # pylint: disable=too-many-return-statements
         self, chat_id: int, user_id: int
     ) -> Optional[List]:
         """Returns a list containing the user status and its permissions if there is any"""
-        data = self.get_chat_permissions_api_json(chat_id, user_id)
-        if data is None or "result" not in data:
-            return None
-        data = data["result"]
+        data = self.chat_members.get_chat_member(chat_id, user_id)
         if data is None or "status" not in data:
             return None
         status = data["status"]
@@ -293,12 +284,10 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
 
     def get_chat_permissions(self, chat_id: int) -> Optional[ChatPermissions]:
         """Returns the default chat permissions"""
-        data = self.get_chat_permissions_api_json(chat_id)
-        if data is None:
-            return None
-        if "result" not in data or "permissions" not in data["result"]:
+        data = self.chat_members.get_chat(chat_id)
+        if data is None or "permissions" not in data:
             return None
-        permissions = data["result"]["permissions"]
+        permissions = data["permissions"]
         return ChatPermissions(
             can_send_messages=permissions.get("can_send_messages", False),
             can_send_media_messages=permissions.get("can_send_media_messages", False),
@@ -324,39 +313,47 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
             trigger_message, sent_message, callback_manager_info
         )
 
-    def get_managers_actions(self) -> Optional[List[List]]:
-        """Returns the managers actions"""
+    def get_managers_actions(self) -> List[List]:
+        """Returns the actions of the managers jobs that are due, a job is removed
+        only once it's been run, the failed ones are run again later"""
         actions = []
-        for manager in self.managers.items():
-            temp = getattr(manager[1], "get_actions")()
-            if temp:
-                actions.append(temp)
-        if not actions:
-            return None
+        for job in self.scheduler.get_due_jobs():
+            manager = self.managers.get(job.manager)
+            if manager is None:
+                logging.error("Unknown manager of a scheduled job: %s", job.manager)
+                self.scheduler.complete(job)
+                continue
+            try:
+                job_actions = getattr(manager, "get_scheduled_actions")(job.data)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("An error occurred running a job of %s", job.manager)
+                self.scheduler.retry(job)
+                continue
+            self.scheduler.complete(job)
+            if job_actions:
+                actions += job_actions
         return actions
 
     def get_updates(self, offset: Optional[int] = None) -> Optional[Dict]:
         """Retrieves updates from the Telegram API"""
-        url = f"{self.base_url}getUpdates?timeout={UPDATES_TIMEOUT}"
+        data = {
+            "timeout": UPDATES_TIMEOUT,
+            "allowed_updates": json.dumps(ALLOWED_UPDATES),
+        }
         if offset:
-            url = f"{url}&offset={offset + 1}"
-        try:
-            req = requests.get(url, timeout=UPDATES_TIMEOUT)
-        except requests.exceptions.RequestException as c_exception:
-            logging.error("An error occurred sending the getUpdates request")
-            logging.error(c_exception)
-            return None
-        if not req.ok:
-            logging.error(
-                "Failed to retrieve updates from server - details: %s", req.json()
-            )
-            return None
-        return json.loads(req.content)
+            data.update({"offset": offset + 1})
+        return self.bot_api.request(
+            "getUpdates", data, timeout=UPDATES_TIMEOUT + OUTGOING_REQUESTS_TIMEOUT
+        )
 
-    def send_message_and_update_db(
-        self, message: Message, reply_info: BotAction
-    ) -> Optional[Dict]:
-        """Sends a messages and updates the database if it's successfully sent"""
+    def get_send_wait(
+        self, message: Message, reply_info: BotAction, delay: float
+    ) -> Optional[float]:
+        """Takes the rate limits tokens of an outgoing action: returns 0 if it can be
+        sent now, otherwise the seconds to wait before trying again, or None if it
+        has to be dropped. The delay is how long it has already waited: it's only
+        dropped for waiting too long on the bot's own antiflood limits, Telegram's
+        limits just delay it"""
         if (
             message.message_time is not None
             and message.message_time != 0
@@ -365,31 +362,26 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
         ):
             logging.warning("Dropping message: I am too late")
             return None
-        user_trigger_time = self.message_repository.get_n_timestamp_user(
-            message.sender_id, MESSAGES_USER_RATE_NUMBER
-        )
-        chat_trigger_time = self.message_repository.get_n_timestamp_chat(
-            message.chat_id, MESSAGES_CHAT_RATE_NUMBER
+        wait, is_antiflood = self.rate_limiter.acquire(
+            message, reply_info, is_bot_action_message(reply_info.reply_type)
         )
-        self.message_repository.log_bot_trigger(message.chat_id, message.sender_id)
-        now = datetime.datetime.utcnow().timestamp()
-        if reply_info.reply_priority != BOT_ACTION_PRIORITY_HIGH:
-            if user_trigger_time > now - MESSAGES_USER_RATE_PERIOD:
-                logging.error(
-                    "Message not sent: user trigger limit exceeded - details: "
-                    "user id=%s user last trigger time=%s",
-                    message.sender_id,
-                    user_trigger_time,
-                )
-                return None
-            if chat_trigger_time > now - MESSAGES_CHAT_RATE_PERIOD:
-                logging.warning(
-                    "Message not sent: chat trigger limit exceeded - details: "
-                    "chat id=%s chat last trigger time=%s",
-                    message.chat_id,
-                    chat_trigger_time,
-                )
-                return None
+        if wait == 0:
+            return 0
+        if is_antiflood and delay + wait > RATE_LIMIT_MAX_DELAY:
+            logging.warning(
+                "Message not sent: rate limit exceeded - details: "
+                "chat id=%s user id=%s wait=%s",
+                message.chat_id,
+                message.sender_id,
+                wait,
+            )
+            return None
+        return wait
+
+    def send_message_and_update_db(
+        self, message: Message, reply_info: BotAction
+    ) -> Optional[Dict]:
+        """Sends a messages and updates the database if it's successfully sent"""
         chat_id = (
             message.chat_id
             if reply_info.reply_chat_id is None
@@ -405,6 +397,18 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
                     reply_info.reply_callback_manager_info,
                 )
             return None
+        if (
+            reply_info.reply_type
+            in [
+                BOT_ACTION_TYPE_BAN_USER,
+                BOT_ACTION_TYPE_UNBAN_USER,
+                BOT_ACTION_TYPE_RESTRICT_CHAT_MEMBER,
+                BOT_ACTION_TYPE_PROMOTE_CHAT_MEMBER,
+            ]
+            and reply_info.reply_ban_user_id is not None
+        ):
+            # the bot changed the chat member, the cached one is stale
+            self.chat_members.invalidate(chat_id, reply_info.reply_ban_user_id)
         # this needs to be done better, along with the storage for non-text messages
         if sent_message.get("result") and is_bot_action_message(reply_info.reply_type):
             result = sent_message.get("result", {})
@@ -454,7 +458,7 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
         """Sends a message"""
         logging.info("Sending message")
         data: Dict[str, Any] = {"chat_id": chat_id}
-        files = None
+        files: Optional[Dict[str, Any]] = None
         reply_text = reply.reply_text
         if reply.reply_type == BOT_ACTION_TYPE_NONE:
             return None
@@ -469,21 +473,25 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
             reply_text = reply_text[: reply_text[:MAX_REPLY_LENGTH_TEXT].rfind("\n")]
         elif reply_text is not None and len(reply_text) > MAX_REPLY_LENGTH_MEDIA:
             reply_text = reply_text[: reply_text[:MAX_REPLY_LENGTH_MEDIA].rfind("\n")]
+        # the media may be uploaded from a file, or sent by its file id instead
+        stored_media = (
+            reply.reply_media_path is not None
+            or reply.reply_asset is not None
+            or reply.reply_download is not None
+        )
         if reply.reply_type == BOT_ACTION_TYPE_REPLY_TEXT:
             api_method = "sendMessage"
             if reply_text is None:
                 return None
             data.update({"text": reply_text})
-        elif (
-            reply.reply_type == BOT_ACTION_TYPE_REPLY_IMAGE
-            and reply.reply_image is not None
+        elif reply.reply_type == BOT_ACTION_TYPE_REPLY_IMAGE and (
+            reply.reply_image is not None or stored_media
         ):
             api_method = "sendPhoto"
             files = {"photo": reply.reply_image}
             data.update({"caption": reply_text})
-        elif (
-            reply.reply_type == BOT_ACTION_TYPE_REPLY_VIDEO
-            and reply.reply_video is not None
+        elif reply.reply_type == BOT_ACTION_TYPE_REPLY_VIDEO and (
+            reply.reply_video is not None or stored_media
         ):
             api_method = "sendVideo"
             files = {"video": reply.reply_video}
@@ -491,16 +499,14 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
         elif reply.reply_type == BOT_ACTION_TYPE_REPLY_VIDEO_ONLINE:
             api_method = "sendVideo"
             data.update({"video": reply.reply_online_media_url, "caption": reply_text})
-        elif (
-            reply.reply_type == BOT_ACTION_TYPE_REPLY_AUDIO
-            and reply.reply_audio is not None
+        elif reply.reply_type == BOT_ACTION_TYPE_REPLY_AUDIO and (
+            reply.reply_audio is not None or stored_media
         ):
             api_method = "sendAudio"
             files = {"audio": reply.reply_audio}
             data.update({"caption": reply_text})
-        elif (
-            reply.reply_type == BOT_ACTION_TYPE_REPLY_FILE
-            and reply.reply_file is not None
+        elif reply.reply_type == BOT_ACTION_TYPE_REPLY_FILE and (
+            reply.reply_file is not None or stored_media
         ):
             api_method = "sendDocument"
             files = {"file": reply.reply_file}
@@ -508,9 +514,8 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
         elif reply.reply_type == BOT_ACTION_TYPE_REPLY_PHOTO_ONLINE:
             api_method = "sendPhoto"
             data.update({"photo": reply.reply_online_photo_url, "caption": reply_text})
-        elif (
-            reply.reply_type == BOT_ACTION_TYPE_REPLY_VOICE
-            and reply.reply_voice is not None
+        elif reply.reply_type == BOT_ACTION_TYPE_REPLY_VOICE and (
+            reply.reply_voice is not None or stored_media
         ):
             api_method = "sendVoice"
             files = {"voice": reply.reply_voice}
@@ -604,29 +609,83 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
             data.update({"allow_sending_without_reply": True})
         if reply.reply_spoiler:
             data.update({"has_spoiler": "True"})
-        try:
-            if files is not None:
-                req = requests.post(
-                    f"{self.base_url}{api_method}",
-                    data=data,
-                    files=files,
-                    timeout=OUTGOING_REQUESTS_TIMEOUT,
+        if files is not None and reply.reply_media_path is not None:
+            files = {
+                next(iter(files)): UploadFile(
+                    reply.reply_media_path, reply.reply_media_name
                 )
-            else:
-                req = requests.post(
-                    f"{self.base_url}{api_method}",
-                    data=data,
-                    timeout=OUTGOING_REQUESTS_TIMEOUT,
-                )
-        except requests.exceptions.RequestException as c_exception:
-            logging.error("An error occurred sending the message request")
-            logging.error(c_exception)
-            return None
+            }
+        # the asset is only sent when the media itself isn't given
+        if (
+            reply.reply_asset is not None
+            and files is not None
+            and None in files.values()
+        ):
+            sent_message = self.send_asset(api_method, data, files, reply.reply_asset)
+        elif reply.reply_download is not None and files is not None:
+            sent_message = self.send_download(
+                api_method, data, files, reply.reply_download
+            )
+        else:
+            sent_message = self.bot_api.request(api_method, data, files)
         logging.info("Sent message")
-        if not req.ok:
-            logging.error("Failed sending message - details: %s", req.json())
+        return sent_message
+
+    def send_asset(
+        self, api_method: str, data: Dict[str, Any], files: Dict, asset: str
+    ) -> Optional[Dict]:
+        """Sends an asset by its file id, uploading it only the first time"""
+        file_info = self.asset_registry.get_file_id(asset)
+        if file_info is not None:
+            file_id, file_type = file_info
+            # a gif sent as a video comes back as an animation, which can only be
+            # sent again as an animation
+            asset_method, field = ASSET_FILE_TYPES[file_type]
+            sent_message, error = self.bot_api.request_with_error(
+                asset_method, {**data, field: file_id}
+            )
+            if not is_wrong_file_id_error(error):
+                return sent_message
+            # the file id has been invalidated, uploading it again
+            self.asset_registry.delete_file_id(asset)
+        if self.asset_registry.get_asset_version(asset) is None:
+            logging.error("Missing asset %s", asset)
             return None
-        return json.loads(req.content)
+        field = next(iter(files))
+        sent_message = self.bot_api.request(
+            api_method, data, {field: UploadFile(asset)}
+        )
+        sent_file = get_sent_file(sent_message)
+        if sent_file is not None:
+            self.asset_registry.set_file_id(asset, *sent_file)
+        return sent_message
+
+    def send_download(
+        self, api_method: str, data: Dict[str, Any], files: Dict, key: str
+    ) -> Optional[Dict]:
+        """Uploads a download, or sends it by its file id if it's been uploaded"""
+        if None not in files.values():
+            sent_message = self.bot_api.request(api_method, data, files)
+            sent_file = get_sent_file(sent_message)
+            if sent_file is not None:
+                self.download_manager.set_file_id(key, *sent_file)
+            return sent_message
+        file_info = self.download_manager.get_file_id(key)
+        if file_info is None:
+            return None
+        file_id, file_type = file_info
+        download_method, field = ASSET_FILE_TYPES[file_type]
+        sent_message, error = self.bot_api.request_with_error(
+            download_method, {**data, field: file_id}
+        )
+        if is_wrong_file_id_error(error):
+            # the file id has been invalidated, the next request downloads it
+            self.download_manager.delete_file_id(key)
+        return sent_message
+
+    def run_command(self, command: Dict, message: Message) -> Optional[List[BotAction]]:
+        """Runs a bot command and returns its reply"""
+        return command["class"].get_reply(message)
 
     def get_replies(self, message: Message) -> Optional[List]:
         """Checks if a bot command is triggered and gets its reply"""
@@ -635,42 +694,43 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
         if not text:
             return None
         actions: List[BotAction] = []
-        disabled_plugins = self.group_configs.get_group_config(
-            chat_id, "disabled_plugins"
-        )
-        for command in self.commands:
-            if (
-                isinstance(disabled_plugins, list)
-                and command["command_name"] in disabled_plugins
-            ):
+        disabled_plugins = self.group_configs.get_disabled_plugins(chat_id)
+        for command in self.command_dispatcher.get_candidates(text):
+            if command["command_name"] in disabled_plugins:
                 continue
-            if command["class"].handler_type == BOT_HANDLER_TYPE_MESSAGE:
-                try:
-                    if re.fullmatch(command["compiled_regex"], text):
-                        reply_message = command["class"].get_reply(message)
-                        if reply_message is None:
-                            continue
-                        actions += reply_message
-                except re.error:
-                    return None
+            try:
+                if not re.fullmatch(command["compiled_regex"], text):
+                    self.command_dispatcher.count(command, False)
+                    continue
+            except re.error:
+                return None
+            start_time = time.time()
+            reply_message = self.run_command(command, message)
+            self.command_dispatcher.count(command, True, time.time() - start_time)
+            if reply_message is None:
+                continue
+            actions += reply_message
         return actions
 
     def send_message_queue(self, message: Message, reply_info: BotAction) -> None:
         """Adds an outgoing messages to the queue"""
-        self.outgoing_messages.update({time.time(): [message, reply_info]})
+        self.outgoing_queue.put(message, reply_info)
 
-    def handle_outgoing_messages(self) -> None:
-        """Handles the outgoing messages queue"""
+    def handle_outgoing_messages(self, shard: int) -> None:
+        """Handles a shard of the outgoing messages queue"""
         while True:
-            sent_messages = []
-            for outgoing_message_id, outgoing_message in self.outgoing_messages.items():
-                self.send_message_and_update_db(
-                    outgoing_message[0], outgoing_message[1]
-                )
-                sent_messages.append(outgoing_message_id)
-            for sent_message_id in sent_messages:
-                del self.outgoing_messages[sent_message_id]
-            time.sleep(1)
+            message, reply_info, delay = self.outgoing_queue.get(shard)
+            try:
+                wait = self.get_send_wait(message, reply_info, delay)
+                if wait is None:
+                    continue
+                if wait > 0:
+                    # the other chats of the shard go on meanwhile
+                    self.outgoing_queue.defer(shard, message, reply_info, delay, wait)
+                    continue
+                self.send_message_and_update_db(message, reply_info)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("An error occurred sending a message")
 
     def handle_messages(self, message: Message) -> None:
         """Handles the messages"""
@@ -684,7 +744,7 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
         """Handles new chat members events"""
         for command in self.commands:
             if command["class"].handler_type == BOT_HANDLER_TYPE_NEW_USER:
-                reply_message = command["class"].get_reply(message)
+                reply_message = self.run_command(command, message)
                 if reply_message is None:
                     continue
                 for reply in reply_message:
@@ -704,7 +764,7 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
             if command["class"].handler_type == BOT_HANDLER_TYPE_CALLBACK_QUERY:
                 try:
                     if re.fullmatch(re.compile(command["regex"]), str(message.text)):
-                        reply_message = command["class"].get_reply(message)
+                        reply_message = self.run_command(command, message)
                         if reply_message is None:
                             continue
                         for reply in reply_message:
@@ -717,65 +777,48 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
         """Handles photo messages"""
         for command in self.commands:
             if command["class"].handler_type == BOT_HANDLER_TYPE_DOCUMENT:
-                reply_message = command["class"].get_reply(message)
+                reply_message = self.run_command(command, message)
                 if reply_message is None:
                     continue
                 for reply in reply_message:
                     self.send_message_queue(message, reply)
 
+    def handle_managers_actions(self) -> None:
+        """Queues the actions of the bot managers"""
+        self.rate_limiter.save_if_due()
+        for trigger_message, bot_actions in self.get_managers_actions():
+            if bot_actions is None:
+                continue
+            for bot_action in bot_actions:
+                self.send_message_queue(trigger_message, bot_action)
+
+    def wait_for_managers(self) -> None:
+        """Sleeps until a manager job is due, or the rate limits have to be saved"""
+        self.scheduler.wait(
+            RATE_LIMITER_PERSISTENCE_INTERVAL
+            if RATE_LIMITER_PERSISTENCE_INTERVAL > 0
+            else None
+        )
+
     def handle_managers(self) -> None:
         """Handles the bot managers"""
         while True:
-            time.sleep(1)
-            managers_actions = self.get_managers_actions()
-            if managers_actions is None:
-                continue
-            for manager in managers_actions:
-                for manager_trigger_messages_and_actions in manager:
-                    if manager_trigger_messages_and_actions[1] is None:
-                        continue
-                    for bot_action in manager_trigger_messages_and_actions[1]:
-                        self.send_message_queue(
-                            manager_trigger_messages_and_actions[0], bot_action
-                        )
+            try:
+                self.handle_managers_actions()
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("An error occurred handling the managers")
+            self.wait_for_managers()
 
     def get_file_path_from_id(self, file_id) -> Optional[str]:
         """Retrieves a file path given its id from the Telegram API"""
-        url = f"{self.base_url}getFile?file_id={file_id}"
-        try:
-            req = requests.get(url, timeout=UPDATES_TIMEOUT)
-        except requests.exceptions.RequestException as c_exception:
-            logging.error("An error occurred sending the getFile request")
-            logging.error(c_exception)
+        file_info = self.file_cache.get_file_info(file_id)
+        if file_info is None:
             return None
-        if not req.ok:
-            logging.error(
-                "Failed to retrieve file path from server - details: %s", req.json()
-            )
-            return None
-        data = json.loads(req.content)
-        if "result" not in data or "file_path" not in data["result"]:
-            return None
-        return data["result"]["file_path"]
+        return file_info[0]
 
     def get_file_from_id(self, file_id) -> Optional[bytes]:
-        """Retrieves a file given its id from the Telegram API"""
-        file_path = self.get_file_path_from_id(file_id)
-        if file_path is None:
-            return None
-        url = f"{self.base_file_url}{file_path}"
-        try:
-            req = requests.get(url, timeout=UPDATES_TIMEOUT)
-        except requests.exceptions.RequestException as c_exception:
-            logging.error("An error occurred sending the request")
-            logging.error(c_exception)
-            return None
-        if not req.ok:
-            logging.error(
-                "Failed to retrieve file from server - details: %s", req.json()
-            )
-            return None
-        return req.content
+        """Retrieves a file given its id from the cache or from the Telegram API"""
+        return self.file_cache.get_file(file_id)
 
     def handle_update(  # pylint: disable=too-many-branches, too-many-statements
         self, item
@@ -845,7 +888,8 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
             if "text" in item["edited_message"]:
                 text = item["edited_message"]["text"]
                 message_id = item["edited_message"]["message_id"]
-                self.message_repository.edit_message(message_id, text)
+                chat_id = item["edited_message"]["chat"]["id"]
+                self.message_repository.edit_message(message_id, chat_id, text)
         if "callback_query" in item:
             message = Message(
                 item["callback_query"]["id"],
@@ -858,44 +902,43 @@ class App:  # pylint: disable=too-many-instance-attributes, too-many-public-meth
                 False,
             )
             self.handle_callback_query(message)
-
-    def remove_inactive_workers(self) -> None:
-        """Deletes inactive or expired workers"""
-        inactive_workers = []
-        for worker_id, _worker in self.updates_workers.items():
-            if (
-                # not _worker.is_alive or
-                worker_id + UPDATE_PROCESSING_MAX_TIMEOUT
-                < time.time()
-            ):
-                inactive_workers.append(worker_id)
-        for inactive_worker_id in inactive_workers:
-            self.updates_workers[inactive_worker_id].kill()
-            del self.updates_workers[inactive_worker_id]
+        for update_type in ["chat_member", "my_chat_member"]:
+            if update_type in item:
+                self.chat_members.update_chat_member(
+                    item[update_type]["chat"]["id"],
+                    item[update_type]["new_chat_member"]["user"]["id"],
+                    item[update_type]["new_chat_member"],
+                )
+        if "my_chat_member" in item:
+            # what the bot gets from getChat depends on its own rights in the chat
+            self.chat_members.invalidate_chat(item["my_chat_member"]["chat"]["id"])
 
     def handle_updates(self) -> None:
         """Handles updates"""
+        # the workers are forked here, after the commands have been loaded
+        self.updates_pool.start()
         while True:
-            self.remove_inactive_workers()
+            self.updates_pool.supervise()
             updates = self.get_updates(offset=self.update_id) or {}
             for item in updates.get("result", []):
                 self.update_id = item["update_id"]
                 logging.info("Processing updates")
-                update_worker = multiprocessing.Process(
-                    target=self.handle_update, args=(item,)
-                )
-                self.updates_workers.update({time.time(): update_worker})
-                update_worker.start()
+                self.updates_pool.submit(item)
             time.sleep(1)
 
     def start_bot(self) -> None:
         """Starts the bot"""
-        updates_process = multiprocessing.Process(target=self.handle_updates)
-        outgoing_process = multiprocessing.Process(target=self.handle_outgoing_messages)
-        managers_process = multiprocessing.Process(target=self.handle_managers)
-        updates_process.start()
-        outgoing_process.start()
-        managers_process.start()
-        updates_process.join()
-        outgoing_process.join()
-        managers_process.join()
+        processes = [
+            multiprocessing.Process(target=self.handle_updates),
+            multiprocessing.Process(target=self.handle_managers),
+        ]
+        for shard in range(self.outgoing_queue.shards_number):
+            processes.append(
+                multiprocessing.Process(
+                    target=self.handle_outgoing_messages, args=(shard,)
+                )
+            )
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
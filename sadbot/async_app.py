@@ -0,0 +1,210 @@
+"""This module contains the asyncio engine of the bot"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sadbot.app import App
+from sadbot.bot_action import BotAction
+from sadbot.message import Message
+from sadbot.outgoing_queue import get_destination_chat_id, get_priority_lane
+from sadbot.config import (
+    ASYNC_THREADS_NUMBER,
+    ASYNC_PROCESSES_NUMBER,
+    ASYNC_PROCESS_COMMANDS,
+    UPDATE_PROCESSING_MAX_TIMEOUT,
+)
+
+# the app instance the executor processes inherit when they are forked
+FORKED_APP: Optional["AsyncApp"] = None
+
+
+def run_forked_command(
+    command_name: str, message: Message
+) -> Optional[List[BotAction]]:
+    """Runs a bot command inside an executor process"""
+    if FORKED_APP is None:
+        return None
+    for command in FORKED_APP.commands:
+        if command["command_name"] == command_name:
+            return command["class"].get_reply(message)
+    return None
+
+
+def warm_up() -> None:
+    """Does nothing, it's submitted to the executor processes to fork them"""
+
+
+class AsyncApp(App):  # pylint: disable=too-many-instance-attributes
+    """Asyncio engine: long polling, commands dispatch, outgoing messages and
+    managers are coroutines sharing one event loop, while blocking calls run in a
+    threads executor and CPU-heavy commands in a processes executor"""
+
+    def __init__(self, token: str) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.outgoing_shards: List[asyncio.PriorityQueue] = []
+        self.outgoing_sequence = itertools.count()
+        self.threads_executor: Optional[ThreadPoolExecutor] = None
+        self.processes_executor: Optional[ProcessPoolExecutor] = None
+        self.processes_executor_lock = threading.Lock()
+        self.pending_updates: Set[asyncio.Future] = set()
+        super().__init__(token)
+
+    def start_processes_executor(self) -> None:
+        """Forks the executor processes, the first time before any thread is started"""
+        global FORKED_APP  # pylint: disable=global-statement
+        FORKED_APP = self
+        self.processes_executor = ProcessPoolExecutor(
+            max_workers=ASYNC_PROCESSES_NUMBER,
+            mp_context=multiprocessing.get_context("fork"),
+        )
+        warm_ups = [
+            self.processes_executor.submit(warm_up)
+            for _ in range(ASYNC_PROCESSES_NUMBER)
+        ]
+        for future in warm_ups:
+            future.result()
+
+    def run_command(self, command: Dict, message: Message) -> Optional[List[BotAction]]:
+        """Runs a bot command, CPU-heavy ones are offloaded to the processes"""
+        if (
+            self.processes_executor is None
+            or command["command_name"] not in ASYNC_PROCESS_COMMANDS
+        ):
+            return super().run_command(command, message)
+        executor = self.processes_executor
+        try:
+            future = executor.submit(
+                run_forked_command, command["command_name"], message
+            )
+            return future.result(timeout=UPDATE_PROCESSING_MAX_TIMEOUT)
+        except (FutureTimeoutError, BrokenProcessPool) as error:
+            logging.error("Command %s failed: %r", command["command_name"], error)
+            self.restart_processes_executor(executor)
+            return None
+
+    def restart_processes_executor(self, executor: ProcessPoolExecutor) -> None:
+        """Kills the executor processes, a hung command would hold one of them
+        forever and a dead one breaks the executor, and forks new ones"""
+        with self.processes_executor_lock:
+            # another thread may have restarted it already
+            if self.processes_executor is not executor:
+                return
+            # pylint: disable=protected-access
+            for process in list((executor._processes or {}).values()):
+                process.kill()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.start_processes_executor()
+
+    def send_message_queue(self, message: Message, reply_info: BotAction) -> None:
+        """Adds an outgoing messages to the queue, it's called by executor threads"""
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self.put_outgoing_message, message, reply_info)
+
+    def put_outgoing_message(
+        self, message: Message, reply_info: BotAction, delay: float = 0.0
+    ) -> None:
+        """Adds an outgoing message to its shard, ordered by priority and then FIFO,
+        the delay is how long it has been deferred for"""
+        chat_id = get_destination_chat_id(message, reply_info)
+        self.outgoing_shards[self.outgoing_queue.get_shard(chat_id)].put_nowait(
+            (
+                get_priority_lane(reply_info),
+                next(self.outgoing_sequence),
+                message,
+                reply_info,
+                delay,
+            )
+        )
+
+    async def run_blocking(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Runs a blocking function in the threads executor"""
+        assert self.loop is not None
+        return await self.loop.run_in_executor(self.threads_executor, function, *args)
+
+    def on_update_done(self, future: asyncio.Future) -> None:
+        """Logs the errors occurred processing an update"""
+        self.pending_updates.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("An error occurred processing an update")
+            logging.error(future.exception())
+
+    async def poll_updates(self) -> None:
+        """Long polls the updates and dispatches them"""
+        while True:
+            updates = await self.run_blocking(self.get_updates, self.update_id) or {}
+            for item in updates.get("result", []):
+                self.update_id = item["update_id"]
+                future = asyncio.ensure_future(
+                    self.run_blocking(self.handle_update, item)
+                )
+                self.pending_updates.add(future)
+                future.add_done_callback(self.on_update_done)
+
+    async def send_outgoing_messages(self, shard: int) -> None:
+        """Sends the outgoing messages of a shard as soon as they are queued"""
+        assert self.loop is not None
+        while True:
+            _lane, _sequence, message, reply_info, delay = await self.outgoing_shards[
+                shard
+            ].get()
+            try:
+                wait = await self.run_blocking(
+                    self.get_send_wait, message, reply_info, delay
+                )
+                if wait is None:
+                    continue
+                if wait > 0:
+                    # the other chats of the shard go on meanwhile
+                    self.loop.call_later(
+                        wait,
+                        self.put_outgoing_message,
+                        message,
+                        reply_info,
+                        delay + wait,
+                    )
+                    continue
+                await self.run_blocking(
+                    self.send_message_and_update_db, message, reply_info
+                )
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("An error occurred sending a message")
+
+    async def tick_managers(self) -> None:
+        """Handles the bot managers"""
+        assert self.loop is not None
+        while True:
+            try:
+                await self.run_blocking(self.handle_managers_actions)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("An error occurred handling the managers")
+            # the wait gets a thread of its own, not to hold one of the executor
+            await self.loop.run_in_executor(None, self.wait_for_managers)
+
+    async def run_engine(self) -> None:
+        """Runs the engine coroutines"""
+        self.loop = asyncio.get_running_loop()
+        self.outgoing_shards = [
+            asyncio.PriorityQueue() for _ in range(self.outgoing_queue.shards_number)
+        ]
+        self.threads_executor = ThreadPoolExecutor(max_workers=ASYNC_THREADS_NUMBER)
+        await asyncio.gather(
+            self.poll_updates(),
+            self.tick_managers(),
+            *[
+                self.send_outgoing_messages(shard)
+                for shard in range(len(self.outgoing_shards))
+            ],
+        )
+
+    def start_bot(self) -> None:
+        """Starts the bot"""
+        self.start_processes_executor()
+        asyncio.run(self.run_engine())
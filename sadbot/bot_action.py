@@ -53,3 +53,10 @@ class BotAction:  # pylint: disable=too-many-instance-attributes
     reply_to_message_id: Optional[int] = None
     reply_target_message_id: Optional[int] = None
     reply_spoiler: Optional[bool] = None
+    # path of a static asset, sent by file id once it's been uploaded
+    reply_asset: Optional[str] = None
+    # key of a download, sent by file id once it's been uploaded
+    reply_download: Optional[str] = None
+    # path of a file uploaded as the media, it's streamed from the disk
+    reply_media_path: Optional[str] = None
+    reply_media_name: Optional[str] = None
@@ -0,0 +1,292 @@
+"""This module contains the BotApi class, the Telegram Bot API client"""
+
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, IO, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.fields import RequestField
+from urllib3.util.retry import Retry
+
+from sadbot.config import (
+    BOT_API_URL,
+    OUTGOING_REQUESTS_TIMEOUT,
+    BOT_API_POOL_SIZE,
+    BOT_API_RETRIES,
+    BOT_API_RETRY_BACKOFF,
+)
+
+# the read methods, the methods starting with them are matched too
+IDEMPOTENT_METHODS = ["getUpdates", "getFile", "getChat", "getMe"]
+# the descriptions of the errors given for the file ids that aren't valid anymore
+WRONG_FILE_ID_ERRORS = ["wrong file identifier", "wrong remote file id"]
+
+
+@dataclass
+class UploadFile:
+    """A file uploaded from the disk, it's read while it's sent"""
+
+    path: str
+    name: Optional[str] = None
+
+
+def is_wrong_file_id_error(error: Optional[Dict]) -> bool:
+    """Checks if a Bot API error means that a file id isn't valid anymore"""
+    if error is None or error.get("error_code") != 400:
+        return False
+    description = str(error.get("description", "")).lower()
+    return any(text in description for text in WRONG_FILE_ID_ERRORS)
+
+
+class MultipartBody:
+    """A multipart/form-data request body, read one chunk at a time.
+
+    The fields and the in memory files are encoded right away, the files on the
+    disk are only opened and read while the body is sent, so they're never loaded
+    in memory. The body can be rewound, for the retries."""
+
+    def __init__(self, data: Optional[Dict[str, Any]], files: Dict[str, Any]) -> None:
+        """Encodes the fields and the files"""
+        self.boundary = uuid.uuid4().hex
+        # every part is either some bytes or a file path, along with its size
+        self.parts: List[Tuple[Union[bytes, str], int]] = []
+        for name, value in (data or {}).items():
+            if value is None:
+                continue
+            self.add_bytes(
+                self.get_part_header(name)
+                + (value if isinstance(value, bytes) else str(value).encode())
+                + b"\r\n"
+            )
+        for name, value in files.items():
+            if value is None:
+                continue
+            if isinstance(value, UploadFile):
+                file_name = value.name or os.path.basename(value.path)
+                self.add_bytes(self.get_part_header(name, file_name))
+                self.parts.append((value.path, os.path.getsize(value.path)))
+                self.add_bytes(b"\r\n")
+                continue
+            file_name = getattr(value, "name", None) or name
+            if hasattr(value, "read"):
+                value = value.read()
+            self.add_bytes(self.get_part_header(name, file_name) + value + b"\r\n")
+        self.add_bytes(f"--{self.boundary}--\r\n".encode())
+        self.length = sum(size for _, size in self.parts)
+        self.position = 0
+        self.part_index = 0
+        self.part_offset = 0
+        self.file: Optional[IO] = None
+
+    def add_bytes(self, data: bytes) -> None:
+        """Adds some bytes to the body"""
+        self.parts.append((data, len(data)))
+
+    def get_part_header(self, name: str, file_name: Optional[str] = None) -> bytes:
+        """Returns the header of a part, the names are escaped like requests does,
+        as the file names can be anything (like the titles of the downloads)"""
+        field = RequestField(
+            name, b"", None if file_name is None else str(file_name).replace("/", "_")
+        )
+        field.make_multipart(
+            content_type=None if file_name is None else "application/octet-stream"
+        )
+        return f"--{self.boundary}\r\n{field.render_headers()}".encode()
+
+    def get_content_type(self) -> str:
+        """Returns the content type of the body"""
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        """Returns the size of the body"""
+        return self.length
+
+    def tell(self) -> int:
+        """Returns how much of the body has been read"""
+        return self.position
+
+    def seek(self, position: int, whence: int = os.SEEK_SET) -> int:
+        """Moves to a position of the body"""
+        if whence == os.SEEK_CUR:
+            position += self.position
+        elif whence == os.SEEK_END:
+            position += self.length
+        self.close()
+        self.position = min(max(position, 0), self.length)
+        self.part_index = 0
+        self.part_offset = self.position
+        while (
+            self.part_index < len(self.parts)
+            and self.part_offset >= self.parts[self.part_index][1]
+        ):
+            self.part_offset -= self.parts[self.part_index][1]
+            self.part_index += 1
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads a chunk of the body, at most of the given size"""
+        if size < 0:
+            size = self.length - self.position
+        chunks = []
+        while size > 0 and self.part_index < len(self.parts):
+            part, part_size = self.parts[self.part_index]
+            length = min(size, part_size - self.part_offset)
+            if isinstance(part, bytes):
+                chunk = part[self.part_offset : self.part_offset + length]
+            else:
+                if self.file is None:
+                    self.file = open(  # pylint: disable=consider-using-with
+                        part, mode="rb"
+                    )
+                    self.file.seek(self.part_offset)
+                chunk = self.file.read(length)
+                if len(chunk) != length:
+                    raise OSError(f"{part} changed while it was being sent")
+            chunks.append(chunk)
+            size -= length
+            self.position += length
+            self.part_offset += length
+            if self.part_offset == part_size:
+                self.close()
+                self.part_index += 1
+                self.part_offset = 0
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        """Closes the file being read"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class BotApi:
+    """Telegram Bot API client.
+
+    Every process gets its own keep-alive session, so the connections to the API are
+    pooled and reused, but never shared between forked processes."""
+
+    def __init__(self, token: str) -> None:
+        """Initializes the Bot API client"""
+        api_url = (os.getenv("BOT_API_URL") or BOT_API_URL).rstrip("/")
+        self.base_url = f"{api_url}/bot{token}/"
+        self.base_file_url = f"{api_url}/file/bot{token}/"
+        self.session: Optional[requests.Session] = None
+        self.session_pid: Optional[int] = None
+
+    @staticmethod
+    def get_adapter(status_retries: int) -> HTTPAdapter:
+        """Returns a pooled adapter, retrying the connection failures and the given
+        number of 5xx responses"""
+        retries = Retry(
+            total=BOT_API_RETRIES + status_retries,
+            connect=BOT_API_RETRIES,
+            read=0,
+            status=status_retries,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=None,
+            backoff_factor=BOT_API_RETRY_BACKOFF,
+            raise_on_status=False,
+        )
+        return HTTPAdapter(
+            pool_connections=BOT_API_POOL_SIZE,
+            pool_maxsize=BOT_API_POOL_SIZE,
+            max_retries=retries,
+        )
+
+    def create_session(self) -> requests.Session:
+        """Creates a new session with connection pooling and retries"""
+        # only the failures that guarantee the request wasn't processed are retried,
+        # so that a message is never sent twice: a 5xx from the gateway doesn't, so
+        # those are retried only for the methods that can safely run twice
+        adapter = self.get_adapter(0)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        read_adapter = self.get_adapter(BOT_API_RETRIES)
+        for api_method in IDEMPOTENT_METHODS:
+            session.mount(f"{self.base_url}{api_method}", read_adapter)
+        session.mount(self.base_file_url, read_adapter)
+        return session
+
+    def get_session(self) -> requests.Session:
+        """Returns the session of the current process, (re)creating it after a fork"""
+        if self.session is None or self.session_pid != os.getpid():
+            self.session = self.create_session()
+            self.session_pid = os.getpid()
+        return self.session
+
+    def request(
+        self,
+        api_method: str,
+        data: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        timeout: float = OUTGOING_REQUESTS_TIMEOUT,
+    ) -> Optional[Dict]:
+        """Calls a Bot API method and returns its decoded response, the files can be
+        bytes, readable objects, or UploadFiles, which are streamed from the disk"""
+        return self.request_with_error(api_method, data, files, timeout)[0]
+
+    def request_with_error(
+        self,
+        api_method: str,
+        data: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        timeout: float = OUTGOING_REQUESTS_TIMEOUT,
+    ) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Calls a Bot API method like request, and returns the decoded error the API
+        answered with too, if it failed"""
+        body = None
+        try:
+            if files is not None:
+                body = MultipartBody(data, files)
+                req = self.get_session().post(
+                    f"{self.base_url}{api_method}",
+                    data=body,
+                    headers={"Content-Type": body.get_content_type()},
+                    timeout=timeout,
+                )
+            else:
+                req = self.get_session().post(
+                    f"{self.base_url}{api_method}",
+                    data=data,
+                    timeout=timeout,
+                )
+        except (requests.exceptions.RequestException, OSError) as c_exception:
+            logging.error("An error occurred sending the %s request", api_method)
+            logging.error(c_exception)
+            return None, None
+        finally:
+            if body is not None:
+                body.close()
+        if not req.ok:
+            logging.error("Failed calling %s - details: %s", api_method, req.text)
+            try:
+                return None, json.loads(req.content)
+            except ValueError:
+                return None, None
+        try:
+            return json.loads(req.content), None
+        except ValueError:
+            logging.error("Invalid %s response - details: %s", api_method, req.text)
+            return None, None
+
+    def download_file(
+        self, file_path: str, timeout: float = OUTGOING_REQUESTS_TIMEOUT
+    ) -> Optional[bytes]:
+        """Downloads a file given its path on the Telegram servers"""
+        try:
+            req = self.get_session().get(
+                f"{self.base_file_url}{file_path}", timeout=timeout
+            )
+        except requests.exceptions.RequestException as c_exception:
+            logging.error("An error occurred sending the file request")
+            logging.error(c_exception)
+            return None
+        if not req.ok:
+            logging.error("Failed to retrieve file from server - details: %s", req.text)
+            return None
+        return req.content
@@ -0,0 +1,117 @@
+"""Here is the AssetRegistry class"""
+
+import os
+import sqlite3
+from typing import Dict, Optional, Tuple
+
+# the media types returned by the Bot API, along with the method and the field
+# needed for sending them again by file id
+ASSET_FILE_TYPES = {
+    "animation": ("sendAnimation", "animation"),
+    "video": ("sendVideo", "video"),
+    "photo": ("sendPhoto", "photo"),
+    "audio": ("sendAudio", "audio"),
+    "voice": ("sendVoice", "voice"),
+    "document": ("sendDocument", "document"),
+}
+
+
+def get_asset_file_ids_table_creation_query() -> str:
+    """Returns the asset file ids table creation query"""
+    return """
+    CREATE TABLE IF NOT EXISTS asset_file_ids (
+      Asset    text PRIMARY KEY,
+      Version  text,
+      FileID   text,
+      FileType text
+    )
+    """
+
+
+def get_sent_file(sent_message: Optional[Dict]) -> Optional[Tuple[str, str]]:
+    """Returns the file id and the file type of a sent media message"""
+    if sent_message is None:
+        return None
+    result = sent_message.get("result")
+    if not isinstance(result, dict):
+        return None
+    # an animation also comes with its document, so the order matters
+    for file_type in ASSET_FILE_TYPES:
+        if file_type not in result:
+            continue
+        media = result[file_type]
+        if file_type == "photo":
+            media = media[-1]
+        return media["file_id"], file_type
+    return None
+
+
+class AssetRegistry:
+    """Registry of the Telegram file ids of the static assets.
+
+    Once an asset is uploaded, Telegram gives back a file id that can be used for
+    sending it again without uploading it. The file ids are stored by asset path,
+    along with the size and the mtime of the file, so a replaced asset gets uploaded
+    again."""
+
+    def __init__(self, con: sqlite3.Connection):
+        """Initializes the asset registry"""
+        self.con = con
+        self.con.execute(get_asset_file_ids_table_creation_query())
+        self.con.commit()
+        # asset path -> version, file id, file type
+        self.file_ids: Dict[str, Tuple[str, str, str]] = {}
+
+    @staticmethod
+    def get_asset_version(asset: str) -> Optional[str]:
+        """Returns the version of an asset, None if it doesn't exist"""
+        try:
+            stat = os.stat(asset)
+        except OSError:
+            return None
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def get_file_id(self, asset: str) -> Optional[Tuple[str, str]]:
+        """Returns the file id and the file type of an asset, if it's been uploaded"""
+        version = self.get_asset_version(asset)
+        if version is None:
+            return None
+        if asset in self.file_ids and self.file_ids[asset][0] == version:
+            return self.file_ids[asset][1:]
+        cur = self.con.cursor()
+        cur.execute(
+            "SELECT FileID, FileType FROM asset_file_ids WHERE Asset = ? AND Version = ?",
+            [asset, version],
+        )
+        data = cur.fetchone()
+        if data is None:
+            return None
+        self.file_ids[asset] = (version, data[0], data[1])
+        return data[0], data[1]
+
+    def set_file_id(self, asset: str, file_id: str, file_type: str) -> None:
+        """Registers the file id of an uploaded asset"""
+        version = self.get_asset_version(asset)
+        if version is None:
+            return
+        self.file_ids[asset] = (version, file_id, file_type)
+        query = """
+        INSERT INTO asset_file_ids (
+          Asset,
+          Version,
+          FileID,
+          FileType
+        ) VALUES (?, ?, ?, ?)
+        ON CONFLICT (Asset) DO UPDATE SET
+          Version = excluded.Version,
+          FileID = excluded.FileID,
+          FileType = excluded.FileType
+        """
+        self.con.execute(query, [asset, version, file_id, file_type])
+        self.con.commit()
+
+    def delete_file_id(self, asset: str) -> None:
+        """Forgets the file id of an asset"""
+        self.file_ids.pop(asset, None)
+        self.con.execute("DELETE FROM asset_file_ids WHERE Asset = ?", [asset])
+        self.con.commit()
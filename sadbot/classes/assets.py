@@ -0,0 +1,114 @@
+"""Here are the Assets and the TextCorpus classes"""
+
+import json
+import logging
+import os
+import random
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sadbot.config import ASSETS_DIRECTORY
+
+
+class TextCorpus:
+    """Sections of texts packed in a single string.
+
+    A few big objects instead of hundreds of thousands of small ones: they're
+    cheaper in memory, and the forked processes share them without the reference
+    counting touching (and copying) every page."""
+
+    def __init__(self, sections: List[List[str]]) -> None:
+        """Packs the texts"""
+        texts: List[str] = []
+        self.offsets = array("Q", [0])
+        self.sections = array("Q", [0])
+        for section in sections:
+            for text in section:
+                texts.append(text)
+                self.offsets.append(self.offsets[-1] + len(text))
+            self.sections.append(len(texts))
+        self.text = "".join(texts)
+
+    def get_sections_number(self) -> int:
+        """Returns the number of sections"""
+        return len(self.sections) - 1
+
+    def get_section_length(self, section: int) -> int:
+        """Returns the number of texts in a section"""
+        return self.sections[section + 1] - self.sections[section]
+
+    def get_text(self, section: int, index: int) -> Optional[str]:
+        """Returns a text given its section and its index in the section"""
+        if not 0 <= section < self.get_sections_number():
+            return None
+        if not 0 <= index < self.get_section_length(section):
+            return None
+        position = self.sections[section] + index
+        return self.text[self.offsets[position] : self.offsets[position + 1]]
+
+    def get_random_position(self) -> Tuple[int, int]:
+        """Returns a random section and a random index in it"""
+        section = random.randrange(self.get_sections_number())
+        return section, random.randrange(self.get_section_length(section))
+
+    def get_random_text(self) -> str:
+        """Returns a random text, picking any of them with the same probability"""
+        position = random.randrange(len(self.offsets) - 1)
+        return self.text[self.offsets[position] : self.offsets[position + 1]]
+
+
+class Assets:
+    """Index of the files in the assets folders and of the parsed text corpora.
+
+    The folders are indexed when the bot starts, and the commands load their
+    corpora in their constructors, so everything is ready before the workers get
+    forked and it's shared with them."""
+
+    def __init__(self) -> None:
+        """Initializes the assets index"""
+        self.files: Dict[str, List[str]] = {}
+        self.corpora: Dict[str, TextCorpus] = {}
+        self.index_folders()
+
+    def index_folders(self) -> None:
+        """Indexes the files of every assets folder"""
+        self.files = {}
+        with os.scandir(ASSETS_DIRECTORY) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
+                self.files[folder.name] = sorted(
+                    os.path.join(ASSETS_DIRECTORY, folder.name, entry.name)
+                    for entry in os.scandir(folder.path)
+                    if entry.is_file()
+                )
+
+    def get_files(self, folder: str) -> List[str]:
+        """Returns the paths of the files in an assets folder"""
+        return self.files.get(folder, [])
+
+    def get_random_file(self, folder: str) -> Optional[str]:
+        """Returns the path of a random file in an assets folder"""
+        files = self.get_files(folder)
+        if not files:
+            return None
+        return random.choice(files)
+
+    def get_corpus(
+        self, asset: str, parser: Callable[[object], List[List[str]]]
+    ) -> Optional[TextCorpus]:
+        """Returns a text corpus given its JSON asset path, relative to the assets
+        folder, parsing it the first time with the given parser"""
+        if asset in self.corpora:
+            return self.corpora[asset]
+        try:
+            with open(
+                os.path.join(ASSETS_DIRECTORY, asset), mode="r", encoding="utf-8"
+            ) as asset_file:
+                corpus = TextCorpus(parser(json.load(asset_file)))
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logging.error("Failed loading the corpus %s", asset)
+            logging.error(error)
+            return None
+        self.corpora[asset] = corpus
+        return corpus
@@ -1,9 +1,18 @@
 """Here is the captcha class"""
+
+import logging
+import multiprocessing
+import queue
 import sqlite3
+import time
 from typing import Optional, Tuple, List
 import random
+import numpy
 from PIL import Image, ImageFont, ImageDraw
 
+from sadbot.migrations import migrate
+from sadbot.image_effects import encode_image
+
 from sadbot.config import (
     CAPTCHA_BACKGROUND_COLOR,
     CAPTCHA_TEXT_COLOR,
@@ -26,6 +35,7 @@ from sadbot.config import (
     CAPTCHA_LINES_START_FROM_BORDER,
     CAPTCHA_USE_BORDER_LINEAR_RANDOMNESS,
     CAPTCHA_LINE_WIDTH,
+    CAPTCHA_POOL_SIZE,
 )
 
 
@@ -40,6 +50,18 @@ def get_captcha_table_creation_query() -> str:
     """
 
 
+def get_captcha_migrations() -> List[List[str]]:
+    """Returns the captchas table migrations"""
+    return [
+        [
+            """
+            CREATE INDEX IF NOT EXISTS captchas_captcha
+            ON captchas (CaptchaID)
+            """,
+        ],
+    ]
+
+
 class Captcha:
     """Captcha class"""
 
@@ -47,6 +69,14 @@ class Captcha:
         """Initializes the captcha class"""
         self.con = con
         self.con.execute(get_captcha_table_creation_query())
+        migrate(self.con, "captchas", get_captcha_migrations())
+        self.font: Optional[ImageFont.FreeTypeFont] = None
+        # the captchas are rendered ahead of time by a background process
+        self.pool: multiprocessing.Queue = multiprocessing.Queue(
+            max(1, CAPTCHA_POOL_SIZE)
+        )
+        if CAPTCHA_POOL_SIZE > 0:
+            multiprocessing.Process(target=self.fill_pool, daemon=True).start()
 
     @staticmethod
     def get_random_color() -> Tuple[int, int, int]:
@@ -119,11 +149,15 @@ class Captcha:
         """Returns the text used for the captcha"""
         return "".join(random.choice(CAPTCHA_CHARACTERS) for _ in range(CAPTCHA_LENGTH))
 
-    def get_captcha(self, captcha_id: str) -> Tuple[str, Image.Image]:
-        """Returns a tuble containing the captcha text and its image"""
-        captcha_text = self.get_captcha_string()
+    def get_captcha(self, captcha_id: str) -> Tuple[str, bytes]:
+        """Returns a tuble containing the captcha text and its JPEG image, taking it
+        from the pool if there's one ready"""
+        try:
+            captcha_text, captcha_image = self.pool.get_nowait()
+        except queue.Empty:
+            captcha_text, captcha_image = self.render_captcha()
         self.insert_captcha_into_db(captcha_id, captcha_text)
-        return captcha_text, self.get_captcha_image(captcha_text)
+        return captcha_text, captcha_image
 
     def insert_captcha_into_db(self, captcha_id: str, captcha_text: str) -> None:
         """Inserts a message into the database"""
@@ -186,7 +220,8 @@ class Captcha:
             else CAPTCHA_DOTS_COLOR
         )
         piece_width = int(CAPTCHA_WIDTH / CAPTCHA_LENGTH)
-        font = ImageFont.truetype(CAPTCHA_FONT, CAPTCHA_FONT_SIZE)
+        if self.font is None:
+            self.font = ImageFont.truetype(CAPTCHA_FONT, CAPTCHA_FONT_SIZE)
         image = Image.new("RGB", (CAPTCHA_WIDTH, CAPTCHA_HEIGHT), background_color)
         offset = 0
         for character in captcha_text:
@@ -200,7 +235,7 @@ class Captcha:
                 (CAPTCHA_LETTER_LEFT_PADDING, CAPTCHA_LETTER_TOP_PADDING),
                 character,
                 fill=text_color,
-                font=font,
+                font=self.font,
             )
             character_image = character_image.rotate(
                 random.randint(-CAPTCHA_MAX_ROTATION_ANGLE, CAPTCHA_MAX_ROTATION_ANGLE),
@@ -208,14 +243,20 @@ class Captcha:
             )
             image.paste(character_image, (offset, 0))
             offset += character_image.size[0]
-        for _ in range(0, CAPTCHA_DOTS_NUMBER):
-            draw = ImageDraw.Draw(image)
-            if CAPTCHA_RANDOMIZE_DOTS_COLORS:
-                dots_color = self.get_random_color()
-            draw.point(
-                (random.randint(0, image.width), random.randint(0, image.height)),
-                dots_color,
+        # the dots are drawn all at once, on the pixels array
+        pixels = numpy.array(image)
+        dots = pixels.reshape(-1, 3)
+        positions = numpy.random.default_rng().choice(
+            len(dots), min(CAPTCHA_DOTS_NUMBER, len(dots)), replace=False
+        )
+        if CAPTCHA_RANDOMIZE_DOTS_COLORS:
+            dots[positions] = numpy.random.randint(
+                0, 256, (len(positions), 3), dtype=numpy.uint8
             )
+        else:
+            dots[positions] = dots_color
+        image = Image.fromarray(pixels)
+        draw = ImageDraw.Draw(image)
         for _ in range(0, CAPTCHA_LINES_NUMBER):
             if CAPTCHA_LINES_START_FROM_BORDER:
                 coordinates = self.get_random_border_coordinates()
@@ -229,8 +270,21 @@ class Captcha:
                 y_0 = random.randint(0, CAPTCHA_HEIGHT)
                 x_1 = random.randint(0, CAPTCHA_WIDTH)
                 y_1 = random.randint(0, CAPTCHA_HEIGHT)
-            draw = ImageDraw.Draw(image)
             if CAPTCHA_RANDOMIZE_LINES_COLORS:
                 lines_color = self.get_random_color()
             draw.line((x_0, y_0, x_1, y_1), fill=lines_color, width=CAPTCHA_LINE_WIDTH)
         return image
+
+    def render_captcha(self) -> Tuple[str, bytes]:
+        """Returns a new captcha text and its JPEG image"""
+        captcha_text = self.get_captcha_string()
+        return captcha_text, encode_image(self.get_captcha_image(captcha_text))
+
+    def fill_pool(self) -> None:
+        """Captcha producer main loop: keeps the pool full"""
+        while True:
+            try:
+                self.pool.put(self.render_captcha())
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("An error occurred rendering a captcha")
+                time.sleep(1)
@@ -0,0 +1,133 @@
+"""Here is the ChatMembers class"""
+
+import multiprocessing
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sadbot.bot_api import BotApi
+from sadbot.config import (
+    CHAT_MEMBERS_CACHE_SIZE,
+    CHAT_MEMBERS_CACHE_TTL,
+    CHAT_MEMBERS_VERSION_SLOTS,
+)
+
+# the chat itself is cached along with its members, as the member 0
+CHAT_MEMBERS_CHAT_KEY = 0
+
+
+class ChatMembers:
+    """Short lived cache of the chat members and of the chats default permissions.
+
+    Every process keeps the API results it gets for a while; the chat member
+    updates refresh them, and the chat administrators are cached all at once the
+    first time a chat member is needed, and the least recently used ones are
+    dropped past the cache size. The processes share a table of version
+    counters, one for every (hashed) chat member, so a change seen by one of them
+    (like the bot restricting someone) makes the others ask the API again."""
+
+    def __init__(self, bot_api: BotApi) -> None:
+        """Initializes the chat members cache"""
+        self.bot_api = bot_api
+        self.lock = multiprocessing.Lock()
+        self.versions = multiprocessing.RawArray("Q", CHAT_MEMBERS_VERSION_SLOTS)
+        # (chat id, user id) -> version, expiration time, API result
+        self.members: OrderedDict = OrderedDict()
+        # chat id -> expiration time of its administrators
+        self.administrators: OrderedDict = OrderedDict()
+
+    def get_version_slot(self, chat_id: int, user_id: int) -> int:
+        """Returns the slot of the version counter of a chat member"""
+        return hash((chat_id, user_id)) % CHAT_MEMBERS_VERSION_SLOTS
+
+    def get_cached(self, chat_id: int, user_id: int) -> Optional[Dict]:
+        """Returns a cached result, if it's still valid"""
+        cached = self.members.get((chat_id, user_id))
+        if cached is None:
+            return None
+        version, expiration, data = cached
+        if (
+            version != self.versions[self.get_version_slot(chat_id, user_id)]
+            or expiration < time.time()
+        ):
+            del self.members[(chat_id, user_id)]
+            return None
+        self.members.move_to_end((chat_id, user_id))
+        return data
+
+    def set_cached(
+        self, chat_id: int, user_id: int, data: Dict, version: Optional[int] = None
+    ) -> None:
+        """Caches a result, the version must be read before getting it"""
+        if version is None:
+            version = self.versions[self.get_version_slot(chat_id, user_id)]
+        self.members[(chat_id, user_id)] = (
+            version,
+            time.time() + CHAT_MEMBERS_CACHE_TTL,
+            data,
+        )
+        self.members.move_to_end((chat_id, user_id))
+        if len(self.members) > CHAT_MEMBERS_CACHE_SIZE:
+            self.members.popitem(last=False)
+
+    def invalidate(self, chat_id: int, user_id: int) -> None:
+        """Makes every process ask the API again for a chat member"""
+        slot = self.get_version_slot(chat_id, user_id)
+        with self.lock:
+            self.versions[slot] += 1
+        self.members.pop((chat_id, user_id), None)
+
+    def update_chat_member(self, chat_id: int, user_id: int, data: Dict) -> None:
+        """Updates a chat member from a chat member update"""
+        self.invalidate(chat_id, user_id)
+        self.set_cached(chat_id, user_id, data)
+
+    def invalidate_chat(self, chat_id: int) -> None:
+        """Makes every process ask the API again for a chat"""
+        self.invalidate(chat_id, CHAT_MEMBERS_CHAT_KEY)
+
+    def warm_administrators(self, chat_id: int) -> None:
+        """Caches all the administrators of a chat"""
+        if self.administrators.get(chat_id, 0) > time.time():
+            return
+        self.administrators[chat_id] = time.time() + CHAT_MEMBERS_CACHE_TTL
+        self.administrators.move_to_end(chat_id)
+        if len(self.administrators) > CHAT_MEMBERS_CACHE_SIZE:
+            self.administrators.popitem(last=False)
+        data = self.bot_api.request("getChatAdministrators", {"chat_id": chat_id})
+        if data is None or not isinstance(data.get("result"), list):
+            return
+        for member in data["result"]:
+            user_id = member.get("user", {}).get("id")
+            if user_id is not None and self.get_cached(chat_id, user_id) is None:
+                self.set_cached(chat_id, user_id, member)
+
+    def get_chat_member(self, chat_id: int, user_id: int) -> Optional[Dict]:
+        """Returns the getChatMember result of a chat member"""
+        data = self.get_cached(chat_id, user_id)
+        if data is not None:
+            return data
+        self.warm_administrators(chat_id)
+        data = self.get_cached(chat_id, user_id)
+        if data is not None:
+            return data
+        version = self.versions[self.get_version_slot(chat_id, user_id)]
+        response = self.bot_api.request(
+            "getChatMember", {"chat_id": chat_id, "user_id": user_id}
+        )
+        if response is None or not isinstance(response.get("result"), dict):
+            return None
+        self.set_cached(chat_id, user_id, response["result"], version)
+        return response["result"]
+
+    def get_chat(self, chat_id: int) -> Optional[Dict]:
+        """Returns the getChat result of a chat"""
+        data = self.get_cached(chat_id, CHAT_MEMBERS_CHAT_KEY)
+        if data is not None:
+            return data
+        version = self.versions[self.get_version_slot(chat_id, CHAT_MEMBERS_CHAT_KEY)]
+        response = self.bot_api.request("getChat", {"chat_id": chat_id})
+        if response is None or not isinstance(response.get("result"), dict):
+            return None
+        self.set_cached(chat_id, CHAT_MEMBERS_CHAT_KEY, response["result"], version)
+        return response["result"]
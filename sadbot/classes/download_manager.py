@@ -0,0 +1,257 @@
+"""Here is the DownloadManager class"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import YoutubeDLError
+
+from sadbot.functions import lock_file, acquire_file_slot
+from sadbot.config import (
+    DOWNLOAD_JOBS_NUMBER,
+    DOWNLOAD_QUEUE_TIMEOUT,
+    DOWNLOAD_MAX_SIZE,
+    DOWNLOAD_MAX_DURATION,
+    DOWNLOAD_RESULT_TTL,
+    DOWNLOAD_TIME_MARGIN,
+    UPDATE_PROCESSING_MAX_TIMEOUT,
+    OFFLINE_ANTIFLOOD_TIMEOUT,
+)
+
+# the same download running elsewhere is waited for only as long as there's still
+# time to wait for a slot and to download it, if it fails
+DOWNLOAD_WAIT_TIMEOUT = max(
+    0, UPDATE_PROCESSING_MAX_TIMEOUT - DOWNLOAD_QUEUE_TIMEOUT - DOWNLOAD_TIME_MARGIN
+)
+# a lock file is touched when it's taken, and it's never held for longer than an
+# update is processed, so the older ones can be removed
+DOWNLOAD_LOCK_MAX_AGE = 2 * UPDATE_PROCESSING_MAX_TIMEOUT
+
+
+def get_download_file_ids_table_creation_query() -> str:
+    """Returns the download file ids table creation query"""
+    return """
+    CREATE TABLE IF NOT EXISTS download_file_ids (
+      DownloadKey text PRIMARY KEY,
+      FileID      text,
+      FileType    text
+    )
+    """
+
+
+def get_download_key(kind: str, url: str) -> str:
+    """Returns the key of a download, the same url downloaded as a video and as an
+    audio are two different downloads"""
+    return f"{kind}:{url.strip()}"
+
+
+@dataclass
+class Download:
+    """The result of a download: its path is None if it failed, and if it's already
+    been sent, in which case it's sent again by its file id"""
+
+    key: str
+    path: Optional[str] = None
+    title: Optional[str] = None
+    error: Optional[str] = None
+
+
+class DownloadManager:
+    """Media downloads shared by all the processes.
+
+    Only a few downloads run at the same time, the others wait for a free slot, and
+    the requests of a url that's already being downloaded wait for that download
+    instead of starting their own. The size and the duration of the media are
+    checked before downloading anything. The downloads are kept in a private
+    temporary folder for a while, and the file ids they get once they're sent are
+    stored, so the next requests of the same url are sent without downloading.
+
+    The slots and the urls are locked with file locks: the update workers get
+    killed when they take too long, and a killed process releases them anyway."""
+
+    def __init__(self, con: sqlite3.Connection) -> None:
+        """Initializes the download manager"""
+        self.con = con
+        self.con.execute(get_download_file_ids_table_creation_query())
+        self.con.commit()
+        self.directory = tempfile.mkdtemp(prefix="sadbot-downloads-")
+        self.pid = os.getpid()
+        self.last_cleanup = time.time()
+        atexit.register(self.remove_directory)
+
+    def remove_directory(self) -> None:
+        """Removes the downloads folder when the bot stops"""
+        if os.getpid() == self.pid:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_file_id(self, key: str) -> Optional[Tuple[str, str]]:
+        """Returns the file id and the file type of an already sent download"""
+        cur = self.con.cursor()
+        cur.execute(
+            "SELECT FileID, FileType FROM download_file_ids WHERE DownloadKey = ?",
+            [key],
+        )
+        data = cur.fetchone()
+        if data is None:
+            return None
+        return data[0], data[1]
+
+    def set_file_id(self, key: str, file_id: str, file_type: str) -> None:
+        """Stores the file id of a sent download"""
+        query = """
+        INSERT INTO download_file_ids (
+          DownloadKey,
+          FileID,
+          FileType
+        ) VALUES (?, ?, ?)
+        ON CONFLICT (DownloadKey) DO UPDATE SET
+          FileID = excluded.FileID,
+          FileType = excluded.FileType
+        """
+        self.con.execute(query, [key, file_id, file_type])
+        self.con.commit()
+
+    def delete_file_id(self, key: str) -> None:
+        """Forgets the file id of a download"""
+        self.con.execute("DELETE FROM download_file_ids WHERE DownloadKey = ?", [key])
+        self.con.commit()
+
+    def get_path(self, name: str) -> str:
+        """Returns the path of a file in the downloads folder"""
+        return os.path.join(self.directory, name)
+
+    def remove_old_files(self) -> None:
+        """Removes the downloads kept for longer than needed, the replies they're
+        uploaded by may be sent a while after they're reused for the last time. The
+        lock files are removed once nobody can be holding or waiting for them"""
+        if time.time() - self.last_cleanup < DOWNLOAD_RESULT_TTL:
+            return
+        self.last_cleanup = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("slot"):
+                    continue
+                max_age = (
+                    DOWNLOAD_LOCK_MAX_AGE
+                    if entry.name.endswith(".lock")
+                    else DOWNLOAD_RESULT_TTL + OFFLINE_ANTIFLOOD_TIMEOUT
+                )
+                try:
+                    if entry.stat().st_mtime > time.time() - max_age:
+                        continue
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+
+    def read_result(self, name: str, key: str) -> Optional[Download]:
+        """Returns a recently finished download"""
+        try:
+            with open(
+                self.get_path(f"{name}.json"), mode="r", encoding="utf-8"
+            ) as result_file:
+                result = json.load(result_file)
+            if result["time"] < time.time() - DOWNLOAD_RESULT_TTL:
+                return None
+            if result["path"] is not None:
+                # the file is sent later, it has to last until then
+                os.utime(result["path"])
+            return Download(key, result["path"], result["title"], result["error"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def write_result(self, name: str, result: Download) -> None:
+        """Stores the result of a download for the requests waiting for it"""
+        data = {**asdict(result), "time": time.time()}
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(descriptor, "w", encoding="utf-8") as result_file:
+            json.dump(data, result_file)
+        os.replace(temporary_path, self.get_path(f"{name}.json"))
+
+    @staticmethod
+    def check_limits(info: Dict[str, Any]) -> Optional[str]:
+        """Returns why some media can't be downloaded, if it can't"""
+        if info.get("_type", "video") != "video":
+            return "Only single videos can be downloaded."
+        duration = info.get("duration")
+        if duration is not None and duration > DOWNLOAD_MAX_DURATION:
+            return "The media is too long."
+        size = 0
+        for media_format in info.get("requested_formats") or [info]:
+            size += (
+                media_format.get("filesize") or media_format.get("filesize_approx") or 0
+            )
+        if size > DOWNLOAD_MAX_SIZE:
+            return "The media is too big."
+        return None
+
+    def run_download(self, url: str, options: Dict, name: str, key: str) -> Download:
+        """Downloads some media"""
+        options = {
+            **options,
+            "outtmpl": self.get_path(f"{name}.media.%(ext)s"),
+            "max_filesize": DOWNLOAD_MAX_SIZE,
+            "noplaylist": True,
+            "quiet": True,
+        }
+        with YoutubeDL(options) as ydl:
+            try:
+                info = ydl.extract_info(url, download=False)
+                error = self.check_limits(info)
+                if error is not None:
+                    return Download(key, error=error)
+                info = ydl.process_ie_result(info, download=True)
+            except YoutubeDLError as error:
+                logging.error("Failed downloading %s", url)
+                logging.error(error)
+                return Download(key, error="Something went wrong.")
+        # the postprocessors may change the extension
+        with os.scandir(self.directory) as entries:
+            paths = [
+                entry.path
+                for entry in entries
+                if entry.name.startswith(f"{name}.media.")
+                and not entry.name.endswith((".part", ".ytdl"))
+            ]
+        if not paths:
+            return Download(key, error="Something went wrong.")
+        return Download(key, paths[0], info.get("title"))
+
+    def download(self, url: str, options: Dict, kind: str) -> Download:
+        """Downloads some media with the given yt-dlp options, the kind of the
+        download tells apart the different options used for the same url"""
+        key = get_download_key(kind, url)
+        if self.get_file_id(key) is not None:
+            return Download(key)
+        self.remove_old_files()
+        name = hashlib.sha1(key.encode()).hexdigest()
+        with open(self.get_path(f"{name}.lock"), mode="a", encoding="utf-8") as lock:
+            # someone else may be downloading it already, waiting for it
+            if not lock_file(lock, DOWNLOAD_WAIT_TIMEOUT):
+                return Download(key, error="Something went wrong.")
+            os.utime(lock.fileno())
+            result = self.read_result(name, key)
+            if result is not None:
+                return result
+            # it may have been sent while waiting
+            if self.get_file_id(key) is not None:
+                return Download(key)
+            slot = acquire_file_slot(
+                self.directory, DOWNLOAD_JOBS_NUMBER, DOWNLOAD_QUEUE_TIMEOUT
+            )
+            if slot is None:
+                return Download(key, error="Too many downloads, try again later.")
+            try:
+                result = self.run_download(url, options, name, key)
+            finally:
+                slot.close()
+            self.write_result(name, result)
+            return result
@@ -0,0 +1,186 @@
+"""Here is the FileCache class"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+from sadbot.bot_api import BotApi
+from sadbot.config import (
+    FILE_CACHE_CLEANUP_INTERVAL,
+    FILE_CACHE_DIRECTORY,
+    FILE_CACHE_MAX_IDS,
+    FILE_CACHE_MAX_SIZE,
+    FILE_PATH_VALIDITY,
+    UPDATES_TIMEOUT,
+)
+
+
+def evict_files(
+    directory: str, max_size: int, max_files: Optional[int] = None, min_age: float = 0
+) -> None:
+    """Deletes the least recently used files of a folder until it fits the given
+    size and number of files, the mtime of a file is its last access time. The
+    files used in the last min_age seconds are never deleted"""
+    files = []
+    total_size = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+    files_number = len(files)
+    if max_files is None:
+        max_files = files_number
+    if total_size <= max_size and files_number <= max_files:
+        return
+    files.sort()
+    for mtime, size, path in files:
+        if mtime > time.time() - min_age:
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_size -= size
+        files_number -= 1
+        # leaving some room, so that the next files don't evict again
+        if total_size <= max_size * 0.9 and files_number <= max_files * 0.9:
+            return
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    """Writes a file, so that the other processes never read it half written"""
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(descriptor, "wb") as temporary_file:
+            temporary_file.write(data)
+        os.replace(temporary_path, path)
+    except OSError as error:
+        logging.error("Failed writing the cached file %s", path)
+        logging.error(error)
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+class FileCache:
+    """On-disk LRU cache of the files downloaded from Telegram.
+
+    The files are stored by their file_unique_id, which is the same for every
+    file_id pointing to them, so the processes share them through the disk; the
+    mtime of a file is its last access time. The file paths returned by getFile are
+    kept in memory for as long as Telegram guarantees them, the expired ones are
+    forgotten along with the periodic eviction of the file ids."""
+
+    def __init__(self, bot_api: BotApi):
+        """Initializes the file cache"""
+        self.bot_api = bot_api
+        self.files_directory = os.path.join(FILE_CACHE_DIRECTORY, "files")
+        self.ids_directory = os.path.join(FILE_CACHE_DIRECTORY, "ids")
+        os.makedirs(self.files_directory, exist_ok=True)
+        os.makedirs(self.ids_directory, exist_ok=True)
+        # file id -> file path, file unique id, expiration time
+        self.file_paths: Dict[str, Tuple[str, str, float]] = {}
+        self.last_cleanup = time.time()
+
+    def get_id_path(self, file_id: str) -> str:
+        """Returns where the file unique id of a file id is stored"""
+        return os.path.join(
+            self.ids_directory, hashlib.sha1(file_id.encode()).hexdigest()
+        )
+
+    def get_file_path(self, file_unique_id: str) -> str:
+        """Returns where a file is stored"""
+        return os.path.join(
+            self.files_directory, hashlib.sha1(file_unique_id.encode()).hexdigest()
+        )
+
+    def get_file_unique_id(self, file_id: str) -> Optional[str]:
+        """Returns the file unique id of an already seen file id"""
+        path = self.get_id_path(file_id)
+        try:
+            with open(path, mode="r", encoding="utf-8") as file:
+                file_unique_id = file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return file_unique_id
+
+    def remove_old_entries(self) -> None:
+        """Forgets the expired file paths and evicts the least recently used file
+        ids, every once in a while since it scans the whole ids folder"""
+        if time.time() - self.last_cleanup < FILE_CACHE_CLEANUP_INTERVAL:
+            return
+        self.last_cleanup = time.time()
+        self.file_paths = {
+            file_id: file_info
+            for file_id, file_info in self.file_paths.items()
+            if file_info[2] > self.last_cleanup
+        }
+        # the ids are tiny, so they're capped by their number instead
+        evict_files(self.ids_directory, FILE_CACHE_MAX_SIZE, FILE_CACHE_MAX_IDS)
+
+    def get_file_info(self, file_id: str) -> Optional[Tuple[str, str]]:
+        """Returns the Telegram file path and the file unique id of a file id"""
+        if file_id in self.file_paths:
+            file_path, file_unique_id, expiration = self.file_paths[file_id]
+            if expiration > time.time():
+                return file_path, file_unique_id
+            del self.file_paths[file_id]
+        data = self.bot_api.request(
+            "getFile", {"file_id": file_id}, timeout=UPDATES_TIMEOUT
+        )
+        if data is None or "file_path" not in data.get("result", {}):
+            return None
+        file_path = data["result"]["file_path"]
+        file_unique_id = data["result"]["file_unique_id"]
+        self.file_paths[file_id] = (
+            file_path,
+            file_unique_id,
+            time.time() + FILE_PATH_VALIDITY,
+        )
+        if self.get_file_unique_id(file_id) is None:
+            write_atomically(self.get_id_path(file_id), file_unique_id.encode())
+        self.remove_old_entries()
+        return file_path, file_unique_id
+
+    def read_file(self, file_unique_id: str) -> Optional[bytes]:
+        """Reads a cached file, if there is one"""
+        path = self.get_file_path(file_unique_id)
+        try:
+            with open(path, mode="rb") as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def evict_files(self) -> None:
+        """Deletes the least recently used files until the cache fits its size"""
+        evict_files(self.files_directory, FILE_CACHE_MAX_SIZE)
+
+    def get_file(self, file_id: str) -> Optional[bytes]:
+        """Returns a file given its id, downloading it only if it's not cached"""
+        file_unique_id = self.get_file_unique_id(file_id)
+        if file_unique_id is not None:
+            data = self.read_file(file_unique_id)
+            if data is not None:
+                return data
+        file_info = self.get_file_info(file_id)
+        if file_info is None:
+            return None
+        file_path, file_unique_id = file_info
+        data = self.read_file(file_unique_id)
+        if data is not None:
+            return data
+        data = self.bot_api.download_file(file_path, timeout=UPDATES_TIMEOUT)
+        if data is None:
+            return None
+        write_atomically(self.get_file_path(file_unique_id), data)
+        self.evict_files()
+        return data
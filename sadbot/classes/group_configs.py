@@ -1,7 +1,12 @@
 """Here is the group config class"""
+import copy
 import json
+import multiprocessing
 import sqlite3
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, FrozenSet, Tuple
+
+from sadbot.migrations import migrate
+from sadbot.config import GROUP_CONFIGS_VERSION_SLOTS
 
 
 def get_group_configs_table_creation_query() -> str:
@@ -14,33 +19,113 @@ def get_group_configs_table_creation_query() -> str:
     """
 
 
+def get_group_configs_migrations() -> List[List[str]]:
+    """Returns the group configs table migrations"""
+    return [
+        [
+            """
+            DELETE FROM group_configs
+            WHERE rowid NOT IN (
+              SELECT MAX(rowid)
+              FROM group_configs
+              GROUP BY ChatID
+            )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS group_configs_chat
+            ON group_configs (ChatID)
+            """,
+        ],
+    ]
+
+
 class GroupConfigs:
-    """Group configs class"""
+    """Group configs class.
+
+    Every process keeps the configs it reads in memory. The processes share a table
+    of version counters, one for every (hashed) chat: a write bumps the counter of
+    its chat, so the other processes know they have to read its configs again."""
 
     def __init__(self, con: sqlite3.Connection):
         """Initializes the group configs class"""
         self.con = con
         self.con.execute(get_group_configs_table_creation_query())
+        migrate(self.con, "group_configs", get_group_configs_migrations())
+        self.lock = multiprocessing.Lock()
+        self.versions = multiprocessing.RawArray("Q", GROUP_CONFIGS_VERSION_SLOTS)
+        # chat id -> version, configs, disabled plugins
+        self.cache: Dict[int, Tuple[int, Dict, FrozenSet[str]]] = {}
+
+    def get_version_slot(self, chat_id: int) -> int:
+        """Returns the slot of the version counter of a chat"""
+        return hash(chat_id) % GROUP_CONFIGS_VERSION_SLOTS
+
+    def get_cached_configs(self, chat_id: int) -> Tuple[int, Dict, FrozenSet[str]]:
+        """Returns the up to date cached configs of a chat, reading them if needed"""
+        version = self.versions[self.get_version_slot(chat_id)]
+        cached = self.cache.get(chat_id)
+        if cached is not None and cached[0] == version:
+            return cached
+        # the version is read before the configs, so a write happening meanwhile
+        # makes them stale instead of getting lost
+        configs = self.load_group_configs(chat_id) or {}
+        disabled_plugins = configs.get("disabled_plugins")
+        cached = (
+            version,
+            configs,
+            (
+                frozenset(disabled_plugins)
+                if isinstance(disabled_plugins, list)
+                else frozenset()
+            ),
+        )
+        self.cache[chat_id] = cached
+        return cached
+
+    def invalidate(self, chat_id: int) -> None:
+        """Makes every process read the configs of a chat again"""
+        slot = self.get_version_slot(chat_id)
+        with self.lock:
+            self.versions[slot] += 1
+        self.cache.pop(chat_id, None)
+
+    def get_disabled_plugins(self, chat_id: int) -> FrozenSet[str]:
+        """Returns the plugins disabled in a chat"""
+        return self.get_cached_configs(chat_id)[2]
 
     def get_group_config(self, chat_id: int, config_key: str) -> Optional[Any]:
         """Retrieves a group single config"""
-        configs = self.get_group_configs(chat_id)
-        if configs is None:
-            return None
+        configs = self.get_cached_configs(chat_id)[1]
         if config_key in configs:
-            return configs[config_key]
+            return copy.deepcopy(configs[config_key])
         return None
 
     def set_group_config(self, chat_id: int, config_key: str, config: Any) -> None:
         """Updates a group single config"""
-        group_config = self.get_group_configs(chat_id)
-        if group_config is None:
-            group_config = {}
-        group_config.update({config_key: config})
-        self.set_group_configs(chat_id, group_config)
+        query = """
+          INSERT INTO group_configs (
+            ChatID,
+            GroupConfigs
+          ) VALUES (?, json_object(?, json(?)))
+          ON CONFLICT (ChatID) DO UPDATE SET
+            GroupConfigs = json_set(GroupConfigs, ?, json(?))
+        """
+        config_json = json.dumps(config)
+        path = "$." + json.dumps(config_key)
+        params = [chat_id, config_key, config_json, path, config_json]
+        self.con.execute(query, params)
+        self.con.commit()
+        self.invalidate(chat_id)
 
     def get_group_configs(self, chat_id: int) -> Optional[Dict]:
         """Retrieves a group whole configs"""
+        configs = self.get_cached_configs(chat_id)[1]
+        if not configs:
+            return None
+        return copy.deepcopy(configs)
+
+    def load_group_configs(self, chat_id: int) -> Optional[Dict]:
+        """Reads a group whole configs from the database"""
         cur = self.con.cursor()
         query = """
           SELECT
@@ -57,29 +142,14 @@ class GroupConfigs:
 
     def set_group_configs(self, chat_id: int, group_config: Dict) -> None:
         """Sets (inserts or updates) a group (whole) config"""
-        if self.get_group_configs(chat_id) is not None:
-            return self.update_group_configs(chat_id, group_config)
-        return self.insert_group_configs(chat_id, group_config)
-
-    def update_group_configs(self, chat_id: int, group_config: Dict) -> None:
-        """Updates the group configs"""
-        query = """
-          UPDATE group_configs
-          SET GroupConfigs = ?
-          WHERE ChatID = ?
-        """
-        params = [json.dumps(group_config), chat_id]
-        self.con.execute(query, params)
-        self.con.commit()
-
-    def insert_group_configs(self, chat_id: int, group_config: Dict) -> None:
-        """Inserts the group configs, because they were not yet set"""
         query = """
-          INSERT INTO group_configs(
+          INSERT INTO group_configs (
             ChatID,
             GroupConfigs
           ) VALUES (?, ?)
+          ON CONFLICT (ChatID) DO UPDATE SET GroupConfigs = excluded.GroupConfigs
         """
         params = [chat_id, json.dumps(group_config)]
         self.con.execute(query, params)
         self.con.commit()
+        self.invalidate(chat_id)
@@ -1,54 +1,278 @@
-import easyocr
-from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
-from sadbot.commands import googletrans
+"""Here is the Ocr class"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+from collections import OrderedDict
+from multiprocessing.connection import Client, Connection, Listener
+from typing import IO, Any, List, Optional, Tuple
+
+from PIL import ImageDraw, ImageFont
+
+from sadbot.classes.translation_client import TranslationClient
+from sadbot.functions import LOCK_POLL_INTERVAL, lock_file
+from sadbot.image_effects import open_image, encode_image
+from sadbot.config import (
+    OCR_WORKERS_NUMBER,
+    OCR_READERS_CACHE_SIZE,
+    OCR_MAX_IMAGE_SIZE,
+    OCR_TIME_MARGIN,
+    OCR_TIMEOUT,
+    UPDATE_PROCESSING_MAX_TIMEOUT,
+)
 
 # map user shortcut to the actual language model name
-L_MAP = {
-    'ch': 'ch_sim'
-}
+L_MAP = {"ch": "ch_sim"}
+
+# a detected text box: its corners, in the original image coordinates, and its text
+OcrResult = List[Tuple[List[List[float]], str]]
+
+# a free worker is waited for only as long as there's still time to run the job
+OCR_WAIT_TIMEOUT = max(0, UPDATE_PROCESSING_MAX_TIMEOUT - OCR_TIMEOUT - OCR_TIME_MARGIN)
+# seconds a started worker gets to listen, it loads the models afterwards
+OCR_START_TIMEOUT = 5
+
 
-def get_text(lang: str, photo: bytes) -> str:
-    if lang in L_MAP:
-        lang = L_MAP[lang]
+def get_language(lang: Optional[str]) -> str:
+    """Returns the language model name of a user given language"""
     if not lang:
-        lang = "en" # default
+        return "en"  # default
+    return L_MAP.get(lang, lang)
 
-    reader = easyocr.Reader([lang], gpu=False)
-    result = reader.readtext(photo)
 
-    res = "OCR:\n"
-    for data in result:
-        res += data[1] + '\n'
-    
-    return res
+def run_ocr_worker(  # pylint: disable=too-many-locals
+    address: str, threads_number: int, lock: Optional[IO]
+) -> None:
+    """OCR worker main loop: reads the texts of the images it receives, keeping the
+    most recently used readers loaded. Every job comes with its own connection"""
+    # the lock of the job replacing the worker, it would keep the worker locked
+    if lock is not None:
+        lock.close()
+    # the socket of a dead worker is left behind
+    if os.path.exists(address):
+        os.remove(address)
+    # the worker listens right away, the jobs wait for it to load
+    listener = Listener(address, family="AF_UNIX")
+    # the models are only ever loaded by the OCR workers
+    import easyocr  # pylint: disable=import-outside-toplevel
+    import numpy  # pylint: disable=import-outside-toplevel
+    import torch  # pylint: disable=import-outside-toplevel
 
+    torch.set_num_threads(threads_number)
+    readers: OrderedDict = OrderedDict()
+    while True:
+        with listener.accept() as connection:
+            try:
+                lang, photo = connection.recv()
+            except (EOFError, OSError):
+                continue
+            try:
+                if lang in readers:
+                    readers.move_to_end(lang)
+                else:
+                    readers[lang] = easyocr.Reader([lang], gpu=False)
+                    if len(readers) > OCR_READERS_CACHE_SIZE:
+                        readers.popitem(last=False)
+                image, scale = open_image(photo, OCR_MAX_IMAGE_SIZE)
+                result = [
+                    (
+                        [[float(x) / scale, float(y) / scale] for x, y in box],
+                        str(text),
+                    )
+                    for box, text, _ in readers[lang].readtext(numpy.asarray(image))
+                ]
+                response = (True, result)
+            except Exception as error:  # pylint: disable=broad-except
+                response = (False, str(error))
+            try:
+                connection.send(response)
+            except OSError:
+                # the job timed out, nobody is waiting for it anymore
+                continue
 
-def get_text_and_translate(lang: str, photo: bytes, translator: googletrans.Translator, dest: str, src: str) -> str:
-    if lang in L_MAP:
-        lang = L_MAP[lang]
-    if not lang:
-        lang = "en" # default
 
-    reader = easyocr.Reader([lang], gpu=False)
-    result = reader.readtext(photo)
+class Ocr:
+    """OCR service: a few long-lived workers shared by all the processes.
+
+    The workers are forked when the bot starts, and every one of them keeps its
+    last used readers loaded, so the models are read from disk only once. A job
+    holds its worker until it gets the result: the workers are never more than
+    the cores, and the jobs of a language go to the same worker when it's free.
+    The workers are locked with file locks, which go away with the update workers
+    when they get killed, and every job connects to its worker on its own. The job
+    holding a worker replaces it when it's found dead or when the job times out,
+    so the next job never waits behind an abandoned one."""
+
+    def __init__(self) -> None:
+        """Initializes the OCR service"""
+        cpu_count = os.cpu_count() or 1
+        workers_number = max(1, min(OCR_WORKERS_NUMBER, cpu_count))
+        self.directory = tempfile.mkdtemp(prefix="sadbot-ocr-")
+        self.workers_number = workers_number
+        self.threads_number = max(1, cpu_count // workers_number)
+        self.font: Optional[Any] = None
+        # the workers can be replaced by any process, so their pids are shared
+        self.pids = multiprocessing.RawArray("i", workers_number)
+        self.pid = os.getpid()
+        atexit.register(self.stop_workers)
+        for worker_index in range(workers_number):
+            self.start_worker(worker_index)
+
+    def stop_workers(self) -> None:
+        """Stops the workers and removes their folder when the bot stops, the
+        replaced ones may belong to other processes"""
+        if os.getpid() != self.pid:
+            return
+        for worker_index in range(self.workers_number):
+            self.kill_worker(worker_index)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_address(self, worker_index: int) -> str:
+        """Returns the socket a worker listens on"""
+        return os.path.join(self.directory, f"worker{worker_index}.sock")
 
-    image = Image.open(BytesIO(photo))
-    surface = ImageDraw.Draw(image)
+    def start_worker(self, worker_index: int, lock: Optional[IO] = None) -> None:
+        """Starts a worker and waits for it to listen, its lock must be held"""
+        address = self.get_address(worker_index)
+        if os.path.exists(address):
+            os.remove(address)
+        worker = multiprocessing.Process(
+            target=run_ocr_worker,
+            args=(address, self.threads_number, lock),
+            daemon=True,
+        )
+        worker.start()
+        if worker.pid is not None:
+            self.pids[worker_index] = worker.pid
+        deadline = time.monotonic() + OCR_START_TIMEOUT
+        while not os.path.exists(address) and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
 
-    for data in result:
-        coords = data[0]
-        text = data[1]
-        res = ""
+    def kill_worker(self, worker_index: int) -> None:
+        """Kills a worker, if it's still running"""
+        pid = self.pids[worker_index]
+        # the pid 0 would be the whole process group
+        if pid == 0:
+            return
         try:
-            res = translator.translate(text, dest=dest, src=src).text
-        except ValueError as error:
-            res = str(error)
-        
-        font = ImageFont.truetype("./sadbot/assets/fonts/arialbd.ttf", 32)
-        surface.text((coords[0][0], coords[0][1]), res, font=font, fill="black", stroke_width=4, stroke_fill="#ffffff")
-    
-    out = BytesIO()
-    image.save(out, format="JPEG")
-    return out.getvalue()
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def restart_worker(self, worker: Tuple[int, IO]) -> None:
+        """Kills a worker and starts a new one, given the worker and its held lock"""
+        worker_index, lock = worker
+        self.kill_worker(worker_index)
+        self.start_worker(worker_index, lock)
+
+    def acquire_worker(self, lang: str) -> Optional[Tuple[int, IO]]:
+        """Takes a free worker, the one of the language if it's free, waiting at most
+        OCR_WAIT_TIMEOUT. The worker is released by closing the returned file"""
+        preferred = hash(lang) % self.workers_number
+        workers = list(range(preferred, self.workers_number)) + list(range(preferred))
+        deadline = time.monotonic() + OCR_WAIT_TIMEOUT
+        while True:
+            for worker_index in workers:
+                # every process needs its own file: the forked ones would share the lock
+                lock = open(  # pylint: disable=consider-using-with
+                    os.path.join(self.directory, f"worker{worker_index}.lock"),
+                    mode="a",
+                    encoding="utf-8",
+                )
+                if lock_file(lock, 0):
+                    return worker_index, lock
+                lock.close()
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    def connect(self, worker: Tuple[int, IO]) -> Connection:
+        """Connects to a worker, replacing it if it's dead"""
+        address = self.get_address(worker[0])
+        try:
+            return Client(address, family="AF_UNIX")
+        except OSError as error:
+            logging.error("OCR worker died, restarting it")
+            logging.error(error)
+        self.restart_worker(worker)
+        return Client(address, family="AF_UNIX")
+
+    def run_job(self, worker: Tuple[int, IO], lang: str, photo: bytes) -> Any:
+        """Runs a job on a worker, returns None if it fails or takes too long"""
+        with self.connect(worker) as connection:
+            connection.send((lang, photo))
+            if not connection.poll(OCR_TIMEOUT):
+                logging.warning("Killing OCR worker: the job timed out")
+                self.restart_worker(worker)
+                return None
+            success, result = connection.recv()
+        if not success:
+            logging.error("OCR job failed: %s", result)
+            return None
+        return result
 
+    def read_text(self, lang: Optional[str], photo: bytes) -> Optional[OcrResult]:
+        """Returns the texts found in an image, along with their boxes"""
+        lang = get_language(lang)
+        worker = self.acquire_worker(lang)
+        if worker is None:
+            logging.warning("OCR job dropped: all the workers are busy")
+            return None
+        try:
+            return self.run_job(worker, lang, photo)
+        except (EOFError, OSError) as error:
+            logging.error("OCR worker died")
+            logging.error(error)
+            # the next job would find it dead anyway
+            self.restart_worker(worker)
+            return None
+        finally:
+            worker[1].close()
+
+    def get_text(self, lang: Optional[str], photo: bytes) -> Optional[str]:
+        """Returns the text of an image"""
+        result = self.read_text(lang, photo)
+        if result is None:
+            return None
+        res = "OCR:\n"
+        for _, text in result:
+            res += text + "\n"
+        return res
+
+    def get_text_and_translate(  # pylint: disable=too-many-arguments
+        self,
+        lang: Optional[str],
+        photo: bytes,
+        translation_client: TranslationClient,
+        dest: str,
+        src: str,
+    ) -> Optional[bytes]:
+        """Returns the image with its texts translated on top of them"""
+        result = self.read_text(lang, photo)
+        if result is None:
+            return None
+        try:
+            translations = translation_client.translate_batch(
+                [text for _, text in result], dest, src
+            )
+        except ValueError as error:
+            translations = [str(error)] * len(result)
+        image, scale = open_image(photo)
+        surface = ImageDraw.Draw(image)
+        if self.font is None:
+            self.font = ImageFont.truetype("./sadbot/assets/fonts/arialbd.ttf", 32)
+        for (coords, _), res in zip(result, translations):
+            surface.text(
+                (coords[0][0] * scale, coords[0][1] * scale),
+                res,
+                font=self.font,
+                fill="black",
+                stroke_width=4,
+                stroke_fill="#ffffff",
+            )
+        return encode_image(image)
@@ -3,9 +3,10 @@ import json
 import sqlite3
 import time
 from dataclasses import asdict
-from typing import Optional
+from typing import Optional, List
 
 from sadbot.chat_permissions import ChatPermissions
+from sadbot.migrations import migrate
 
 
 def get_user_permissions_table_creation_query() -> str:
@@ -20,6 +21,26 @@ def get_user_permissions_table_creation_query() -> str:
     """
 
 
+def get_user_permissions_migrations() -> List[List[str]]:
+    """Returns the user permissions table migrations"""
+    return [
+        [
+            """
+            DELETE FROM user_permissions
+            WHERE rowid NOT IN (
+              SELECT MAX(rowid)
+              FROM user_permissions
+              GROUP BY UserID, ChatID
+            )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS user_permissions_user_chat
+            ON user_permissions (UserID, ChatID)
+            """,
+        ],
+    ]
+
+
 class Permissions:
     """Permissions class"""
 
@@ -27,6 +48,7 @@ class Permissions:
         """Initializes the permissions class"""
         self.con = con
         self.con.execute(get_user_permissions_table_creation_query())
+        migrate(self.con, "user_permissions", get_user_permissions_migrations())
 
     def get_user_permissions(
         self, user_id: int, chat_id: int
@@ -69,7 +91,7 @@ class Permissions:
         if permissions.ban_until_date is not None:
             expiration = permissions.ban_until_date
         query = """
-          INSERT INTO user_permissions (
+          INSERT OR REPLACE INTO user_permissions (
             UserID,
             ChatID,
             Permissions,
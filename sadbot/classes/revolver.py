@@ -5,6 +5,7 @@ from typing import List, Optional
 import json
 
 from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_TEXT
+from sadbot.migrations import migrate
 from sadbot.config import REVOLVER_CHAMBERS, REVOLVER_BULLETS
 
 
@@ -19,6 +20,26 @@ def get_revolvers_table_creation_query() -> str:
     """
 
 
+def get_revolvers_migrations() -> List[List[str]]:
+    """Returns the revolvers table migrations"""
+    return [
+        [
+            """
+            DELETE FROM revolvers
+            WHERE rowid NOT IN (
+              SELECT MAX(rowid)
+              FROM revolvers
+              GROUP BY ChatID
+            )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS revolvers_chat
+            ON revolvers (ChatID)
+            """,
+        ],
+    ]
+
+
 class Revolver:
     """This is the revolver class"""
 
@@ -26,6 +47,7 @@ class Revolver:
         """Initializes the revolver class"""
         self.con = con
         self.con.execute(get_revolvers_table_creation_query())
+        migrate(self.con, "revolvers", get_revolvers_migrations())
 
     def update_revolver_data(self, revolver_data: List) -> None:
         """Updates the revolver entry in the db"""
@@ -43,7 +65,7 @@ class Revolver:
     def insert_revolver(self, revolver_data: List) -> None:
         """Inserts a new revolver entry in the db"""
         query = """
-        INSERT INTO revolvers (
+        INSERT OR REPLACE INTO revolvers (
           ChatID,
           Revolver,
           BulletNumber
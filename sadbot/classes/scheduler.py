@@ -0,0 +1,165 @@
+"""Here is the Scheduler class"""
+
+import json
+import logging
+import multiprocessing
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sadbot.migrations import migrate
+from sadbot.config import SCHEDULER_RETRY_DELAY, SCHEDULER_MAX_ATTEMPTS
+
+
+def get_scheduled_jobs_table_creation_query() -> str:
+    """Returns the scheduled jobs table creation query"""
+    return """
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+      Manager   text,
+      JobKey    text,
+      DueTime   real,
+      JobData   text,
+      PRIMARY KEY (Manager, JobKey)
+    )
+    """
+
+
+def get_scheduled_jobs_migrations() -> List[List[str]]:
+    """Returns the scheduled jobs table migrations"""
+    return [
+        [
+            """
+            CREATE INDEX IF NOT EXISTS scheduled_jobs_due_time
+            ON scheduled_jobs (DueTime)
+            """,
+        ],
+        [
+            "ALTER TABLE scheduled_jobs ADD COLUMN Attempts int DEFAULT 0",
+        ],
+    ]
+
+
+@dataclass
+class Job:
+    """A job of a manager, the key tells apart the jobs of the same manager"""
+
+    manager: str
+    key: str
+    due_time: float
+    data: Dict
+    attempts: int = 0
+
+
+class Scheduler:
+    """Deadlines of the bot managers.
+
+    The managers schedule their jobs from any process, the jobs are stored in the
+    database, indexed by their due time, so they survive the restarts. The managers
+    process sleeps until the next job is due, or until a new job is scheduled: the
+    processes scheduling them wake it up through a shared event. A job is removed
+    only once it's been run, and the failed ones are run again a few times."""
+
+    def __init__(self, con: sqlite3.Connection) -> None:
+        """Initializes the scheduler"""
+        self.con = con
+        self.con.execute(get_scheduled_jobs_table_creation_query())
+        migrate(self.con, "scheduled_jobs", get_scheduled_jobs_migrations())
+        self.wakeup = multiprocessing.Event()
+
+    def schedule(self, manager: str, key: str, due_time: float, data: Dict) -> None:
+        """Schedules a job, or moves it if it's already been scheduled"""
+        query = """
+        INSERT INTO scheduled_jobs (
+          Manager,
+          JobKey,
+          DueTime,
+          JobData
+        ) VALUES (?, ?, ?, ?)
+        ON CONFLICT (Manager, JobKey) DO UPDATE SET
+          DueTime = excluded.DueTime,
+          JobData = excluded.JobData,
+          Attempts = 0
+        """
+        self.con.execute(query, [manager, key, due_time, json.dumps(data)])
+        self.con.commit()
+        self.wakeup.set()
+
+    def is_scheduled(self, manager: str, key: str) -> bool:
+        """Checks if a job is waiting to be run"""
+        cur = self.con.cursor()
+        cur.execute(
+            "SELECT 1 FROM scheduled_jobs WHERE Manager = ? AND JobKey = ?",
+            [manager, key],
+        )
+        return cur.fetchone() is not None
+
+    def get_next_due_time(self) -> Optional[float]:
+        """Returns when the next job is due"""
+        cur = self.con.cursor()
+        cur.execute("SELECT MIN(DueTime) FROM scheduled_jobs")
+        data = cur.fetchone()
+        if data is None:
+            return None
+        return data[0]
+
+    def get_due_jobs(self) -> List[Job]:
+        """Returns the jobs that are due, oldest first"""
+        # cleared before reading them: whatever gets scheduled from now on wakes
+        # up the next wait
+        self.wakeup.clear()
+        cur = self.con.cursor()
+        query = """
+        SELECT
+          Manager,
+          JobKey,
+          DueTime,
+          JobData,
+          Attempts
+        FROM scheduled_jobs
+        WHERE DueTime <= ?
+        ORDER BY DueTime
+        """
+        cur.execute(query, [time.time()])
+        return [
+            Job(row[0], row[1], row[2], json.loads(row[3]), row[4] or 0)
+            for row in cur.fetchall()
+        ]
+
+    def complete(self, job: Job) -> None:
+        """Removes a job that has been run"""
+        # the jobs moved in the meantime stay there
+        self.con.execute(
+            """
+            DELETE FROM scheduled_jobs
+            WHERE Manager = ? AND JobKey = ? AND DueTime = ?
+            """,
+            [job.manager, job.key, job.due_time],
+        )
+        self.con.commit()
+
+    def retry(self, job: Job) -> None:
+        """Runs a failed job again in a while, or drops it if it failed too often"""
+        if job.attempts + 1 >= SCHEDULER_MAX_ATTEMPTS:
+            logging.error("Dropping a job of %s: it failed too many times", job.manager)
+            self.complete(job)
+            return
+        self.con.execute(
+            """
+            UPDATE scheduled_jobs
+            SET DueTime = ?, Attempts = Attempts + 1
+            WHERE Manager = ? AND JobKey = ? AND DueTime = ?
+            """,
+            [time.time() + SCHEDULER_RETRY_DELAY, job.manager, job.key, job.due_time],
+        )
+        self.con.commit()
+
+    def wait(self, max_timeout: Optional[float] = None) -> None:
+        """Sleeps until the next job is due, or until a new one is scheduled"""
+        timeout = max_timeout
+        due_time = self.get_next_due_time()
+        if due_time is not None:
+            remaining = due_time - time.time()
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        if timeout is None or timeout > 0:
+            self.wakeup.wait(timeout)
@@ -0,0 +1,191 @@
+"""Here is the Transcoder class"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import List, Optional
+
+from sadbot.classes.file_cache import evict_files
+from sadbot.functions import lock_file, acquire_file_slot
+from sadbot.config import (
+    FILE_CACHE_DIRECTORY,
+    OFFLINE_ANTIFLOOD_TIMEOUT,
+    TRANSCODE_TIMEOUT,
+    TRANSCODE_QUEUE_TIMEOUT,
+    TRANSCODE_CACHE_MAX_SIZE,
+    UPDATE_PROCESSING_MAX_TIMEOUT,
+)
+
+# tmpfs, when there is one: the outputs never touch the disk before being cached
+TRANSCODE_SCRATCH_DIRECTORY = "/dev/shm"
+# a lock file is touched when it's taken, and it's never held for longer than an
+# update is processed, so the older ones can be removed
+TRANSCODE_LOCK_MAX_AGE = 2 * UPDATE_PROCESSING_MAX_TIMEOUT
+# the same transcode running elsewhere is waited for only as long as there's still
+# time to wait for a slot and to transcode it, if it fails
+TRANSCODE_WAIT_TIMEOUT = max(
+    0, UPDATE_PROCESSING_MAX_TIMEOUT - TRANSCODE_QUEUE_TIMEOUT - TRANSCODE_TIMEOUT
+)
+
+
+class Transcoder:
+    """ffmpeg transcodes shared by all the processes.
+
+    The input is piped to ffmpeg, which writes its output to a private scratch
+    folder, and the outputs are cached on the disk by the hash of their input and
+    of the ffmpeg arguments, they're uploaded from there. No more ffmpeg processes
+    than the cores run at the same time, the others wait for a free slot, and the
+    same transcode asked twice at once runs only once: the slots and the inputs are
+    locked with file locks, which go away with the update workers when they get
+    killed."""
+
+    def __init__(self) -> None:
+        """Initializes the transcoder"""
+        self.cache_directory = os.path.join(FILE_CACHE_DIRECTORY, "transcodes")
+        os.makedirs(self.cache_directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(
+            prefix="sadbot-transcodes-",
+            dir=(
+                TRANSCODE_SCRATCH_DIRECTORY
+                if os.path.isdir(TRANSCODE_SCRATCH_DIRECTORY)
+                else None
+            ),
+        )
+        self.jobs_number = os.cpu_count() or 1
+        self.last_cleanup = time.time()
+        self.pid = os.getpid()
+        atexit.register(self.remove_directory)
+
+    def remove_directory(self) -> None:
+        """Removes the scratch folder when the bot stops"""
+        if os.getpid() == self.pid:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def remove_old_locks(self) -> None:
+        """Removes the lock files of the inputs that haven't been transcoded for a
+        while"""
+        if time.time() - self.last_cleanup < TRANSCODE_LOCK_MAX_AGE:
+            return
+        self.last_cleanup = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("slot") or not entry.name.endswith(".lock"):
+                    continue
+                try:
+                    if entry.stat().st_mtime > time.time() - TRANSCODE_LOCK_MAX_AGE:
+                        continue
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+
+    @staticmethod
+    def get_cached(path: str) -> Optional[str]:
+        """Returns the path of a cached output, if there is one"""
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    @staticmethod
+    def run_ffmpeg(
+        data: bytes, arguments: List[str], output: str, cache_path: str
+    ) -> Optional[str]:
+        """Runs ffmpeg on some data, and caches its output"""
+        try:
+            subprocess.run(
+                ["ffmpeg", "-loglevel", "error", "-y", "-i", "pipe:0"]
+                + arguments
+                + [output],
+                input=data,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=TRANSCODE_TIMEOUT,
+                check=True,
+            )
+            # copied and then renamed, the other processes never see it half written
+            temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+            shutil.copyfile(output, temporary_path)
+            os.replace(temporary_path, cache_path)
+            return cache_path
+        except subprocess.TimeoutExpired:
+            logging.warning("Transcode timed out")
+            return None
+        except subprocess.CalledProcessError as error:
+            logging.error("Transcode failed")
+            logging.error(error.stderr.decode(errors="replace"))
+            return None
+        except OSError as error:
+            logging.error("Failed running ffmpeg")
+            logging.error(error)
+            return None
+        finally:
+            if os.path.exists(output):
+                os.remove(output)
+
+    def transcode(
+        self, data: bytes, arguments: List[str], extension: str
+    ) -> Optional[str]:
+        """Transcodes some data with the given ffmpeg output arguments, returns the
+        path of the output"""
+        data_hash = hashlib.sha256(data)
+        data_hash.update(json.dumps(arguments).encode())
+        name = data_hash.hexdigest()
+        cache_path = os.path.join(self.cache_directory, f"{name}.{extension}")
+        output = self.get_cached(cache_path)
+        if output is not None:
+            return output
+        self.remove_old_locks()
+        lock_path = os.path.join(self.directory, f"{name}.lock")
+        with open(lock_path, mode="a", encoding="utf-8") as lock:
+            # the same transcode may be running already, waiting for it
+            if not lock_file(lock, TRANSCODE_WAIT_TIMEOUT):
+                return None
+            os.utime(lock.fileno())
+            output = self.get_cached(cache_path)
+            if output is not None:
+                return output
+            slot = acquire_file_slot(
+                self.directory, self.jobs_number, TRANSCODE_QUEUE_TIMEOUT
+            )
+            if slot is None:
+                logging.warning("Transcode dropped: too many transcodes running")
+                return None
+            try:
+                output = self.run_ffmpeg(
+                    data,
+                    arguments,
+                    os.path.join(self.directory, f"{name}.{extension}"),
+                    cache_path,
+                )
+            finally:
+                slot.close()
+            if output is not None:
+                # the outputs may still be waiting in the outgoing queue to be uploaded
+                evict_files(
+                    self.cache_directory,
+                    TRANSCODE_CACHE_MAX_SIZE,
+                    min_age=OFFLINE_ANTIFLOOD_TIMEOUT,
+                )
+        return output
+
+    def webm_to_mp4(self, data: bytes) -> Optional[str]:
+        """Converts a webm into an mp4"""
+        return self.transcode(
+            data,
+            [
+                "-vf",
+                "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                "-preset",
+                "veryfast",
+                "-movflags",
+                "+faststart",
+            ],
+            "mp4",
+        )
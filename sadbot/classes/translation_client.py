@@ -0,0 +1,73 @@
+"""Here is the TranslationClient class"""
+
+import os
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from sadbot.commands import googletrans
+from sadbot.config import TRANSLATION_CACHE_SIZE, TRANSLATION_TIMEOUT
+
+
+class TranslationClient:
+    """Google Translate client shared by the commands.
+
+    Every process gets its own translator the first time it needs one, so its HTTP
+    client keeps the connections open between the requests. The translations are
+    cached by text and languages, and a batch of texts is translated with a single
+    request, one text per line."""
+
+    def __init__(self) -> None:
+        """Initializes the translation client"""
+        self.translator: Optional[googletrans.Translator] = None
+        self.translator_pid: Optional[int] = None
+        # (text, source language, destination language) -> translation
+        self.cache: OrderedDict = OrderedDict()
+
+    def get_translator(self) -> googletrans.Translator:
+        """Returns the translator of the current process, (re)creating it after a
+        fork"""
+        if self.translator is None or self.translator_pid != os.getpid():
+            self.translator = googletrans.Translator(timeout=TRANSLATION_TIMEOUT)
+            self.translator_pid = os.getpid()
+        return self.translator
+
+    def get_cached(self, key: Tuple[str, str, str]) -> Optional[str]:
+        """Returns a cached translation"""
+        if key not in self.cache:
+            return None
+        self.cache.move_to_end(key)
+        return self.cache[key]
+
+    def set_cached(self, key: Tuple[str, str, str], translation: str) -> None:
+        """Caches a translation"""
+        self.cache[key] = translation
+        self.cache.move_to_end(key)
+        if len(self.cache) > TRANSLATION_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    def translate(self, text: str, dest: str = "en", src: str = "auto") -> str:
+        """Translates a text, raises a ValueError if the languages are invalid"""
+        cached = self.get_cached((text, src, dest))
+        if cached is not None:
+            return cached
+        translation = self.get_translator().translate(text, dest=dest, src=src).text
+        self.set_cached((text, src, dest), translation)
+        return translation
+
+    def translate_batch(
+        self, texts: List[str], dest: str = "en", src: str = "auto"
+    ) -> List[str]:
+        """Translates some texts, the ones that aren't cached go in a single request,
+        raises a ValueError if the languages are invalid"""
+        missing = [
+            text
+            for text in dict.fromkeys(texts)
+            if "\n" not in text and (text, src, dest) not in self.cache
+        ]
+        if len(missing) > 1:
+            translations = self.translate("\n".join(missing), dest, src).split("\n")
+            # the lines may not come back as they went: those texts go one by one
+            if len(translations) == len(missing):
+                for text, translation in zip(missing, translations):
+                    self.set_cached((text, src, dest), translation.strip())
+        return [self.translate(text, dest, src) for text in texts]
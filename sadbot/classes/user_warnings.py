@@ -1,5 +1,8 @@
 """Here is the user warnings class"""
 import sqlite3
+from typing import List
+
+from sadbot.migrations import migrate
 
 
 def get_warn_table_creation_query() -> str:
@@ -13,6 +16,18 @@ def get_warn_table_creation_query() -> str:
     """
 
 
+def get_warn_table_migrations() -> List[List[str]]:
+    """Returns the warn table migrations"""
+    return [
+        [
+            """
+            CREATE INDEX IF NOT EXISTS warn_table_chat_user_date
+            ON warn_table (ChatID, UserID, WarnDate)
+            """,
+        ],
+    ]
+
+
 class UserWarnings:
     """This class handles the user warnings"""
 
@@ -20,6 +35,7 @@ class UserWarnings:
         """Initializes the message repository class"""
         self.con = con
         self.con.execute(get_warn_table_creation_query())
+        migrate(self.con, "warn_table", get_warn_table_migrations())
 
     def insert_new_warn(self, chat_id: int, user_id: int, message_time: int) -> None:
         """Insert a new warn into the database"""
@@ -0,0 +1,186 @@
+"""This module contains the CommandDispatcher class"""
+
+import multiprocessing
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sadbot.regex_sandbox import parse_regex, sre_constants
+from sadbot.config import COMMAND_PREFIX_MAX_LENGTH, COMMAND_PREFIX_MAX_NUMBER
+
+# a prefix is still open if the pattern goes on with known characters
+PrefixStates = Set[Tuple[str, bool]]
+
+# every command counters are: evaluations, matches, total seconds spent replying
+COMMAND_COUNTERS_SIZE = 3
+
+# the few characters matched by \s (the last one is U+3000), so that it can be
+# expanded like a set
+SPACE_CHARACTERS = set(re.findall(r"\s", "".join(map(chr, range(0x3001)))))
+
+# pylint: disable=no-member
+
+
+def get_set_characters(items: Any) -> Optional[Set[str]]:
+    """Returns the characters matched by a regex set, None if there are too many"""
+    characters = set()
+    for opcode, value in items:
+        if opcode == sre_constants.LITERAL:
+            characters.add(chr(value).casefold())
+        elif opcode == sre_constants.RANGE and value[1] - value[0] < 32:
+            for character in range(value[0], value[1] + 1):
+                characters.add(chr(character).casefold())
+        elif opcode == sre_constants.CATEGORY and value == sre_constants.CATEGORY_SPACE:
+            characters |= {character.casefold() for character in SPACE_CHARACTERS}
+        else:
+            return None
+    return characters
+
+
+def close_prefixes(states: PrefixStates) -> PrefixStates:
+    """Closes all the prefixes"""
+    return {(prefix, False) for prefix, _ in states}
+
+
+def extend_prefixes_with_node(  # pylint: disable=too-many-return-statements
+    states: PrefixStates, opcode: Any, value: Any
+) -> PrefixStates:
+    """Extends the open prefixes with a regex node"""
+    # pylint: disable=too-many-branches
+    closed = {state for state in states if not state[1]}
+    opened = {state for state in states if state[1]}
+    if not opened:
+        return states
+    characters: Optional[Set[str]] = None
+    if opcode == sre_constants.LITERAL:
+        characters = {chr(value).casefold()}
+    elif opcode == sre_constants.IN:
+        characters = get_set_characters(value)
+    elif opcode == sre_constants.AT:
+        return states
+    elif opcode == sre_constants.SUBPATTERN:
+        return closed | extend_prefixes(opened, value[-1])
+    elif opcode == sre_constants.BRANCH:
+        for branch in value[1]:
+            closed |= extend_prefixes(opened, branch)
+        return closed
+    elif opcode in [sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT]:
+        repeated = extend_prefixes(opened, value[2])
+        if value[1] > 1:
+            # no idea how many times it's repeated
+            repeated = close_prefixes(repeated)
+        if value[0] == 0:
+            return closed | opened | repeated
+        if value[0] > 1:
+            repeated = close_prefixes(repeated)
+        return closed | repeated
+    if characters is None:
+        return closed | close_prefixes(opened)
+    extended = set()
+    for prefix, _ in opened:
+        for character in characters:
+            new_prefix = (prefix + character)[:COMMAND_PREFIX_MAX_LENGTH]
+            extended.add((new_prefix, len(new_prefix) < COMMAND_PREFIX_MAX_LENGTH))
+    return closed | extended
+
+
+def extend_prefixes(states: PrefixStates, parsed: Any) -> PrefixStates:
+    """Extends the open prefixes with a sequence of regex nodes"""
+    for opcode, value in parsed:
+        extended = extend_prefixes_with_node(states, opcode, value)
+        if len(extended) > COMMAND_PREFIX_MAX_NUMBER:
+            # too many combinations, the shorter prefixes will do
+            return close_prefixes(states)
+        states = extended
+        if not any(state[1] for state in states):
+            break
+    return states
+
+
+# pylint: enable=no-member
+
+
+def get_regex_prefixes(regex: str) -> Set[str]:
+    """Returns the (casefolded) prefixes one of which starts every string matching
+    the regex, an empty prefix means it can start with anything"""
+    parsed = parse_regex(regex)
+    if parsed is None:
+        return {""}
+    return {prefix for prefix, _ in extend_prefixes({("", True)}, parsed)}
+
+
+class CommandDispatcher:
+    """Finds the commands triggered by a message without trying every regex.
+
+    The commands are indexed in a trie by the literal prefixes of their regex, so
+    walking the message text through it only yields the plausible candidates; the
+    commands whose regex can start with anything, like .*, are kept in the catch-all
+    lane at the root. The candidates keep the commands loading order."""
+
+    def __init__(self) -> None:
+        """Initializes the command dispatcher"""
+        self.commands: List[Dict] = []
+        self.trie: Dict[str, Any] = {"children": {}, "commands": []}
+        self.counters: Optional[Any] = None
+
+    def add_command(self, command: Dict) -> None:
+        """Indexes a command"""
+        command_index = len(self.commands)
+        command["dispatcher_index"] = command_index
+        self.commands.append(command)
+        for prefix in get_regex_prefixes(command["regex"]):
+            node = self.trie
+            for character in prefix:
+                node = node["children"].setdefault(
+                    character, {"children": {}, "commands": []}
+                )
+            if command_index not in node["commands"]:
+                node["commands"].append(command_index)
+
+    def start(self) -> None:
+        """Allocates the counters shared by the processes, once all the commands have
+        been added"""
+        self.counters = multiprocessing.Array(
+            "d", len(self.commands) * COMMAND_COUNTERS_SIZE
+        )
+
+    def get_candidates(self, text: str) -> List[Dict]:
+        """Returns the commands that could be triggered by a text"""
+        node = self.trie
+        command_indexes = list(node["commands"])
+        for character in text.casefold()[:COMMAND_PREFIX_MAX_LENGTH]:
+            if character not in node["children"]:
+                break
+            node = node["children"][character]
+            command_indexes += node["commands"]
+        return [self.commands[index] for index in sorted(set(command_indexes))]
+
+    def count(self, command: Dict, matched: bool, elapsed: float = 0) -> None:
+        """Updates the counters of a command"""
+        if self.counters is None:
+            return
+        offset = command["dispatcher_index"] * COMMAND_COUNTERS_SIZE
+        with self.counters.get_lock():
+            self.counters[offset] += 1
+            if matched:
+                self.counters[offset + 1] += 1
+                self.counters[offset + 2] += elapsed
+
+    def get_counters(self) -> List[Tuple[str, int, int, float]]:
+        """Returns the name, evaluations, matches and total reply time of every
+        command, sorted by total time"""
+        if self.counters is None:
+            return []
+        counters = []
+        with self.counters.get_lock():
+            for command in self.commands:
+                offset = command["dispatcher_index"] * COMMAND_COUNTERS_SIZE
+                counters.append(
+                    (
+                        command["command_name"],
+                        int(self.counters[offset]),
+                        int(self.counters[offset + 1]),
+                        self.counters[offset + 2],
+                    )
+                )
+        counters.sort(key=lambda counter: counter[3], reverse=True)
+        return counters
@@ -1,14 +1,16 @@
 """Activity bot command"""
 import io
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import time
 import math
 from datetime import datetime
 import requests
-import matplotlib.pyplot as plt
+import matplotlib.style
+from matplotlib.figure import Figure
 
 from sadbot.app import App
 from sadbot.functions import convert_to_days
+from sadbot.config import ACTIVITY_IMAGE_DPI
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
@@ -27,6 +29,9 @@ class ActivityBotCommand(CommandInterface):
         """Initializes the activity command"""
         self.app = app
         self.message_repository = message_repository
+        # the commands get loaded before the workers are forked: rendering a tiny
+        # plot here loads the fonts and the backend once, for all of them
+        self.render_image([datetime.utcfromtimestamp(0)], [0], 10)
 
     @property
     def handler_type(self) -> int:
@@ -38,10 +43,39 @@ class ActivityBotCommand(CommandInterface):
         """Returns the regex for matching activity commands"""
         return r"(.|!)([aA][cC][tT][iI][vV][iI][tT][yY]).*"
 
+    def get_counts(self, chat_id: int, days: int) -> Tuple[List[datetime], List[int]]:
+        """Returns the end dates and the message counts of the last days, the days
+        end on the next full hour, like the hourly counts they're made of"""
+        end = math.ceil(time.time() / 3600) * 3600
+        begin = end - days * 86400
+        counts = [0] * days
+        for hour, count in self.message_repository.get_hourly_message_counts(
+            begin, end, chat_id
+        ):
+            counts[(hour - begin) // 86400] += count
+        dates = [
+            datetime.utcfromtimestamp(begin + (i + 1) * 86400) for i in range(days)
+        ]
+        return dates, counts
+
+    @staticmethod
+    def render_image(dates: List[datetime], counts: List[int], dpi: int) -> bytes:
+        """Plots the counts"""
+        with matplotlib.style.context("Solarize_Light2"):
+            # no pyplot: the figure isn't registered anywhere, nothing leaks into the
+            # next request
+            figure = Figure(figsize=(16, 4))
+            axes = figure.add_subplot()
+            axes.plot(dates, counts, label="count")
+            axes.set_xlabel("time")
+            axes.set_ylabel("count")
+            axes.legend(frameon=False)
+            bytes_io = io.BytesIO()
+            figure.savefig(bytes_io, dpi=dpi, format="png")
+        return bytes_io.getvalue()
+
     def get_image(self, chat_id: int, message_text: str) -> bytes:
         """Get image lol"""
-        dates: List[datetime] = []
-        counts: List[int] = []
         if len(message_text) == 9:
             time_string = "1w"
         else:
@@ -52,29 +86,8 @@ class ActivityBotCommand(CommandInterface):
             days = 2
 
         days = min(days, 365)
-
-        end: int = math.ceil(time.time())
-        for _ in range(0, days):
-            begin = end - 86400
-            count = self.message_repository.get_count_messages_sent_in_range(
-                begin, end, chat_id
-            )
-            dates.append(datetime.utcfromtimestamp(end))
-            counts.append(count)
-            end = begin
-        dates.reverse()
-        counts.reverse()
-        with plt.style.context(plt.style.library["Solarize_Light2"]):
-            plt.rcParams["figure.figsize"] = (16, 4)
-            plt.plot(dates, counts, label="count")
-            plt.xlabel("time")
-            plt.ylabel("count")
-            plt.legend(frameon=False)
-            bytes_io = io.BytesIO()
-            plt.savefig(bytes_io, dpi=300, format="png")
-        bytes_io.seek(0)
-        image = bytes_io.read()
-        return image
+        dates, counts = self.get_counts(chat_id, days)
+        return self.render_image(dates, counts, ACTIVITY_IMAGE_DPI)
 
     def get_reply(self, message: Optional[Message] = None) -> Optional[List[BotAction]]:
         """Activity"""
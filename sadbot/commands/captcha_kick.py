@@ -1,5 +1,6 @@
 """Captcha kick bot command"""
 from typing import Optional, List
+import os
 import random
 import logging
 
@@ -137,19 +138,16 @@ class CaptchaKickBotCommand(CommandInterface):
                 if rules["text"] is not None:
                     welcome_reply += "\n" + rules.get("text", "")
             if "photo" in rules and rules["photo"] is not None:
-                try:
-                    with open(
-                        f"./sadbot/assets/rules/{message.chat_id}.jpg", mode="rb"
-                    ) as reply_image_file:
-                        reply_image = reply_image_file.read()
-                        replies += [
-                            BotAction(
-                                BOT_ACTION_TYPE_REPLY_IMAGE,
-                                reply_text=welcome_reply,
-                                reply_image=reply_image,
-                            )
-                        ]
-                except FileNotFoundError:
+                rules_photo = f"sadbot/assets/rules/{message.chat_id}.jpg"
+                if os.path.isfile(rules_photo):
+                    replies += [
+                        BotAction(
+                            BOT_ACTION_TYPE_REPLY_IMAGE,
+                            reply_text=welcome_reply,
+                            reply_asset=rules_photo,
+                        )
+                    ]
+                else:
                     replies += [
                         BotAction(
                             BOT_ACTION_TYPE_REPLY_TEXT,
@@ -1,7 +1,6 @@
 """Captcha welcome bot command"""
 
 from typing import Optional, List
-from io import BytesIO
 from math import ceil
 import random
 import datetime
@@ -120,12 +119,7 @@ class CaptchaWelcomeBotCommand(CommandInterface):
             + "."
             + str(expiration)
         )
-        captcha_text, captcha_image = self.captcha.get_captcha(captcha_id)
-        bytes_io = BytesIO()
-        bytes_io.name = "captcha.jpeg"
-        captcha_image.save(bytes_io, "JPEG")
-        bytes_io.seek(0)
-        image_bytes = bytes_io.read()
+        captcha_text, image_bytes = self.captcha.get_captcha(captcha_id)
         new_user = message.sender_name
         if message.sender_username is not None:
             new_user = "@" + message.sender_username
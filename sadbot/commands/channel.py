@@ -7,7 +7,7 @@ import requests
 import html2text
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
-from sadbot.functions import webm_to_mp4_convert
+from sadbot.classes.transcoder import Transcoder
 from sadbot.message import Message
 from sadbot.bot_action import (
     BOT_ACTION_TYPE_REPLY_VIDEO_ONLINE,
@@ -21,6 +21,9 @@ from sadbot.bot_action import (
 class ChannelBotCommand(CommandInterface):
     """This is the channel bot command class"""
 
+    def __init__(self, transcoder: Transcoder):
+        self.transcoder = transcoder
+
     @property
     def handler_type(self) -> int:
         """Returns the type of event handled by the command"""
@@ -65,10 +68,10 @@ class ChannelBotCommand(CommandInterface):
             action = None
             if media.endswith("webm"):
                 file_bytes = requests.get(f"https://{media}").content
-                output_bytes = webm_to_mp4_convert(file_bytes)
+                mp4 = self.transcoder.webm_to_mp4(file_bytes)
                 action = BotAction(
                     BOT_ACTION_TYPE_REPLY_VIDEO,
-                    reply_video=output_bytes,
+                    reply_media_path=mp4,
                     reply_text=text,
                 )
             elif media.endswith("gif"):
@@ -0,0 +1,40 @@
+"""Command stats bot command"""
+
+from typing import Optional, List
+
+from sadbot.command_dispatcher import CommandDispatcher
+from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
+from sadbot.message import Message
+from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_TEXT
+from sadbot.config import OWNER_ID
+
+
+class CommandStatsBotCommand(CommandInterface):
+    """This is the command stats bot command class"""
+
+    def __init__(self, command_dispatcher: CommandDispatcher):
+        self.command_dispatcher = command_dispatcher
+
+    @property
+    def handler_type(self) -> int:
+        """Returns the type of event handled by the command"""
+        return BOT_HANDLER_TYPE_MESSAGE
+
+    @property
+    def command_regex(self) -> str:
+        """Returns the regex for matching command stats commands"""
+        return r"(!|\.)([Cc][Oo][Mm]{2}[Aa][Nn][Dd][Ss][Tt][Aa][Tt][Ss])"
+
+    def get_reply(self, message: Optional[Message] = None) -> Optional[List[BotAction]]:
+        """Returns the commands counters"""
+        if message is None or message.sender_id != OWNER_ID:
+            return None
+        reply_text = "command: evaluated/matched, total reply time\n"
+        for (
+            name,
+            evaluations,
+            matches,
+            total_time,
+        ) in self.command_dispatcher.get_counters():
+            reply_text += f"{name}: {evaluations}/{matches}, {total_time:.2f}s\n"
+        return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text=reply_text)]
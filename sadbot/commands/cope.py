@@ -2,12 +2,9 @@
 # this import is required in every module:
 from typing import Optional, List
 
-# this imports is optional:
-import os
-import random
-
 # this imports is optional:
 from sadbot.message_repository import MessageRepository
+from sadbot.classes.assets import Assets
 
 # you need to import the handler type, every command is tied to just one type
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
@@ -23,9 +20,10 @@ class CopeBotCommand(CommandInterface):
 
     # the constructor is NOT required. Anyway if the bot command need some
     # dependencies, they will be automatically injected through it
-    def __init__(self, message_repository: MessageRepository):
+    def __init__(self, message_repository: MessageRepository, assets: Assets):
         """Initializes the command class"""
         self.message_repository = message_repository
+        self.assets = assets
 
     @property
     def handler_type(self) -> int:
@@ -46,11 +44,13 @@ class CopeBotCommand(CommandInterface):
         # a very useful module of sadbot we're injecting into this class
         # we could also have injected the direct database connection and retrieved
         # the last message directly
-        choice = random.choice(os.listdir("sadbot/assets/cope"))
-        with open(f"sadbot/assets/cope/{choice}", mode="rb") as reply_video_file:
-            reply_video = reply_video_file.read()
+        choice = self.assets.get_random_file("cope")
+        if choice is None:
+            return None
         return [
             BotAction(
-                BOT_ACTION_TYPE_REPLY_VIDEO, reply_video=reply_video, reply_text="cope"
+                BOT_ACTION_TYPE_REPLY_VIDEO,
+                reply_asset=choice,
+                reply_text="cope",
             )
         ]
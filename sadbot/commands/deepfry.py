@@ -1,9 +1,7 @@
 """Deepfry bot command"""
 
-from typing import Optional, List, Tuple
-import io
+from typing import Optional, List
 
-from PIL import Image, ImageOps, ImageEnhance
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message, MESSAGE_FILE_TYPE_PHOTO
 from sadbot.message_repository import MessageRepository
@@ -13,6 +11,7 @@ from sadbot.bot_action import (
     BOT_ACTION_TYPE_REPLY_TEXT,
 )
 from sadbot.app import App
+from sadbot.image_effects import open_image, encode_image, deepfry
 
 
 class DeepfryBotCommand(CommandInterface):
@@ -48,44 +47,12 @@ class DeepfryBotCommand(CommandInterface):
             return [
                 BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text="No photo specified.")
             ]
-        image = Image.open(io.BytesIO(photo))
-        image = self.deepfry(image)
-        return [BotAction(BOT_ACTION_TYPE_REPLY_IMAGE, reply_image=image)]
-
-    @staticmethod
-    def deepfry(
-        img: Image,
-        *,
-        colors: Tuple[Tuple[int, int, int], Tuple[int, int, int]] = (
-            (254, 0, 2),
-            (255, 255, 15),
-        )
-    ) -> Image:
-        """Deepfries an image"""
-        img = img.convert("RGB")
-        width, height = img.width, img.height
-        img = img.resize(
-            (int(width**0.75), int(height**0.75)), resample=Image.LANCZOS
-        )
-        img = img.resize(
-            (int(width**0.88), int(height**0.88)), resample=Image.BILINEAR
-        )
-        img = img.resize(
-            (int(width**0.9), int(height**0.9)), resample=Image.BICUBIC
-        )
-        img = img.resize((width, height), resample=Image.BICUBIC)
-        img = ImageOps.posterize(img, 4)
-
-        r_idk = img.split()[0]
-        r_idk = ImageEnhance.Contrast(r_idk).enhance(3.0)
-        r_idk = ImageEnhance.Brightness(r_idk).enhance(1.5)
-        r_idk = ImageOps.colorize(r_idk, colors[0], colors[1])
-
-        img = Image.blend(img, r_idk, 0.75)
-        img = ImageEnhance.Sharpness(img).enhance(100.0)
-        img_byte = io.BytesIO()
-        img.save(img_byte, format="png")
-        return img_byte.getvalue()
+        try:
+            image, _ = open_image(photo)
+        except OSError:
+            return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text="Invalid photo.")]
+        fried_image = encode_image(deepfry(image))
+        return [BotAction(BOT_ACTION_TYPE_REPLY_IMAGE, reply_image=fried_image)]
 
     def get_photo_from_message(self, message: Message) -> Optional[bytes]:
         """Returns the image to process"""
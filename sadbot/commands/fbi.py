@@ -7,6 +7,7 @@ import re
 from sadbot.config import FBI_WORDS, FBI_MOST_WANTED_NUMBER
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
+from sadbot.migrations import migrate
 from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_TEXT
 
 
@@ -31,6 +32,26 @@ def fbi_entries_table_creation_query() -> str:
     """
 
 
+def fbi_migrations() -> List[List[str]]:
+    """Returns the FBI tables migrations"""
+    return [
+        [
+            """
+            CREATE INDEX IF NOT EXISTS fbi_words_word
+            ON fbi_words (Word)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS fbi_entries_sender_chat_word
+            ON fbi_entries (SenderID, ChatID, WordID)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS fbi_entries_chat
+            ON fbi_entries (ChatID)
+            """,
+        ],
+    ]
+
+
 class FbiBotCommand(CommandInterface):
     """This is the FBI bot command class"""
 
@@ -38,6 +59,7 @@ class FbiBotCommand(CommandInterface):
         self.con = con
         self.con.execute(fbi_words_table_creation_query())
         self.con.execute(fbi_entries_table_creation_query())
+        migrate(self.con, "fbi", fbi_migrations())
         self.initialize_forbidden_words()
 
     @property
@@ -2,17 +2,36 @@
 
 from typing import Optional, List
 import random
-import json
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
 from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_TEXT
+from sadbot.classes.assets import Assets
 from sadbot.functions import safe_cast
 
 
+def parse_god_book(god_book: object) -> List[List[str]]:
+    """Returns the verses of every chapter of a God book"""
+    if not isinstance(god_book, dict):
+        raise TypeError("The God book is not a dictionary")
+    return [
+        [verse["text"] for verse in god_book[f"{chapter}"]]
+        for chapter in range(1, len(god_book) + 1)
+    ]
+
+
 class GodquoteBotCommand(CommandInterface):
     """This is the God quote bot command class"""
 
+    def __init__(self, assets: Assets):
+        """Initializes the God quote command"""
+        self.god_book_arabic = assets.get_corpus(
+            "godquote/quran_arabic.json", parse_god_book
+        )
+        self.god_book_english = assets.get_corpus(
+            "godquote/quran_english.json", parse_god_book
+        )
+
     @property
     def handler_type(self) -> int:
         """Returns the type of event handled by the command"""
@@ -27,25 +46,21 @@ class GodquoteBotCommand(CommandInterface):
         """Returns God words"""
         if message is None or message.text is None:
             return None
-        with open(
-            "./sadbot/assets/godquote/quran_arabic.json", mode="r", encoding="utf-8"
-        ) as god_file_arabic, open(
-            "./sadbot/assets/godquote/quran_english.json", mode="r", encoding="utf-8"
-        ) as god_file_english:
-            god_book_arabic = json.load(god_file_arabic)
-            god_book_english = json.load(god_file_english)
-            split = message.text.split()
-            len_split = len(split)
-            chapter = random.randint(1, len(god_book_arabic))
-            verse = random.randint(0, len(god_book_arabic[f"{chapter}"]) - 1)
-            if len_split > 1:
-                chapter = safe_cast(split[1], int, chapter)
-            if len_split > 2:
-                verse = random.randint(1, len(god_book_arabic[f"{chapter}"]))
-                verse = safe_cast(split[2], int, verse)
-                verse -= 1
-            arabic_quote = god_book_arabic[f"{chapter}"][verse]["text"]
-            english_quote = god_book_english[f"{chapter}"][verse]["text"]
-            verse += 1
-            reply_text = f"{chapter}, {verse}:\n{arabic_quote}\n{english_quote}"
-            return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text=reply_text)]
+        if self.god_book_arabic is None or self.god_book_english is None:
+            return None
+        split = message.text.split()
+        len_split = len(split)
+        chapter, verse = self.god_book_arabic.get_random_position()
+        if len_split > 1:
+            chapter = safe_cast(split[1], int, chapter + 1) - 1
+            if not 0 <= chapter < self.god_book_arabic.get_sections_number():
+                return None
+            verse = random.randrange(self.god_book_arabic.get_section_length(chapter))
+        if len_split > 2:
+            verse = safe_cast(split[2], int, verse + 1) - 1
+        arabic_quote = self.god_book_arabic.get_text(chapter, verse)
+        english_quote = self.god_book_english.get_text(chapter, verse)
+        if arabic_quote is None or english_quote is None:
+            return None
+        reply_text = f"{chapter + 1}, {verse + 1}:\n{arabic_quote}\n{english_quote}"
+        return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text=reply_text)]
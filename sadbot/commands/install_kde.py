@@ -7,14 +7,16 @@ from sadbot.commands.cope import CopeBotCommand
 from sadbot.message import Message
 from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_DELETE_MESSAGE
 from sadbot.message_repository import MessageRepository
+from sadbot.classes.assets import Assets
 
 
 class InstallKdeBotCommand(CommandInterface):
     """This is the anti-denk bot command class"""
 
-    def __init__(self, message_repository: MessageRepository):
+    def __init__(self, message_repository: MessageRepository, assets: Assets):
         """Initializes the command"""
         self.message_repository = message_repository
+        self.assets = assets
 
     @property
     def handler_type(self) -> int:
@@ -37,7 +39,7 @@ class InstallKdeBotCommand(CommandInterface):
                 reply_delete_message_id=message.message_id,
             )
         ]
-        cope_class = CopeBotCommand(self.message_repository)
+        cope_class = CopeBotCommand(self.message_repository, self.assets)
         cope = CopeBotCommand.get_reply(cope_class, message)
         if cope is not None:
             replies += cope
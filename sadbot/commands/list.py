@@ -4,6 +4,7 @@ from typing import Optional, Tuple, List
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
+from sadbot.migrations import migrate
 from sadbot.bot_action import (
     BotAction,
     BOT_ACTION_TYPE_REPLY_TEXT,
@@ -33,6 +34,22 @@ def get_list_entries_table_creation_query() -> str:
     """
 
 
+def get_lists_migrations() -> List[List[str]]:
+    """Returns the lists and list entries tables migrations"""
+    return [
+        [
+            """
+            CREATE INDEX IF NOT EXISTS lists_chat_name
+            ON lists (ChatID, Name)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS list_entries_list_link
+            ON list_entries (ListID, Link)
+            """,
+        ],
+    ]
+
+
 class ListBotCommand(CommandInterface):
     """This is the list bot command class"""
 
@@ -40,6 +57,7 @@ class ListBotCommand(CommandInterface):
         self.con = con
         self.con.execute(get_list_entries_table_creation_query())
         self.con.execute(get_lists_table_creation_query())
+        migrate(self.con, "lists", get_lists_migrations())
 
     @property
     def handler_type(self) -> int:
@@ -7,15 +7,16 @@ from sadbot.message import Message, MESSAGE_FILE_TYPE_PHOTO
 from sadbot.message_repository import MessageRepository
 from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_TEXT, BOT_ACTION_TYPE_REPLY_IMAGE
 from sadbot.app import App
-from sadbot.classes.ocr import get_text
+from sadbot.classes.ocr import Ocr
 
 
 class OcrBotCommand(CommandInterface):
     """This is the ocr bot command class"""
 
-    def __init__(self, app: App, message_repository: MessageRepository):
+    def __init__(self, app: App, message_repository: MessageRepository, ocr: Ocr):
         self.app = app
         self.message_repository = message_repository
+        self.ocr = ocr
 
     @property
     def handler_type(self) -> int:
@@ -48,7 +49,11 @@ class OcrBotCommand(CommandInterface):
         lang = "en"
         if len(split) > 1:
             lang = split[1]
-        text = get_text(lang, photo)
+        text = self.ocr.get_text(lang, photo)
+        if text is None:
+            return [
+                BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text="An error occured")
+            ]
         return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text=text)]
 
     def get_photo_from_message(self, message: Message) -> Optional[bytes]:
@@ -1,7 +1,5 @@
 """OpenAI bot command"""
 from typing import Optional, List
-import random
-import json
 
 import requests
 import openai
@@ -10,12 +8,24 @@ from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
 from sadbot.config import OPENAI_API_KEY
 from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_IMAGE
+from sadbot.classes.assets import Assets
 from sadbot.functions import safe_cast
 
 
+def parse_dictionary(dictionary: object) -> List[List[str]]:
+    """Returns the words of the dictionary"""
+    if not isinstance(dictionary, list):
+        raise TypeError("The dictionary is not a list")
+    return [dictionary]
+
+
 class OpenaiBotCommand(CommandInterface):
     """This is the sample command bot command class"""
 
+    def __init__(self, assets: Assets):
+        """Initializes the command class"""
+        self.dictionary = assets.get_corpus("openai/all.json", parse_dictionary)
+
     @property
     def handler_type(self) -> int:
         """Here is the type of event handled by the command"""
@@ -40,14 +50,11 @@ class OpenaiBotCommand(CommandInterface):
                 words = split[2:]
             else:
                 words = []
-        with open(
-            "./sadbot/assets/openai/all.json", mode="r", encoding="utf-8"
-        ) as dictionary_stream:
-            dictionary_content = dictionary_stream.read()
-        dictionary = json.loads(dictionary_content)
-        dictionary_length = len(dictionary)
-        for _ in range(words_count):
-            words.append(dictionary[random.randint(0, dictionary_length)])
+        if self.dictionary is not None:
+            for _ in range(words_count):
+                words.append(self.dictionary.get_random_text())
+        reply_image: Optional[bytes] = None
+        reply_asset = None
         try:
             openai.api_key = OPENAI_API_KEY
             reply_text = " ".join(words)
@@ -68,13 +75,13 @@ class OpenaiBotCommand(CommandInterface):
             response = requests.get(image_url, timeout=10)
             reply_image = response.content
         except Exception:  # pylint: disable=broad-except:
-            with open("./sadbot/assets/uwu/uwu.jpg", mode="rb") as uwu_buffer:
-                reply_image = uwu_buffer.read()
+            reply_asset = "sadbot/assets/uwu/uwu.jpg"
             reply_text = "An error occurred."
         return [
             BotAction(
                 BOT_ACTION_TYPE_REPLY_IMAGE,
                 reply_image=reply_image,
+                reply_asset=reply_asset,
                 reply_text=reply_text,
             )
         ]
@@ -0,0 +1,36 @@
+"""Rebuild activity bot command"""
+
+from typing import Optional, List
+
+from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
+from sadbot.message import Message
+from sadbot.message_repository import MessageRepository
+from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_TEXT
+from sadbot.config import OWNER_ID
+
+
+class RebuildActivityBotCommand(CommandInterface):
+    """This is the rebuild activity bot command class"""
+
+    def __init__(self, message_repository: MessageRepository):
+        self.message_repository = message_repository
+
+    @property
+    def handler_type(self) -> int:
+        """Returns the type of event handled by the command"""
+        return BOT_HANDLER_TYPE_MESSAGE
+
+    @property
+    def command_regex(self) -> str:
+        """Returns the regex for matching rebuild activity commands"""
+        return r"(!|\.)([Rr][Ee][Bb][Uu][Ii][Ll][Dd][Aa][Cc][Tt][Ii][Vv][Ii][Tt][Yy])"
+
+    def get_reply(self, message: Optional[Message] = None) -> Optional[List[BotAction]]:
+        """Counts again all the logged messages, for the activity command; only the
+        writes batched by this process are flushed first, the ones of the other
+        processes are counted when they get written"""
+        if message is None or message.sender_id != OWNER_ID:
+            return None
+        self.message_repository.con.flush()
+        self.message_repository.rebuild_message_counts()
+        return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text="Activity rebuilt.")]
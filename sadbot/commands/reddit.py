@@ -3,14 +3,13 @@ import html
 import json
 from typing import Optional, List
 
-import os
 import random
 import requests
 import validators
-from yt_dlp.YoutubeDL import YoutubeDL
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
+from sadbot.classes.download_manager import DownloadManager
 
 from sadbot.bot_action import (
     BOT_ACTION_TYPE_NONE,
@@ -21,7 +20,7 @@ from sadbot.bot_action import (
 )
 
 
-def handle_post(post) -> Optional[List[BotAction]]:
+def handle_post(post, download_manager: DownloadManager) -> Optional[List[BotAction]]:
     """Return a bot action from the json of a reddit post"""
     headers = {
         "User-Agent": "Mozilla/5.0 (X11; Fedora; Linux x86_64; rv:98.0) Gecko/20100101 Firefox/98.0"
@@ -44,30 +43,14 @@ def handle_post(post) -> Optional[List[BotAction]]:
         )
     elif post["domain"] == "v.redd.it":
         caption = f"{title}\nLink: reddit.com{permalink}"
-        file_name = str(random.randint(10000000000, 35000000000)) + ".mp4"
-        ydl_opts = {
-            "final_ext": "mp4",
-            "outtmpl": file_name,
-        }
-        with YoutubeDL(ydl_opts) as ydl:
-            try:
-                ydl.download(post["url"])
-            # pylint: disable=bare-except
-            except:
-                return [
-                    BotAction(
-                        BOT_HANDLER_TYPE_MESSAGE,
-                        reply_text="Something went wrong.",
-                    )
-                ]
-
-        with open(file_name, "rb") as file:
-            buf = file.read()
-        os.remove(file_name)
+        download = download_manager.download(post["url"], {"final_ext": "mp4"}, "video")
+        if download.error is not None:
+            return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text=download.error)]
         action = BotAction(
             BOT_ACTION_TYPE_REPLY_VIDEO,
-            reply_video=buf,
+            reply_media_path=download.path,
             reply_text=caption,
+            reply_download=download.key,
         )
     elif post["domain"] == "i.redd.it":
         caption = (
@@ -111,6 +94,9 @@ def handle_post(post) -> Optional[List[BotAction]]:
 class RedditBotCommand(CommandInterface):
     """This is the sample command bot command class"""
 
+    def __init__(self, download_manager: DownloadManager):
+        self.download_manager = download_manager
+
     @property
     def handler_type(self) -> int:
         """Here is the type of event handled by the command"""
@@ -152,4 +138,4 @@ class RedditBotCommand(CommandInterface):
         if not children:
             return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text="Internal error")]
         post = random.choice(children)["data"]
-        return handle_post(post)
+        return handle_post(post, self.download_manager)
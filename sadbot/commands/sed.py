@@ -1,21 +1,22 @@
 """Sed bot command"""
 
-import re
 from typing import Optional, List
-from multiprocessing import Manager, Process
-from multiprocessing.managers import ValueProxy
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
 from sadbot.message_repository import MessageRepository
+from sadbot.regex_sandbox import RegexSandbox
 from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_TEXT
 
 
 class SedBotCommand(CommandInterface):
     """This is the sed bot command class"""
 
-    def __init__(self, message_repository: MessageRepository):
+    def __init__(
+        self, message_repository: MessageRepository, regex_sandbox: RegexSandbox
+    ):
         self.message_repository = message_repository
+        self.regex_sandbox = regex_sandbox
 
     @property
     def handler_type(self) -> int:
@@ -59,33 +60,10 @@ class SedBotCommand(CommandInterface):
         max_replace = 1
         if replace_all:
             max_replace = len(reply_message.text)
-        manager = Manager()
-        regex_result = manager.Value("c", "")
-        regex_process = Process(
-            target=self.regex_substitution,
-            args=(
-                old,
-                new,
-                reply_message.text,
-                max_replace,
-                regex_result,
-            ),
+        reply = self.regex_sandbox.run(
+            "substitution", old, new, reply_message.text, max_replace
         )
-        regex_process.start()
-        regex_process.join(1)
-        regex_process.kill()
-        regex_process.join()
-        reply = regex_result.value
+        if reply is None:
+            return None
         reply = "<" + reply_message.sender_name + ">: " + reply
         return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text=reply)]
-
-    @staticmethod
-    def regex_substitution(
-        old: str,
-        new: str,
-        text: str,
-        max_replace: int,
-        regex_result: ValueProxy,
-    ) -> None:
-        """Performs the regex substitution"""
-        regex_result.value = re.sub(old, new, text, max_replace)
@@ -6,13 +6,12 @@ import logging
 import random
 import json
 import re
-import os
 
 import requests
-from yt_dlp import YoutubeDL
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
+from sadbot.classes.download_manager import DownloadManager
 from sadbot.bot_action import (
     BotAction,
     BOT_ACTION_TYPE_REPLY_VIDEO,
@@ -23,6 +22,9 @@ from sadbot.bot_action import (
 class ShortsBotCommand(CommandInterface):
     """This is the Youtube Shorts bot command class"""
 
+    def __init__(self, download_manager: DownloadManager):
+        self.download_manager = download_manager
+
     @property
     def handler_type(self) -> int:
         """Returns the type of event handled by the command"""
@@ -70,42 +72,25 @@ class ShortsBotCommand(CommandInterface):
         if data is None:
             return None
         caption, watch_url = data
-        file_name = str(random.randint(10000000000, 35000000000))
-        if not self.save_video(file_name, watch_url):
+        download = self.download_manager.download(
+            watch_url, {"format": "(mp4)[filesize<50M]"}, "video"
+        )
+        if download.error is not None:
             return [
                 BotAction(
                     BOT_ACTION_TYPE_REPLY_TEXT,
-                    reply_text="Something went wrong.",
+                    reply_text=download.error,
                 )
             ]
-        with open(file_name, "rb") as file:
-            buf = file.read()
-        os.remove(file_name)
         return [
             BotAction(
                 BOT_ACTION_TYPE_REPLY_VIDEO,
-                reply_video=buf,
+                reply_media_path=download.path,
                 reply_text=caption,
+                reply_download=download.key,
             )
         ]
 
-    @staticmethod
-    def save_video(file_name: str, watch_url: str) -> bool:
-        """
-        Saves the video
-        """
-        ydl_opts = {
-            "format": "(mp4)[filesize<50M]",
-            "outtmpl": file_name,
-        }
-        with YoutubeDL(ydl_opts) as ydl:
-            try:
-                ydl.download([watch_url])
-                return True
-            # pylint: disable=bare-except
-            except:
-                return False
-
     @staticmethod
     def extract_data(text: str) -> Optional[Tuple[str, str]]:
         """
@@ -1,9 +1,8 @@
 """Slap bot command"""
-import os
-import random
 from typing import Optional, List
 
 from sadbot.message_repository import MessageRepository
+from sadbot.classes.assets import Assets
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
@@ -14,9 +13,10 @@ from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_VIDEO
 class SlapBotCommand(CommandInterface):
     """This is the sample command bot command class"""
 
-    def __init__(self, message_repository: MessageRepository):
+    def __init__(self, message_repository: MessageRepository, assets: Assets):
         """Initializes the command class"""
         self.message_repository = message_repository
+        self.assets = assets
 
     @property
     def handler_type(self) -> int:
@@ -51,9 +51,13 @@ class SlapBotCommand(CommandInterface):
             r_username = r_username.replace(" ", "")
         s_username = message.sender_username or message.sender_name
         text = f"@{s_username} slaps @{r_username}"
-        choice = random.choice(os.listdir("sadbot/assets/slap"))
-        with open(f"sadbot/assets/slap/{choice}", "rb") as file:
-            slap = file.read()
+        choice = self.assets.get_random_file("slap")
+        if choice is None:
+            return None
         return [
-            BotAction(BOT_ACTION_TYPE_REPLY_VIDEO, reply_video=slap, reply_text=text)
+            BotAction(
+                BOT_ACTION_TYPE_REPLY_VIDEO,
+                reply_asset=choice,
+                reply_text=text,
+            )
         ]
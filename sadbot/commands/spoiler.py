@@ -9,7 +9,7 @@ from sadbot.app import App
 
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.config import MAX_REPLY_LENGTH_MEDIA, MAX_REPLY_LENGTH_TEXT
-from sadbot.functions import webm_to_mp4_convert
+from sadbot.classes.transcoder import Transcoder
 from sadbot.message import (
     Message,
     MESSAGE_FILE_TYPE_PHOTO,
@@ -29,10 +29,16 @@ from sadbot.bot_action import (
 class SpoilerBotCommand(CommandInterface):
     """This is the spoiler bot command class"""
 
-    def __init__(self, app: App, message_repository: MessageRepository):
+    def __init__(
+        self,
+        app: App,
+        message_repository: MessageRepository,
+        transcoder: Transcoder,
+    ):
         """Initializes the spoiler command"""
         self.app = app
         self.message_repository = message_repository
+        self.transcoder = transcoder
 
     @property
     def handler_type(self) -> int:
@@ -52,10 +58,11 @@ class SpoilerBotCommand(CommandInterface):
         if len(splitted) > 1:
             link = splitted[1]
             req = requests.get(link)
+            output: Optional[bytes] = req.content
+            output_path = None
             if link.endswith("webm"):
-                output = webm_to_mp4_convert(req.content)
-            else:
-                output = req.content
+                output = None
+                output_path = self.transcoder.webm_to_mp4(req.content)
             mimetype = mimetypes.guess_type(link, strict=False)
             if mimetype and mimetype[0] and mimetype[0].startswith("image"):
                 action = BotAction(
@@ -63,7 +70,10 @@ class SpoilerBotCommand(CommandInterface):
                 )
             elif mimetype and mimetype[0] and mimetype[0].startswith("video"):
                 action = BotAction(
-                    BOT_ACTION_TYPE_REPLY_VIDEO, reply_video=output, reply_spoiler=True
+                    BOT_ACTION_TYPE_REPLY_VIDEO,
+                    reply_video=output,
+                    reply_media_path=output_path,
+                    reply_spoiler=True,
                 )
             else:
                 action = BotAction(BOT_ACTION_TYPE_NONE)
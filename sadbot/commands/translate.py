@@ -3,12 +3,12 @@ from typing import Optional, List
 import re
 import requests
 
-from sadbot.commands import googletrans
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
 from sadbot.message_repository import MessageRepository
 from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_TEXT, BOT_ACTION_TYPE_REPLY_IMAGE
-from sadbot.classes.ocr import get_text_and_translate
+from sadbot.classes.ocr import Ocr
+from sadbot.classes.translation_client import TranslationClient
 from sadbot.message import Message, MESSAGE_FILE_TYPE_PHOTO
 from sadbot.app import App
 
@@ -16,10 +16,18 @@ from sadbot.app import App
 class TranslateBotCommand(CommandInterface):
     """This is the translate bot command class"""
 
-    def __init__(self, app: App, message_repository: MessageRepository):
+    def __init__(
+        self,
+        app: App,
+        message_repository: MessageRepository,
+        ocr: Ocr,
+        translation_client: TranslationClient,
+    ):
         """Initializes the transalte bot command class"""
         self.app = app
         self.message_repository = message_repository
+        self.ocr = ocr
+        self.translation_client = translation_client
 
     @property
     def handler_type(self) -> int:
@@ -42,7 +50,9 @@ class TranslateBotCommand(CommandInterface):
             return None
         return photo
 
-    def get_reply(self, message: Optional[Message] = None) -> Optional[List[BotAction]]:
+    def get_reply(  # pylint: disable=too-many-return-statements
+        self, message: Optional[Message] = None
+    ) -> Optional[List[BotAction]]:
         """Get the translation"""
         if message is None or message.text is None:
             return None
@@ -73,8 +83,13 @@ class TranslateBotCommand(CommandInterface):
                     lang = split[2]
                 if len(split) >= 3:
                     src = split[2]
-                translator = googletrans.Translator()
-                img = get_text_and_translate(lang, photo, translator, dest, src)
+                img = self.ocr.get_text_and_translate(
+                    lang, photo, self.translation_client, dest, src
+                )
+                if img is None:
+                    return [
+                        BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text="An error occured")
+                    ]
                 return [BotAction(BOT_ACTION_TYPE_REPLY_IMAGE, reply_image=img)]
             args = message.text.split(" ")
             dest = "en"
@@ -83,11 +98,9 @@ class TranslateBotCommand(CommandInterface):
                 dest = args[1]
             if len(args) >= 3:
                 src = args[2]
-            translator = googletrans.Translator()
             try:
-                text = (
-                    "Translation: "
-                    + translator.translate(reply_message.text, dest=dest, src=src).text
+                text = "Translation: " + self.translation_client.translate(
+                    reply_message.text, dest=dest, src=src
                 )
             except ValueError as error:
                 text = str(error)
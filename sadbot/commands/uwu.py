@@ -69,12 +69,11 @@ class UwuBotCommand(CommandInterface):
         # here is how you open/set an image for the bot action, please note that in
         # this project the standard directory for storing command assets is:
         # ./sadbot/assets/{command_name}/
-        with open("./sadbot/assets/uwu/uwu.jpg", mode="rb") as reply_image_file:
-            reply_image = reply_image_file.read()
+        # the assets are uploaded only once, then they're sent by their file id
         return [
             BotAction(
                 BOT_ACTION_TYPE_REPLY_IMAGE,
-                reply_image=reply_image,
+                reply_asset="sadbot/assets/uwu/uwu.jpg",
                 reply_text=reply_text,
             )
         ]
@@ -1,13 +1,10 @@
 """Webm bot command"""
-import os
-import random
-import subprocess
 from typing import List, Optional
 
 from sadbot.app import App
 from sadbot.bot_action import BOT_ACTION_TYPE_REPLY_VIDEO, BotAction
 from sadbot.command_interface import BOT_HANDLER_TYPE_DOCUMENT, CommandInterface
-from sadbot.functions import webm_to_mp4_convert
+from sadbot.classes.transcoder import Transcoder
 from sadbot.message import Message
 
 
@@ -17,9 +14,11 @@ class WebmBotCommand(CommandInterface):
     def __init__(
         self,
         app: App,
+        transcoder: Transcoder,
     ):
         """Initializes the webm command"""
         self.app = app
+        self.transcoder = transcoder
 
     @property
     def handler_type(self) -> int:
@@ -43,12 +42,12 @@ class WebmBotCommand(CommandInterface):
         file_bytes = self.app.get_file_from_id(message.file_id)
         if file_bytes is None:
             return None
-        mp4 = webm_to_mp4_convert(file_bytes)
+        mp4 = self.transcoder.webm_to_mp4(file_bytes)
         if not mp4:
             return None
         return [
             BotAction(
                 BOT_ACTION_TYPE_REPLY_VIDEO,
-                reply_video=mp4,
+                reply_media_path=mp4,
             ),
         ]
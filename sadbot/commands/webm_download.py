@@ -1,14 +1,12 @@
 """Webm Download bot command"""
-import os
-import random
 import re
-import subprocess
 from typing import List, Optional, Pattern
 
 import requests
 
 from sadbot.bot_action import BOT_ACTION_TYPE_REPLY_VIDEO, BotAction
 from sadbot.command_interface import BOT_HANDLER_TYPE_MESSAGE, CommandInterface
+from sadbot.classes.transcoder import Transcoder
 from sadbot.message import Entity, Message
 
 
@@ -25,6 +23,9 @@ def check_entity(message: Optional[Message], entity: Entity, reg: Pattern) -> bo
 class WebmDownloadBotCommand(CommandInterface):
     """This is the webm download command bot class"""
 
+    def __init__(self, transcoder: Transcoder):
+        self.transcoder = transcoder
+
     @property
     def handler_type(self) -> int:
         """Returns the type of event handled by the command"""
@@ -55,33 +56,12 @@ class WebmDownloadBotCommand(CommandInterface):
                 resp = requests.get(url)
                 if resp.status_code != 200:
                     continue
-                file_name = f"{random.randint(213123, 3123123123213131)}.mp4"
-                with open(file_name, "wb") as file:
-                    file.write(resp.content)
             except requests.ConnectionError:
                 continue
-            output = file_name + ".mp4"
-            retcode = subprocess.call(
-                [
-                    "ffmpeg",
-                    "-i",
-                    file_name,
-                    "-vf",
-                    "pad=ceil(iw/2)*2:ceil(ih/2)*2",
-                    output,
-                ],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-            if retcode != 0:
+            mp4 = self.transcoder.webm_to_mp4(resp.content)
+            if mp4 is None:
                 return None
-            with open(output, "rb") as file:
-                byte_array = file.read()
-            actions.append(
-                BotAction(BOT_ACTION_TYPE_REPLY_VIDEO, reply_video=byte_array)
-            )
-            os.remove(file_name)
-            os.remove(output)
+            actions.append(BotAction(BOT_ACTION_TYPE_REPLY_VIDEO, reply_media_path=mp4))
         if len(actions) == 0:
             return None
         return actions
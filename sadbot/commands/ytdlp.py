@@ -2,19 +2,22 @@
 
 from typing import Optional, List
 
-import random
-import os
-from yt_dlp import YoutubeDL
-
-
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
-from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_VIDEO
+from sadbot.classes.download_manager import DownloadManager
+from sadbot.bot_action import (
+    BotAction,
+    BOT_ACTION_TYPE_REPLY_VIDEO,
+    BOT_ACTION_TYPE_REPLY_TEXT,
+)
 
 
 class YtdlpBotCommand(CommandInterface):
     """This is the YTDLP bot command class"""
 
+    def __init__(self, download_manager: DownloadManager):
+        self.download_manager = download_manager
+
     @property
     def handler_type(self) -> int:
         """Returns the type of event handled by the command"""
@@ -30,29 +33,17 @@ class YtdlpBotCommand(CommandInterface):
         if message is None or message.text is None:
             return []
         watch_url = message.text[7:]
-        file_name = str(random.randint(10000000000, 35000000000)) + ".mp4"
         ydl_opts = {
             "format": "mp4",
             "merge-output-format": "mp4",
-            "outtmpl": file_name,
         }
-        with YoutubeDL(ydl_opts) as ydl:
-            try:
-                ydl.download([watch_url])
-            # pylint: disable=bare-except
-            except:
-                return [
-                    BotAction(
-                        BOT_HANDLER_TYPE_MESSAGE,
-                        reply_text="Something went wrong.",
-                    )
-                ]
-        with open(file_name, "rb") as file:
-            buf = file.read()
-        os.remove(file_name)
+        download = self.download_manager.download(watch_url, ydl_opts, "video")
+        if download.error is not None:
+            return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text=download.error)]
         return [
             BotAction(
                 BOT_ACTION_TYPE_REPLY_VIDEO,
-                reply_video=buf,
+                reply_media_path=download.path,
+                reply_download=download.key,
             )
         ]
@@ -2,19 +2,22 @@
 
 from typing import Optional, List
 
-import random
-import os
-from io import BytesIO
-from yt_dlp import YoutubeDL
-
 from sadbot.command_interface import CommandInterface, BOT_HANDLER_TYPE_MESSAGE
 from sadbot.message import Message
-from sadbot.bot_action import BotAction, BOT_ACTION_TYPE_REPLY_AUDIO
+from sadbot.classes.download_manager import DownloadManager
+from sadbot.bot_action import (
+    BotAction,
+    BOT_ACTION_TYPE_REPLY_AUDIO,
+    BOT_ACTION_TYPE_REPLY_TEXT,
+)
 
 
 class YtdlpAudioBotCommand(CommandInterface):
     """This is the YTDLP audio bot command class"""
 
+    def __init__(self, download_manager: DownloadManager):
+        self.download_manager = download_manager
+
     @property
     def handler_type(self) -> int:
         """Returns the type of event handled by the command"""
@@ -30,7 +33,6 @@ class YtdlpAudioBotCommand(CommandInterface):
         if message is None or message.text is None:
             return []
         watch_url = message.text[5:]
-        file_name = str(random.randint(10000000000, 35000000000))
         ydl_opts = {
             "format": "bestaudio/best",
             "postprocessors": [
@@ -40,23 +42,15 @@ class YtdlpAudioBotCommand(CommandInterface):
                     "preferredquality": "192",
                 }
             ],
-            "outtmpl": file_name,
         }
-        file_name = file_name + ".mp3"
-        with YoutubeDL(ydl_opts) as ydl:
-            try:
-                info_dict = ydl.extract_info(watch_url)
-                title = info_dict.get("title", None)
-            # pylint: disable=bare-except
-            except:
-                return [
-                    BotAction(
-                        BOT_HANDLER_TYPE_MESSAGE,
-                        reply_text="Something went wrong.",
-                    )
-                ]
-        with open(file_name, "rb") as file:
-            buf = BytesIO(file.read())
-            buf.name = title
-        os.remove(file_name)
-        return [BotAction(BOT_ACTION_TYPE_REPLY_AUDIO, reply_audio=buf)]
+        download = self.download_manager.download(watch_url, ydl_opts, "audio")
+        if download.error is not None:
+            return [BotAction(BOT_ACTION_TYPE_REPLY_TEXT, reply_text=download.error)]
+        return [
+            BotAction(
+                BOT_ACTION_TYPE_REPLY_AUDIO,
+                reply_media_path=download.path,
+                reply_media_name=download.title,
+                reply_download=download.key,
+            )
+        ]
@@ -2,10 +2,61 @@
 
 TOKEN = "tokenplaceholder"
 OWNER_ID = 1234567890
+ENGINE = "multiprocessing"  # or "asyncio"
 OFFLINE_ANTIFLOOD_TIMEOUT = 300
 UPDATES_TIMEOUT = 50
 UPDATE_PROCESSING_MAX_TIMEOUT = 120
+UPDATE_WORKERS_NUMBER = 4
+OUTGOING_WORKERS_NUMBER = 2
+ASYNC_THREADS_NUMBER = 16
+ASYNC_PROCESSES_NUMBER = 2
+ASYNC_PROCESS_COMMANDS = ["captcha_welcome", "deepfry", "plot", "ocr", "translate"]
 OUTGOING_REQUESTS_TIMEOUT = 3
+BOT_API_URL = "https://api.telegram.org"  # or a local Bot API server
+BOT_API_POOL_SIZE = 8
+BOT_API_RETRIES = 2
+BOT_API_RETRY_BACKOFF = 0.3
+DATABASE_BUSY_TIMEOUT = 5000  # milliseconds
+DATABASE_CACHE_SIZE = -20000  # negative values are KiB
+DATABASE_BATCH_INTERVAL = 0.2  # seconds
+DATABASE_BATCH_SIZE = 500
+SED_SEARCH_WINDOW = 10000  # recent messages of a chat searched by sed, 0 for all
+REGEX_SANDBOX_WORKERS = 2  # idle workers kept by each process
+REGEX_SANDBOX_TIMEOUT = 2
+REGEX_CACHE_SIZE = 256
+REGEX_BLACKLIST_SIZE = 1024
+COMMAND_PREFIX_MAX_LENGTH = 8
+COMMAND_PREFIX_MAX_NUMBER = 256
+GROUP_CONFIGS_VERSION_SLOTS = 4096
+CHAT_MEMBERS_CACHE_TTL = 60  # seconds
+CHAT_MEMBERS_CACHE_SIZE = 10000  # chat members and chats cached by every process
+CHAT_MEMBERS_VERSION_SLOTS = 4096
+OCR_WORKERS_NUMBER = 1  # never more than the cores, every reader takes ~100s of MB
+OCR_READERS_CACHE_SIZE = 2  # languages kept loaded by every OCR worker
+OCR_MAX_IMAGE_SIZE = 1600  # pixels, the bigger images are shrunk before the OCR
+OCR_TIMEOUT = 60  # keep it below UPDATE_PROCESSING_MAX_TIMEOUT
+OCR_TIME_MARGIN = 15  # seconds of the update processing left to the image and reply
+IMAGE_MAX_SIZE = 1280  # pixels, the working resolution of the image effects
+IMAGE_JPEG_QUALITY = 80
+IMAGE_WEBP_QUALITY = 75
+ACTIVITY_IMAGE_DPI = 300
+DOWNLOAD_JOBS_NUMBER = 2  # downloads running at the same time, across all the workers
+DOWNLOAD_QUEUE_TIMEOUT = 30  # seconds waited for a free download slot
+DOWNLOAD_MAX_SIZE = 50 * 1024 * 1024  # bytes, the Bot API upload limit
+DOWNLOAD_MAX_DURATION = 1800  # seconds
+DOWNLOAD_RESULT_TTL = 300  # seconds a download is kept for the same url requests
+DOWNLOAD_TIME_MARGIN = 30  # seconds of the update processing left to the download
+TRANSCODE_TIMEOUT = 60  # seconds, ffmpeg gets killed after it
+TRANSCODE_QUEUE_TIMEOUT = 30  # seconds waited for a free transcode slot
+TRANSCODE_CACHE_MAX_SIZE = 256 * 1024 * 1024  # bytes
+TRANSLATION_CACHE_SIZE = 1024  # translations cached by every process
+TRANSLATION_TIMEOUT = 10  # seconds
+ASSETS_DIRECTORY = "sadbot/assets"
+FILE_CACHE_DIRECTORY = "./file_cache"
+FILE_CACHE_MAX_SIZE = 512 * 1024 * 1024  # bytes
+FILE_CACHE_MAX_IDS = 100000  # file ids whose file unique id is remembered
+FILE_PATH_VALIDITY = 3600  # seconds a getFile path is guaranteed to work
+FILE_CACHE_CLEANUP_INTERVAL = 300  # seconds between the evictions of the file ids
 MAX_REPLY_LENGTH_MEDIA = 800
 MAX_REPLY_LENGTH_TEXT = 1600
 
@@ -45,9 +96,19 @@ CAPTCHA_KEYBOARD_BUTTONS_PER_LINE = 3
 CAPTCHA_LINE_WIDTH = 1
 CAPTCHA_EXTRA_TEXTS_NUMBER = 7
 CAPTCHA_EXPIRATION = 300
+CAPTCHA_POOL_SIZE = 32  # captchas rendered ahead of time, 0 to disable
 ALLOW_PRIVATE_MESSAGES = False
 MESSAGES_CHAT_RATE_NUMBER = 18
 MESSAGES_CHAT_RATE_PERIOD = 60
 MESSAGES_USER_RATE_NUMBER = 50
 MESSAGES_USER_RATE_PERIOD = 60
+TELEGRAM_GLOBAL_RATE_NUMBER = 30
+TELEGRAM_GLOBAL_RATE_PERIOD = 1
+TELEGRAM_GROUP_RATE_NUMBER = 20
+TELEGRAM_GROUP_RATE_PERIOD = 60
+RATE_LIMITER_SLOTS = 4096
+RATE_LIMITER_PERSISTENCE_INTERVAL = 0  # seconds, 0 disables it
+RATE_LIMIT_MAX_DELAY = 0  # seconds to wait for the antiflood limits before dropping
+SCHEDULER_RETRY_DELAY = 60  # seconds before a failed manager job is run again
+SCHEDULER_MAX_ATTEMPTS = 5  # runs of a failing manager job before it's dropped
 OPENAI_API_KEY = "openaitoken"
@@ -0,0 +1,126 @@
+"""This module contains the Database class"""
+
+import logging
+import os
+import sqlite3
+import threading
+from multiprocessing import util as multiprocessing_util
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sadbot.config import (
+    DATABASE_BUSY_TIMEOUT,
+    DATABASE_CACHE_SIZE,
+    DATABASE_BATCH_INTERVAL,
+    DATABASE_BATCH_SIZE,
+)
+
+
+class Database:
+    """SQLite connection proxy: it can be used as a sqlite3.Connection, but every
+    process and every thread transparently gets its own connection, so a connection
+    is never shared between forked processes or threads.
+
+    The message logging writes can be queued with execute_batched: every process
+    flushes them in a single transaction on a short timer, from a background thread,
+    instead of committing each one of them, and once more when it exits."""
+
+    def __init__(self, path: str) -> None:
+        """Initializes the database proxy"""
+        self.path = path
+        self.functions: List[Tuple[str, int, Callable]] = []
+        self.local = threading.local()
+        self.batch: List[Tuple[str, Sequence]] = []
+        self.batch_lock = threading.Lock()
+        self.batch_event = threading.Event()
+        self.batch_thread: Optional[threading.Thread] = None
+        os.register_at_fork(after_in_child=self.reset_batch)
+        # the forked processes start with no finalizers, they get their own
+        multiprocessing_util.register_after_fork(self, Database.register_exit_flush)
+        self.register_exit_flush()
+        con = self.get_connection()
+        # WAL is persistent, it only needs to be enabled once
+        con.execute("PRAGMA journal_mode = WAL")
+
+    def connect(self) -> sqlite3.Connection:
+        """Opens a new connection"""
+        con = sqlite3.connect(self.path, timeout=DATABASE_BUSY_TIMEOUT / 1000)
+        con.execute(f"PRAGMA busy_timeout = {int(DATABASE_BUSY_TIMEOUT)}")
+        con.execute("PRAGMA synchronous = NORMAL")
+        con.execute("PRAGMA temp_store = MEMORY")
+        con.execute(f"PRAGMA cache_size = {int(DATABASE_CACHE_SIZE)}")
+        for name, args_number, function in self.functions:
+            con.create_function(name, args_number, function)
+        return con
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Returns the connection of the current process and thread"""
+        # a forked process inherits the thread local data of the thread forking it
+        if getattr(self.local, "pid", None) != os.getpid():
+            self.local.con = self.connect()
+            self.local.pid = os.getpid()
+        return self.local.con
+
+    def __getattr__(self, name: str) -> Any:
+        """Forwards everything else to the current connection"""
+        return getattr(self.get_connection(), name)
+
+    def create_function(self, name: str, args_number: int, function: Callable) -> None:
+        """Registers a SQL function on the current and on the future connections"""
+        self.functions.append((name, args_number, function))
+        self.get_connection().create_function(name, args_number, function)
+
+    def register_exit_flush(self) -> None:
+        """Flushes the queued writes when the current process exits: the forked
+        processes skip the atexit handlers, but they run the multiprocessing
+        finalizers, which run at the exit of the main process too"""
+        multiprocessing_util.Finalize(self, self.flush, exitpriority=10)
+
+    def reset_batch(self) -> None:
+        """Resets the batched writes in a forked process, the queued ones are the
+        parent's job and its writer thread isn't running here"""
+        self.batch = []
+        self.batch_lock = threading.Lock()
+        self.batch_event = threading.Event()
+        self.batch_thread = None
+
+    def execute_batched(self, query: str, params: Sequence = ()) -> None:
+        """Queues a write, it's committed along with the others within a while"""
+        with self.batch_lock:
+            if self.batch_thread is None:
+                self.batch_thread = threading.Thread(
+                    target=self.flush_batches, daemon=True
+                )
+                self.batch_thread.start()
+            self.batch.append((query, params))
+            if len(self.batch) >= DATABASE_BATCH_SIZE:
+                self.batch_event.set()
+
+    def flush_batches(self) -> None:
+        """Batch writer main loop"""
+        while True:
+            self.batch_event.wait(DATABASE_BATCH_INTERVAL)
+            self.batch_event.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Commits the queued writes in a single transaction"""
+        with self.batch_lock:
+            batch, self.batch = self.batch, []
+        if not batch:
+            return
+        con = self.get_connection()
+        try:
+            for query, params in batch:
+                con.execute(query, params)
+            con.commit()
+        except sqlite3.Error:
+            con.rollback()
+            # one bad query shouldn't take the whole batch down with it
+            for query, params in batch:
+                try:
+                    con.execute(query, params)
+                    con.commit()
+                except sqlite3.Error as error:
+                    con.rollback()
+                    logging.error("Failed writing a batched query")
+                    logging.error(error)
@@ -1,10 +1,12 @@
 """Here are some functions used used by more files"""
 
+import fcntl
 import os
-import random
-import subprocess
 import time
-from typing import Optional
+from typing import IO, Optional
+
+# seconds between two attempts of taking a file lock
+LOCK_POLL_INTERVAL = 0.2
 
 
 def safe_cast(val, to_type, default=None):
@@ -60,31 +62,40 @@ def convert_to_seconds(time_string: str) -> int:
 
 def convert_to_days(time_string: str) -> int:
     """Converts a time string format to days"""
-    days_per_unit = {"d": 1, "w": 7, "m": 30}
+    days_per_unit = {"d": 1, "w": 7, "m": 30, "y": 365}
     if time_string[-1] not in days_per_unit:
         return safe_cast(time_string, int, 0)
     return safe_cast(time_string[:-1], int, 0) * days_per_unit.get(time_string[-1], 0)
 
 
-def webm_to_mp4_convert(file_bytes: bytes) -> Optional[bytes]:
-    """Converts the input bytes representing a webm into mp4 bytes using ffmpeg"""
-    name = str(random.randint(0, 10000000000))
-    with open(name, "wb") as file:
-        file.write(file_bytes)
-    output = name + ".mp4"
-    retcode = subprocess.call(
-        ["ffmpeg", "-i", name, "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", output],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
-    if retcode != 0:
+def lock_file(file: IO, timeout: float) -> bool:
+    """Locks a file, waiting at most for the given time. The lock is released when
+    the file is closed, even when its process gets killed"""
+    deadline = time.monotonic() + timeout
+    while True:
         try:
-            os.remove(name)
-            os.remove(output)
-        except os.error:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(LOCK_POLL_INTERVAL)
+
+
+def acquire_file_slot(directory: str, slots: int, timeout: float) -> Optional[IO]:
+    """Takes one of the slots locked with the lock files of a folder, waiting at
+    most for the given time for a free one. The slot is released by closing the
+    returned file"""
+    deadline = time.monotonic() + timeout
+    while True:
+        for slot in range(slots):
+            # every process needs its own file: the forked ones would share the lock
+            slot_file = open(  # pylint: disable=consider-using-with
+                os.path.join(directory, f"slot{slot}.lock"), mode="a", encoding="utf-8"
+            )
+            if lock_file(slot_file, 0):
+                return slot_file
+            slot_file.close()
+        if time.monotonic() >= deadline:
             return None
-    with open(output, "rb") as file:
-        output_bytes = file.read()
-    os.remove(name)
-    os.remove(output)
-    return output_bytes
+        time.sleep(LOCK_POLL_INTERVAL)
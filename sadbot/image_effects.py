@@ -0,0 +1,105 @@
+"""This module contains the image decoding, encoding and effects helpers"""
+
+from io import BytesIO
+from typing import Tuple
+
+import numpy
+from PIL import Image
+
+from sadbot.config import IMAGE_MAX_SIZE, IMAGE_JPEG_QUALITY, IMAGE_WEBP_QUALITY
+
+Color = Tuple[int, int, int]
+
+# PIL's smoothing kernel, used by the sharpness enhancement
+SMOOTH_KERNEL = numpy.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=numpy.float32) / 13
+
+
+def open_image(
+    data: bytes, max_size: int = IMAGE_MAX_SIZE
+) -> Tuple[Image.Image, float]:
+    """Decodes an image, never at a resolution higher than needed, and returns it
+    along with the scale it's been shrunk by"""
+    image = Image.open(BytesIO(data))
+    width = image.width
+    # JPEGs get decoded straight at a reduced scale
+    image.draft("RGB", (max_size, max_size))
+    rgb_image = image.convert("RGB")
+    rgb_image.thumbnail((max_size, max_size))
+    return rgb_image, rgb_image.width / width
+
+
+def encode_image(image: Image.Image, image_format: str = "JPEG") -> bytes:
+    """Encodes an image, JPEG or WEBP"""
+    output = BytesIO()
+    if image_format == "WEBP":
+        image.save(output, format="WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+    else:
+        image.save(output, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def to_array(image: Image.Image) -> numpy.ndarray:
+    """Returns the float RGB pixels of an image"""
+    return numpy.asarray(image.convert("RGB"), dtype=numpy.float32)
+
+
+def to_image(array: numpy.ndarray) -> Image.Image:
+    """Returns the image of some float RGB pixels"""
+    return Image.fromarray(numpy.clip(array, 0, 255).astype(numpy.uint8), "RGB")
+
+
+def posterize(array: numpy.ndarray, bits: int) -> numpy.ndarray:
+    """Keeps only the most significant bits of every channel"""
+    mask = (0xFF << (8 - bits)) & 0xFF
+    return (array.astype(numpy.uint8) & mask).astype(numpy.float32)
+
+
+def contrast(channel: numpy.ndarray, factor: float) -> numpy.ndarray:
+    """Enhances the contrast of a channel, around its mean like PIL does"""
+    mean = int(channel.mean() + 0.5)
+    return numpy.clip(mean + (channel - mean) * factor, 0, 255)
+
+
+def colorize(channel: numpy.ndarray, black: Color, white: Color) -> numpy.ndarray:
+    """Maps a channel to the gradient between two colors"""
+    black_array = numpy.array(black, dtype=numpy.float32)
+    white_array = numpy.array(white, dtype=numpy.float32)
+    return black_array + (white_array - black_array) * (channel[..., None] / 255)
+
+
+def sharpen(array: numpy.ndarray, factor: float) -> numpy.ndarray:
+    """Enhances the sharpness of an image, like PIL does, leaving the border alone"""
+    padded = numpy.pad(array, ((1, 1), (1, 1), (0, 0)), mode="edge")
+    height, width = array.shape[:2]
+    smooth = numpy.zeros_like(array)
+    for y_offset in range(3):
+        for x_offset in range(3):
+            smooth += (
+                SMOOTH_KERNEL[y_offset, x_offset]
+                * padded[y_offset : y_offset + height, x_offset : x_offset + width]
+            )
+    sharpened = smooth + (array - smooth) * factor
+    sharpened[0, :] = array[0, :]
+    sharpened[-1, :] = array[-1, :]
+    sharpened[:, 0] = array[:, 0]
+    sharpened[:, -1] = array[:, -1]
+    return sharpened
+
+
+def deepfry(
+    image: Image.Image,
+    colors: Tuple[Color, Color] = ((254, 0, 2), (255, 255, 15)),
+) -> Image.Image:
+    """Deepfries an image"""
+    width, height = image.width, image.height
+    # crunching it: the details lost shrinking it are gone for good
+    image = image.resize(
+        (max(1, int(width**0.75)), max(1, int(height**0.75))),
+        resample=Image.Resampling.BILINEAR,
+    )
+    image = image.resize((width, height), resample=Image.Resampling.BICUBIC)
+    array = posterize(to_array(image), 4)
+    red = contrast(array[..., 0], 3.0) * 1.5
+    fried = colorize(numpy.clip(red, 0, 255), colors[0], colors[1])
+    array = array * 0.25 + fried * 0.75
+    return to_image(sharpen(array, 100.0))
@@ -0,0 +1,2 @@
+"""Load tests of the bot: a fake Bot API server, a load generator replaying the
+updates at a given rate and a monitor of the bot processes"""
@@ -0,0 +1,278 @@
+"""Runs a load test of the bot against the fake Bot API server"""
+
+import argparse
+import ast
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from sadbot import config
+from sadbot.loadtest.fake_bot_api import FakeBotApi
+from sadbot.loadtest.load_generator import (
+    DEFAULT_TEXTS,
+    LoadTestReport,
+    get_recorded_updates,
+    get_report,
+    get_synthetic_updates,
+    read_recorded_updates,
+    replay_updates,
+)
+from sadbot.loadtest.process_monitor import ProcessMonitor, ProcessStats
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_arguments() -> argparse.Namespace:
+    """Parses the command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="python3 -m sadbot.loadtest",
+        description="Load tests the bot against a local fake Bot API server",
+    )
+    parser.add_argument("--engine", choices=["multiprocessing", "asyncio"])
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="overrides a config setting, the value is a Python literal",
+    )
+    parser.add_argument("--rate", type=float, default=10, help="updates per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--updates", help="recorded updates, replayed in a loop")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument(
+        "--text",
+        action="append",
+        help="a synthetic message text, chosen at random for every message",
+    )
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="seconds")
+    parser.add_argument(
+        "--too-many-requests", type=float, default=0.0, help="share of 429s"
+    )
+    parser.add_argument(
+        "--rate-limit", type=float, default=0.0, help="sent messages per second"
+    )
+    parser.add_argument("--retry-after", type=int, default=1, help="seconds")
+    parser.add_argument("--media", help="the file downloaded for every file id")
+    parser.add_argument(
+        "--drain", type=float, default=30, help="seconds to wait for the replies"
+    )
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--json", help="writes the report to a file too")
+    parser.add_argument(
+        "--keep", action="store_true", help="keeps the run folder, with the bot logs"
+    )
+    return parser.parse_args()
+
+
+def get_config_overrides(settings: List[str]) -> Dict[str, object]:
+    """Parses the config settings overrides"""
+    overrides = {}
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        if not hasattr(config, name.strip()):
+            sys.exit(f"Unknown config setting: {name}")
+        try:
+            overrides[name.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            sys.exit(f"Invalid value of {name}: {value}")
+    return overrides
+
+
+def prepare_run_directory(overrides: Dict[str, object]) -> str:
+    """Creates the folder the bot runs in: its database, its logs and its caches
+    end up there, and its package is linked there, with its own config"""
+    directory = tempfile.mkdtemp(prefix="sadbot-loadtest-")
+    package_directory = os.path.join(directory, "sadbot")
+    os.mkdir(package_directory)
+    for entry in os.listdir(PACKAGE_DIRECTORY):
+        if entry in ("config.py", "__pycache__"):
+            continue
+        os.symlink(
+            os.path.join(PACKAGE_DIRECTORY, entry),
+            os.path.join(package_directory, entry),
+        )
+    shutil.copyfile(
+        os.path.join(PACKAGE_DIRECTORY, "config.py"),
+        os.path.join(package_directory, "config.py"),
+    )
+    with open(
+        os.path.join(package_directory, "config.py"), mode="a", encoding="utf-8"
+    ) as config_file:
+        config_file.write("\n# load test overrides\n")
+        for name, value in overrides.items():
+            config_file.write(f"{name} = {value!r}\n")
+    return directory
+
+
+def start_bot(directory: str, api_url: str, engine: Optional[str]) -> subprocess.Popen:
+    """Starts the bot, in a process group of its own"""
+    env = {
+        **os.environ,
+        "TOKEN": "loadtest",
+        "BOT_API_URL": api_url,
+        "PYTHONPATH": os.pathsep.join(
+            [directory]
+            + ([os.environ["PYTHONPATH"]] if "PYTHONPATH" in os.environ else [])
+        ),
+    }
+    if engine is not None:
+        env["ENGINE"] = engine
+    with open(os.path.join(directory, "bot.out"), mode="wb") as output:
+        # pylint: disable=consider-using-with
+        return subprocess.Popen(
+            [sys.executable, "-m", "sadbot"],
+            cwd=directory,
+            env=env,
+            stdout=output,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+
+def stop_bot(process: subprocess.Popen) -> None:
+    """Stops the bot and all of its processes"""
+    for stop_signal in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, stop_signal)
+        except ProcessLookupError:
+            return
+        try:
+            process.wait(timeout=5)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def wait_for_bot(api: FakeBotApi, process: subprocess.Popen, timeout: float) -> bool:
+    """Waits until the bot starts polling the updates, returns False if it dies or
+    takes too long"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        if api.polled.wait(0.5):
+            return True
+    return False
+
+
+def wait_for_replies(api: FakeBotApi, timeout: float) -> None:
+    """Waits until every update has been answered, or for a while"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with api.condition:
+            if all(record.reply_time is not None for record in api.records.values()):
+                return
+        time.sleep(0.1)
+
+
+def format_latency(latency: Dict[str, Optional[float]]) -> str:
+    """Returns some latency percentiles, in milliseconds"""
+    return "  ".join(
+        f"{name} {'-' if value is None else f'{value * 1000:.0f}ms'}"
+        for name, value in latency.items()
+    )
+
+
+def print_report(report: LoadTestReport, processes: List[ProcessStats]) -> None:
+    """Prints the report of a load test"""
+    print(f"updates: {report.updates_number} in {report.duration:.1f}s", end=" ")
+    print(f"({report.updates_per_second:.1f}/s)")
+    print(f"delivered: {report.delivered_number}")
+    print(f"answered: {report.answered_number}", end=" ")
+    print(f"replies: {report.replies_number} ({report.replies_per_second:.1f}/s)")
+    print(f"reply latency: {format_latency(report.reply_latency)}")
+    print(f"delivery latency: {format_latency(report.delivery_latency)}")
+    print("requests:")
+    for method, number in sorted(report.requests.items()):
+        too_many_requests = report.too_many_requests.get(method, 0)
+        if too_many_requests:
+            print(f"  {method}: {number} (429: {too_many_requests})")
+        else:
+            print(f"  {method}: {number}")
+    print("processes:")
+    print(f"  {'pid':>8} {'parent':>8} {'cpu':>8} {'cpu %':>6} {'max rss':>10}")
+    for stats in processes:
+        print(
+            f"  {stats.pid:>8} {stats.parent_pid:>8} {stats.used_cpu_time:>7.2f}s"
+            f" {stats.cpu_usage * 100:>6.1f} {stats.max_rss / 2**20:>8.1f}MB"
+        )
+    total_cpu_time = sum(stats.used_cpu_time for stats in processes)
+    print(f"  total cpu: {total_cpu_time:.2f}s", end=" ")
+    print(f"({total_cpu_time / max(report.updates_number, 1) * 1000:.1f}ms/update)")
+
+
+def main() -> None:
+    """Runs a load test"""
+    arguments = get_arguments()
+    overrides = get_config_overrides(arguments.set)
+    media = b""
+    if arguments.media is not None:
+        with open(arguments.media, mode="rb") as media_file:
+            media = media_file.read()
+    api = FakeBotApi(
+        latency=arguments.latency,
+        jitter=arguments.jitter,
+        too_many_requests_ratio=arguments.too_many_requests,
+        rate_limit=arguments.rate_limit,
+        retry_after=arguments.retry_after,
+        media=media,
+    )
+    if arguments.updates is not None:
+        updates = get_recorded_updates(read_recorded_updates(arguments.updates))
+    else:
+        updates = get_synthetic_updates(
+            arguments.chats, arguments.users, arguments.text or DEFAULT_TEXTS
+        )
+    directory = prepare_run_directory(overrides)
+    api_url = api.start()
+    process = start_bot(directory, api_url, arguments.engine)
+    try:
+        if not wait_for_bot(api, process, arguments.startup_timeout):
+            sys.exit(f"The bot didn't start, see {directory}/bot.out")
+        monitor = ProcessMonitor(process.pid)
+        monitor.start()
+        start_time = time.time()
+        replay_updates(api, updates, arguments.rate, arguments.duration)
+        duration = time.time() - start_time
+        wait_for_replies(api, arguments.drain)
+        processes = monitor.stop()
+    finally:
+        stop_bot(process)
+        api.stop()
+    report = get_report(api, duration)
+    print_report(report, processes)
+    if arguments.json is not None:
+        with open(arguments.json, mode="w", encoding="utf-8") as report_file:
+            json.dump(
+                {
+                    **asdict(report),
+                    "processes": [
+                        {
+                            **asdict(stats),
+                            "used_cpu_time": stats.used_cpu_time,
+                            "cpu_usage": stats.cpu_usage,
+                        }
+                        for stats in processes
+                    ],
+                },
+                report_file,
+                indent=2,
+            )
+    if arguments.keep:
+        print(f"run folder: {directory}")
+    else:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""This module contains the fake Bot API server used by the load tests"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+FAKE_BOT_ID = 1000
+# the max number of updates returned by a getUpdates call, like Telegram does
+FAKE_UPDATES_LIMIT = 100
+
+# the fields of the media sent by the send methods, and their mime types
+SEND_METHODS = {
+    "sendMessage": (None, None),
+    "sendPhoto": ("photo", "image/jpeg"),
+    "sendVideo": ("video", "video/mp4"),
+    "sendAnimation": ("animation", "video/mp4"),
+    "sendAudio": ("audio", "audio/mpeg"),
+    "sendVoice": ("voice", "audio/ogg"),
+    "sendDocument": ("document", "application/octet-stream"),
+    "sendSticker": ("sticker", "image/webp"),
+}
+
+# the updates kinds carrying a message of a chat
+MESSAGE_UPDATE_KINDS = ["message", "edited_message", "channel_post"]
+
+
+@dataclass
+class UpdateRecord:  # pylint: disable=too-many-instance-attributes
+    """The timings of an update sent to the bot"""
+
+    update_id: int
+    chat_id: Optional[int]
+    message_id: Optional[int]
+    queued_time: float
+    delivered_time: Optional[float] = None
+    reply_time: Optional[float] = None
+
+
+@dataclass
+class FakeBotApiStats:
+    """What the fake Bot API has seen"""
+
+    requests: Dict[str, int] = field(default_factory=dict)
+    too_many_requests: Dict[str, int] = field(default_factory=dict)
+    replies_number: int = 0
+    first_reply_time: Optional[float] = None
+    last_reply_time: Optional[float] = None
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, Any]:
+    """Returns the fields of a multipart body, the files are replaced by their size"""
+    message = BytesParser().parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    params: Dict[str, Any] = {}
+    for part in message.walk():
+        name = part.get_param("name", header="content-disposition")
+        if part.is_multipart() or name is None:
+            continue
+        payload = part.get_payload(decode=True)
+        if not isinstance(payload, bytes):
+            payload = b""
+        if part.get_filename() is not None:
+            params[str(name)] = len(payload)
+        else:
+            params[str(name)] = payload.decode(errors="replace")
+    return params
+
+
+def get_int(value: Any) -> Optional[int]:
+    """Returns a request parameter as an integer"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class FakeBotApi:  # pylint: disable=too-many-instance-attributes
+    """A local stand-in for the Telegram Bot API.
+
+    The load generator queues the updates, the bot long polls them as usual and
+    its requests are answered with made up results, after the configured latency.
+    A share of the requests, and the ones exceeding the rate limit, get a 429.
+    The replies are matched to the updates they answer, by the message they reply
+    to or else by the oldest unanswered update of their chat, to time them."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        too_many_requests_ratio: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: int = 1,
+        media: bytes = b"",
+    ) -> None:
+        """Initializes the fake Bot API"""
+        self.latency = latency
+        self.jitter = jitter
+        self.too_many_requests_ratio = too_many_requests_ratio
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.media = media
+        self.condition = threading.Condition()
+        self.updates: Deque[Dict] = deque()
+        self.records: Dict[int, UpdateRecord] = {}
+        self.records_by_message: Dict[Tuple[Optional[int], int], UpdateRecord] = {}
+        self.unanswered: Dict[Optional[int], Deque[UpdateRecord]] = {}
+        self.stats = FakeBotApiStats()
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.send_times: Deque[float] = deque()
+        self.polled = threading.Event()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts serving in a background thread, returns the server url"""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Handles the requests of the bot"""
+
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                """Handles a file download or a method called with GET"""
+                api.handle_request(self)
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                """Handles a method call"""
+                api.handle_request(self)
+
+            # pylint: disable-next=arguments-differ
+            def log_message(self, *args: Any) -> None:
+                """Keeps the requests out of the output"""
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self) -> None:
+        """Stops serving"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def get_message_id(self) -> int:
+        """Returns a new message id, the bot's messages share them with the
+        updates ones"""
+        with self.condition:
+            message_id = self.next_message_id
+            self.next_message_id += 1
+            return message_id
+
+    def add_update(self, update: Dict) -> int:
+        """Queues an update, as if it just happened: its id, its message id and its
+        date are replaced"""
+        now = time.time()
+        chat_id = None
+        message_id = None
+        for kind in MESSAGE_UPDATE_KINDS:
+            if kind in update:
+                message_id = self.get_message_id()
+                update[kind]["message_id"] = message_id
+                update[kind]["date"] = int(now)
+                chat_id = update[kind].get("chat", {}).get("id")
+                break
+        with self.condition:
+            update["update_id"] = self.next_update_id
+            self.next_update_id += 1
+            record = UpdateRecord(update["update_id"], chat_id, message_id, now)
+            self.records[record.update_id] = record
+            if message_id is not None:
+                self.records_by_message[(chat_id, message_id)] = record
+                self.unanswered.setdefault(chat_id, deque()).append(record)
+            self.updates.append(update)
+            self.condition.notify_all()
+        return update["update_id"]
+
+    def get_updates(self, params: Dict[str, Any]) -> List[Dict]:
+        """Long polls the queued updates"""
+        self.polled.set()
+        offset = get_int(params.get("offset")) or 0
+        timeout = get_int(params.get("timeout")) or 0
+        deadline = time.time() + timeout
+        with self.condition:
+            # the updates before the offset are confirmed
+            while self.updates and self.updates[0]["update_id"] < offset:
+                self.updates.popleft()
+            while not self.updates and time.time() < deadline:
+                self.condition.wait(deadline - time.time())
+            updates = list(self.updates)[:FAKE_UPDATES_LIMIT]
+            now = time.time()
+            for update in updates:
+                record = self.records[update["update_id"]]
+                if record.delivered_time is None:
+                    record.delivered_time = now
+        return updates
+
+    def is_rate_limited(self) -> bool:
+        """Checks if a sent message exceeds the rate limit, or gets a 429 anyway"""
+        if random.random() < self.too_many_requests_ratio:
+            return True
+        if self.rate_limit <= 0:
+            return False
+        now = time.time()
+        with self.condition:
+            while self.send_times and self.send_times[0] < now - 1:
+                self.send_times.popleft()
+            if len(self.send_times) >= self.rate_limit:
+                return True
+            self.send_times.append(now)
+        return False
+
+    def record_reply(self, chat_id: Optional[int], reply_to: Optional[int]) -> None:
+        """Times the update a reply answers"""
+        now = time.time()
+        with self.condition:
+            self.stats.replies_number += 1
+            if self.stats.first_reply_time is None:
+                self.stats.first_reply_time = now
+            self.stats.last_reply_time = now
+            record = None
+            if reply_to is not None:
+                record = self.records_by_message.get((chat_id, reply_to))
+            unanswered = self.unanswered.get(chat_id)
+            while (record is None or record.reply_time is not None) and unanswered:
+                record = unanswered.popleft()
+            if record is not None and record.reply_time is None:
+                record.reply_time = now
+
+    def get_sent_message(self, method: str, params: Dict[str, Any]) -> Dict:
+        """Returns the made up message sent by a send method"""
+        chat_id = get_int(params.get("chat_id"))
+        message: Dict[str, Any] = {
+            "message_id": self.get_message_id(),
+            "from": {
+                "id": FAKE_BOT_ID,
+                "is_bot": True,
+                "first_name": "sadbot",
+                "username": "sadbot",
+            },
+            "chat": {"id": chat_id, "type": "supergroup", "title": "Load test"},
+            "date": int(time.time()),
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if "caption" in params:
+            message["caption"] = params["caption"]
+        media_field, mime_type = SEND_METHODS[method]
+        if media_field is not None:
+            media = {
+                "file_id": f"{media_field}-{message['message_id']}",
+                "file_unique_id": f"{media_field}-{message['message_id']}",
+                "mime_type": mime_type,
+            }
+            message[media_field] = [media] if media_field == "photo" else media
+        return message
+
+    def get_result(self, method: str, params: Dict[str, Any]) -> Any:
+        """Returns the made up result of a method"""
+        chat_id = get_int(params.get("chat_id"))
+        user_id = get_int(params.get("user_id"))
+        results: Dict[str, Any] = {
+            "getMe": {
+                "id": FAKE_BOT_ID,
+                "is_bot": True,
+                "first_name": "sadbot",
+                "username": "sadbot",
+            },
+            "getChat": {
+                "id": chat_id,
+                "type": "supergroup",
+                "title": "Load test",
+                "permissions": {"can_send_messages": True},
+            },
+            "getChatMember": {
+                "status": "member",
+                "user": {"id": user_id, "is_bot": False, "first_name": "user"},
+            },
+            "getChatAdministrators": [],
+            "getFile": {
+                "file_id": params.get("file_id"),
+                "file_unique_id": params.get("file_id"),
+                "file_size": len(self.media),
+                "file_path": f"files/{params.get('file_id')}",
+            },
+        }
+        return results.get(method, True)
+
+    def handle_request(self, handler: BaseHTTPRequestHandler) -> None:
+        """Answers a request of the bot"""
+        url = urlsplit(handler.path)
+        body = self.read_body(handler)
+        if url.path.startswith("/file/"):
+            self.send_response(handler, 200, self.media, "application/octet-stream")
+            return
+        method = url.path.rsplit("/", 1)[-1]
+        params = self.parse_params(handler, url.query, body)
+        with self.condition:
+            self.stats.requests[method] = self.stats.requests.get(method, 0) + 1
+        if method == "getUpdates":
+            response: Dict[str, Any] = {"ok": True, "result": self.get_updates(params)}
+            self.send_json(handler, 200, response)
+            return
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if method in SEND_METHODS and self.is_rate_limited():
+            with self.condition:
+                self.stats.too_many_requests[method] = (
+                    self.stats.too_many_requests.get(method, 0) + 1
+                )
+            response = {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+            self.send_json(handler, 429, response)
+            return
+        if method in SEND_METHODS:
+            result = self.get_sent_message(method, params)
+            self.record_reply(
+                result["chat"]["id"], get_int(params.get("reply_to_message_id"))
+            )
+        else:
+            result = self.get_result(method, params)
+        self.send_json(handler, 200, {"ok": True, "result": result})
+
+    @staticmethod
+    def read_body(handler: BaseHTTPRequestHandler) -> bytes:
+        """Reads the body of a request, chunked or not"""
+        if handler.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+        body = b""
+        while True:
+            size = int(handler.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                handler.rfile.readline()
+                return body
+            body += handler.rfile.read(size)
+            handler.rfile.readline()
+
+    @staticmethod
+    def parse_params(
+        handler: BaseHTTPRequestHandler, query: str, body: bytes
+    ) -> Dict[str, Any]:
+        """Returns the parameters of a method call, whatever their encoding"""
+        params: Dict[str, Any] = dict(parse_qsl(query))
+        content_type = handler.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            params.update(parse_multipart(content_type, body))
+        elif content_type.startswith("application/json"):
+            try:
+                params.update(json.loads(body))
+            except ValueError:
+                pass
+        else:
+            params.update(parse_qsl(body.decode(errors="replace")))
+        return params
+
+    @staticmethod
+    def send_response(
+        handler: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str
+    ) -> None:
+        """Sends a response"""
+        try:
+            handler.send_response(status)
+            handler.send_header("Content-Type", content_type)
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        except OSError:
+            # the bot went away, like when it's stopped during a long poll
+            pass
+
+    def send_json(
+        self, handler: BaseHTTPRequestHandler, status: int, response: Dict
+    ) -> None:
+        """Sends a JSON response"""
+        self.send_response(
+            handler, status, json.dumps(response).encode(), "application/json"
+        )
@@ -0,0 +1,151 @@
+"""This module contains the load generator and the load tests report"""
+
+import copy
+import itertools
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from sadbot.loadtest.fake_bot_api import FakeBotApi
+
+# the synthetic messages are commands with a cheap reply, so every one gets timed
+DEFAULT_TEXTS = ["!ping"]
+
+
+def get_synthetic_updates(
+    chats_number: int, users_number: int, texts: List[str]
+) -> Iterator[Dict]:
+    """Returns endless text messages, from random users in random group chats"""
+    while True:
+        chat_id = -1000000000000 - random.randrange(chats_number)
+        user_id = 1 + random.randrange(users_number)
+        yield {
+            "message": {
+                "from": {
+                    "id": user_id,
+                    "is_bot": False,
+                    "first_name": f"User {user_id}",
+                    "username": f"user{user_id}",
+                },
+                "chat": {
+                    "id": chat_id,
+                    "type": "supergroup",
+                    "title": f"Chat {chat_id}",
+                },
+                "text": random.choice(texts),
+            }
+        }
+
+
+def read_recorded_updates(path: str) -> List[Dict]:
+    """Reads some recorded updates: a getUpdates response, a JSON list of updates,
+    or one update per line"""
+    with open(path, mode="r", encoding="utf-8") as updates_file:
+        content = updates_file.read()
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        return data.get("result", [data])
+    return data
+
+
+def get_recorded_updates(updates: List[Dict]) -> Iterator[Dict]:
+    """Returns the recorded updates over and over"""
+    for update in itertools.cycle(updates):
+        yield copy.deepcopy(update)
+
+
+def replay_updates(
+    api: FakeBotApi,
+    updates: Iterator[Dict],
+    rate: float,
+    duration: float,
+) -> int:
+    """Queues the updates at the given rate for a while, returns how many"""
+    start_time = time.time()
+    updates_number = 0
+    for update in updates:
+        due_time = start_time + updates_number / rate
+        if due_time - start_time >= duration:
+            break
+        delay = due_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        api.add_update(update)
+        updates_number += 1
+    return updates_number
+
+
+def get_percentile(values: List[float], percentile: float) -> Optional[float]:
+    """Returns a percentile of some values, by the nearest rank"""
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(len(values) * percentile / 100 + 0.5) - 1))
+    return values[index]
+
+
+@dataclass
+class LoadTestReport:  # pylint: disable=too-many-instance-attributes
+    """The results of a load test"""
+
+    updates_number: int
+    delivered_number: int
+    answered_number: int
+    replies_number: int
+    duration: float
+    updates_per_second: float
+    replies_per_second: float
+    reply_latency: Dict[str, Optional[float]]
+    delivery_latency: Dict[str, Optional[float]]
+    requests: Dict[str, int]
+    too_many_requests: Dict[str, int]
+
+
+def get_latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    """Returns the percentiles of some latencies"""
+    return {
+        "p50": get_percentile(latencies, 50),
+        "p90": get_percentile(latencies, 90),
+        "p99": get_percentile(latencies, 99),
+        "max": max(latencies) if latencies else None,
+    }
+
+
+def get_report(api: FakeBotApi, duration: float) -> LoadTestReport:
+    """Returns the report of what the fake Bot API has seen"""
+    with api.condition:
+        records = list(api.records.values())
+        stats = copy.deepcopy(api.stats)
+    reply_latencies = [
+        record.reply_time - record.queued_time
+        for record in records
+        if record.reply_time is not None
+    ]
+    delivery_latencies = [
+        record.delivered_time - record.queued_time
+        for record in records
+        if record.delivered_time is not None
+    ]
+    replies_duration = 0.0
+    if stats.first_reply_time is not None and stats.last_reply_time is not None:
+        replies_duration = stats.last_reply_time - stats.first_reply_time
+    return LoadTestReport(
+        updates_number=len(records),
+        delivered_number=len(delivery_latencies),
+        answered_number=len(reply_latencies),
+        replies_number=stats.replies_number,
+        duration=duration,
+        updates_per_second=len(records) / duration if duration > 0 else 0.0,
+        replies_per_second=(
+            stats.replies_number / replies_duration if replies_duration > 0 else 0.0
+        ),
+        reply_latency=get_latency_summary(reply_latencies),
+        delivery_latency=get_latency_summary(delivery_latencies),
+        requests=stats.requests,
+        too_many_requests=stats.too_many_requests,
+    )
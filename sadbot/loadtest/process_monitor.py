@@ -0,0 +1,120 @@
+"""This module contains the process monitor of the load tests, it reads /proc so
+it only works on Linux"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass
+class ProcessStats:  # pylint: disable=too-many-instance-attributes
+    """The resources used by a process of the bot"""
+
+    pid: int
+    parent_pid: int
+    name: str
+    start_cpu_time: float
+    cpu_time: float
+    first_seen: float
+    last_seen: float
+    max_rss: int
+
+    @property
+    def used_cpu_time(self) -> float:
+        """Returns the CPU time used while it's been monitored"""
+        return self.cpu_time - self.start_cpu_time
+
+    @property
+    def cpu_usage(self) -> float:
+        """Returns the share of a core it's used while it's been monitored"""
+        elapsed = self.last_seen - self.first_seen
+        return self.used_cpu_time / elapsed if elapsed > 0 else 0.0
+
+
+def read_process(pid: int) -> Optional[Tuple[int, str, float, int]]:
+    """Returns the parent pid, the name, the CPU time and the RSS of a process"""
+    try:
+        with open(f"/proc/{pid}/stat", mode="r", encoding="utf-8") as stat_file:
+            stat = stat_file.read()
+    except OSError:
+        return None
+    # the name may contain spaces and parentheses, the fields after it don't
+    name = stat[stat.index("(") + 1 : stat.rindex(")")]
+    fields = stat[stat.rindex(")") + 2 :].split()
+    cpu_time = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return int(fields[1]), name, cpu_time, int(fields[21]) * PAGE_SIZE
+
+
+class ProcessMonitor:
+    """Samples the CPU time and the memory of a process and of all its children,
+    the ones started and killed in the meantime (like the timed out workers)
+    included"""
+
+    def __init__(self, pid: int, interval: float = 0.5) -> None:
+        """Initializes the monitor"""
+        self.pid = pid
+        self.interval = interval
+        self.processes: Dict[int, ProcessStats] = {}
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def get_process_tree(self) -> Dict[int, Tuple[int, str, float, int]]:
+        """Returns the processes descending from the monitored one"""
+        processes = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                process = read_process(int(entry))
+                if process is not None:
+                    processes[int(entry)] = process
+        tree = {}
+        pids = [self.pid]
+        while pids:
+            pid = pids.pop()
+            if pid not in processes:
+                continue
+            tree[pid] = processes[pid]
+            pids += [child for child, data in processes.items() if data[0] == pid]
+        return tree
+
+    def sample(self) -> None:
+        """Takes a sample of every process"""
+        now = time.time()
+        for pid, (parent_pid, name, cpu_time, rss) in self.get_process_tree().items():
+            stats = self.processes.get(pid)
+            if stats is None:
+                # a process seen for the first time while monitoring was just born
+                self.processes[pid] = ProcessStats(
+                    pid, parent_pid, name, 0.0, cpu_time, now, now, rss
+                )
+                continue
+            stats.cpu_time = cpu_time
+            stats.last_seen = now
+            stats.max_rss = max(stats.max_rss, rss)
+
+    def run(self) -> None:
+        """Samples the processes until it's stopped"""
+        while not self.stopped.is_set():
+            self.sample()
+            self.stopped.wait(self.interval)
+
+    def start(self) -> None:
+        """Starts sampling in a background thread, what's been used before is left
+        out of the report"""
+        self.sample()
+        for stats in self.processes.values():
+            stats.start_cpu_time = stats.cpu_time
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> List[ProcessStats]:
+        """Stops sampling, returns the stats of the processes"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.sample()
+        return sorted(self.processes.values(), key=lambda stats: stats.pid)
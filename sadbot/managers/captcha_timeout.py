@@ -1,9 +1,10 @@
 """Here is the captcha timeout manager"""
-import datetime
+from dataclasses import asdict
 from typing import Optional, List, Dict
 
 from sadbot.message import Message
 from sadbot.classes.captcha import Captcha
+from sadbot.classes.scheduler import Scheduler
 from sadbot.message_repository import MessageRepository
 from sadbot.action_manager_interface import ActionManagerInterface
 from sadbot.commands.captcha_kick import CaptchaKickBotCommand
@@ -17,21 +18,57 @@ class CaptchaTimeoutManager(ActionManagerInterface):
         message_repository: MessageRepository,
         captcha: Captcha,
         captcha_kick: CaptchaKickBotCommand,
+        scheduler: Scheduler,
     ):
         """Initializes the event handler"""
         self.message_repository = message_repository
         self.captcha = captcha
         self.captcha_kick = captcha_kick
-        self.instances: Dict[str, Dict] = {}
+        self.scheduler = scheduler
         self.restore_dead_instances()
 
+    def schedule_timeout(
+        self,
+        captcha_id: str,
+        trigger_message: Optional[Message],
+        sent_message: Optional[Message],
+    ) -> None:
+        """Schedules the kick of a user, for when the captcha expires"""
+        (
+            _chat_id,
+            _sender_id,
+            _message_id,
+            start_time,
+            expiration,
+        ) = captcha_id.split(".")
+        self.scheduler.schedule(
+            "CaptchaTimeoutManager",
+            captcha_id,
+            int(start_time) + int(expiration),
+            {
+                "captcha_id": captcha_id,
+                # the entities aren't needed to kick someone
+                "trigger_message": (
+                    None
+                    if trigger_message is None
+                    else {**asdict(trigger_message), "entities": None}
+                ),
+                "sent_message_id": (
+                    None if sent_message is None else sent_message.message_id
+                ),
+            },
+        )
+
     def restore_dead_instances(self) -> None:
-        """Restores dead submanager instances in case the bot have restarted."""
+        """Schedules the captchas left without a timeout, like the ones made
+        before the timeouts were scheduled jobs"""
         unsolved_captchas = self.captcha.get_unsolved_captchas()
         if unsolved_captchas is None:
             return
         for captcha in unsolved_captchas:
             captcha_id = captcha[0]
+            if self.scheduler.is_scheduled("CaptchaTimeoutManager", captcha_id):
+                continue
             (
                 chat_id,
                 _sender_id,
@@ -42,11 +79,7 @@ class CaptchaTimeoutManager(ActionManagerInterface):
             trigger_message = self.message_repository.get_message_from_id(
                 message_id, chat_id
             )
-            self.instances[captcha_id] = {
-                "trigger_message": trigger_message,
-                "sent_message": None,
-                "captcha_id": captcha_id,
-            }
+            self.schedule_timeout(captcha_id, trigger_message, None)
 
     def handle_callback(
         self,
@@ -56,44 +89,25 @@ class CaptchaTimeoutManager(ActionManagerInterface):
     ) -> None:
         if callback_manager_info is None:
             return
-        instance_id = callback_manager_info["captcha_id"]
-        self.instances[instance_id] = {
-            "trigger_message": trigger_message,
-            "sent_message": sent_message,
-            "captcha_id": instance_id,
-        }
+        self.schedule_timeout(
+            callback_manager_info["captcha_id"], trigger_message, sent_message
+        )
 
-    def get_actions(self) -> Optional[List[List]]:
+    def get_scheduled_actions(self, job_data: Dict) -> Optional[List[List]]:
         """Kicks the user who didn't complete the captcha"""
-        actions = []
-        inactive_instance_ids = []
-        now = datetime.datetime.utcnow().timestamp()
-        for captcha_id, captcha_instance in self.instances.items():
-            if self.captcha.get_captcha_from_id(captcha_id) is None:
-                inactive_instance_ids.append(captcha_id)
-                continue
-            (
-                _chat_id,
-                _sender_id,
-                _message_id,
-                start_time,
-                expiration,
-            ) = captcha_id.split(".")
-            if int(expiration) + int(start_time) > now:
-                continue
-            trigger_message = captcha_instance["trigger_message"]
-            sent_message = captcha_instance["sent_message"]
-            message_to_delete = None
-            if sent_message is not None:
-                message_to_delete = sent_message.message_id
-            actions.append(
-                [
-                    trigger_message,
-                    self.captcha_kick.kick_user(
-                        trigger_message, captcha_id, False, message_to_delete
-                    ),
-                ]
-            )
-        for captcha_id in inactive_instance_ids:
-            del self.instances[captcha_id]
-        return actions
+        captcha_id = job_data["captcha_id"]
+        # solved in the meantime, or there's no one to kick
+        if (
+            self.captcha.get_captcha_from_id(captcha_id) is None
+            or job_data["trigger_message"] is None
+        ):
+            return None
+        trigger_message = Message(**job_data["trigger_message"])
+        return [
+            [
+                trigger_message,
+                self.captcha_kick.kick_user(
+                    trigger_message, captcha_id, False, job_data["sent_message_id"]
+                ),
+            ]
+        ]
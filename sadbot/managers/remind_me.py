@@ -1,10 +1,12 @@
 """Here is the reminder manager"""
-import datetime
 import sqlite3
+import time
 from typing import Optional, List, Dict
 
 from sadbot.message import Message
 from sadbot.message_repository import MessageRepository
+from sadbot.migrations import migrate, get_schema_version
+from sadbot.classes.scheduler import Scheduler
 from sadbot.action_manager_interface import ActionManagerInterface
 from sadbot.bot_action import (
     BotAction,
@@ -26,6 +28,42 @@ def get_reminders_table_creation_query() -> str:
     """
 
 
+def get_reminders_migrations() -> List[List[str]]:
+    """Returns the reminders table migrations"""
+    return [
+        [
+            """
+            CREATE INDEX IF NOT EXISTS reminders_time
+            ON reminders (RemindTime)
+            """,
+        ],
+        [
+            # the reminders are scheduled jobs now
+            """
+            INSERT OR IGNORE INTO scheduled_jobs (
+              Manager,
+              JobKey,
+              DueTime,
+              JobData
+            )
+            SELECT
+              'RemindMeManager',
+              RemindUserID || '.' || TriggerMessageID,
+              RemindTime,
+              json_object(
+                'trigger_message_id', TriggerMessageID,
+                'remind_message_id', RemindMessageID,
+                'chat_id', CAST(RemindUserID AS int)
+              )
+            FROM reminders
+            """,
+            """
+            DROP TABLE reminders
+            """,
+        ],
+    ]
+
+
 class RemindMeManager(ActionManagerInterface):
     """Handles the reminder"""
 
@@ -33,11 +71,16 @@ class RemindMeManager(ActionManagerInterface):
         self,
         con: sqlite3.Connection,
         message_repository: MessageRepository,
+        scheduler: Scheduler,
     ):
         """Initializes the event handler"""
         self.con = con
-        self.con.execute(get_reminders_table_creation_query())
+        # the old reminders table is gone once they have been moved
+        if get_schema_version(self.con, "reminders") == 0:
+            self.con.execute(get_reminders_table_creation_query())
+        migrate(self.con, "reminders", get_reminders_migrations())
         self.message_repository = message_repository
+        self.scheduler = scheduler
 
     def handle_callback(
         self,
@@ -52,52 +95,17 @@ class RemindMeManager(ActionManagerInterface):
         self.set_reminder(trigger_message, duration)
 
     def set_reminder(self, trigger_message: Message, duration: int) -> None:
-        """Inserts a reminder into the db"""
-        query = """
-        INSERT INTO reminders (
-          TriggerMessageID,
-          RemindMessageID,
-          RemindUserID,
-          RemindChatID,
-          RemindTime
-        ) VALUES (?, ?, ?, ?, ?)
-        """
-        remind_time = int(datetime.datetime.utcnow().timestamp()) + duration
-        self.con.execute(
-            query,
-            [
-                trigger_message.message_id,
-                trigger_message.reply_id,
-                trigger_message.chat_id,
-                trigger_message.sender_id,
-                remind_time,
-            ],
+        """Schedules a reminder"""
+        self.scheduler.schedule(
+            "RemindMeManager",
+            f"{trigger_message.chat_id}.{trigger_message.message_id}",
+            time.time() + duration,
+            {
+                "trigger_message_id": trigger_message.message_id,
+                "remind_message_id": trigger_message.reply_id,
+                "chat_id": trigger_message.chat_id,
+            },
         )
-        self.con.commit()
-
-    def delete_expired_reminders(self, current_time: int) -> None:
-        """Removes expired reminders"""
-        query = """
-        DELETE FROM reminders
-        WHERE RemindTime < ?
-        """
-        self.con.execute(query, [current_time])
-        self.con.commit()
-
-    def get_reminders(self) -> Optional[List]:
-        """Gets all the reminders"""
-        cur = self.con.cursor()
-        query = """
-        SELECT
-          TriggerMessageID,
-          RemindMessageID,
-          RemindUserID,
-          RemindChatID,
-          RemindTime
-        FROM reminders
-        """
-        cur.execute(query)
-        return cur.fetchall()
 
     def get_remind_reply(
         self, trigger_message_id: int, reminder_message_id: int, chat_id: int
@@ -132,17 +140,12 @@ class RemindMeManager(ActionManagerInterface):
         ]
         return [trigger_message, actions]
 
-    def get_actions(self) -> Optional[List[List]]:
+    def get_scheduled_actions(self, job_data: Dict) -> Optional[List[List]]:
         """This is a wise funcitons which knows stuff and reminds it lol"""
-        knowledge = self.get_reminders()
-        if knowledge is None:
-            return None
-        actions = []
-        current_time = int(datetime.datetime.utcnow().timestamp())
-        for reminder in knowledge:
-            if reminder[4] < current_time:
-                actions.append(
-                    self.get_remind_reply(reminder[0], reminder[1], reminder[2])
-                )
-        self.delete_expired_reminders(current_time)
-        return actions
+        return [
+            self.get_remind_reply(
+                job_data["trigger_message_id"],
+                job_data["remind_message_id"],
+                job_data["chat_id"],
+            )
+        ]
@@ -1,5 +1,5 @@
 """Here is the systemd restart manager"""
-from typing import Optional, List, Dict
+from typing import Optional, Dict
 import os
 
 from sadbot.message import Message
@@ -18,8 +18,3 @@ class SystemdRestartManager(ActionManagerInterface):
         """Handles the callback and restarts the bot"""
         # Remember to allow this command in /etc/sudoers
         os.system("sudo service sadbot restart")
-
-    @staticmethod
-    def get_actions() -> Optional[List[List]]:
-        """Returns bot actions"""
-        return None
@@ -1,17 +1,19 @@
 """Here is the MessageRepository class"""
 
+import logging
 import os.path
-import datetime
 import re
 import json
 import sqlite3
 from dataclasses import asdict
-from typing import Optional, List, Any
-from multiprocessing import Manager, Process
-from multiprocessing.managers import ListProxy
+from typing import Optional, List, Any, Tuple, cast
 
 from sadbot.message import Message, Entity
 from sadbot.user import User
+from sadbot.migrations import migrate
+from sadbot.database import Database
+from sadbot.regex_sandbox import RegexSandbox, compile_regex, get_regex_literals
+from sadbot.config import SED_SEARCH_WINDOW
 
 
 def regex_lambda(x_val: str, y_val: str) -> int:
@@ -19,11 +21,28 @@ def regex_lambda(x_val: str, y_val: str) -> int:
     if y_val is None:
         return 0
     try:
-        return 1 if re.search(str(x_val), str(y_val)) else 0
+        return 1 if compile_regex(str(x_val)).search(str(y_val)) else 0
     except re.error:
         return 0
 
 
+def get_fts_query(literals: List[str]) -> str:
+    """Returns the full-text query matching all the given literal strings"""
+    return " AND ".join('"' + literal.replace('"', '""') + '"' for literal in literals)
+
+
+def is_fts_available(con: sqlite3.Connection) -> bool:
+    """Checks if SQLite has been built with FTS5 and its trigram tokenizer"""
+    try:
+        con.execute(
+            "CREATE VIRTUAL TABLE temp.fts_check USING fts5(Text, tokenize='trigram')"
+        )
+        con.execute("DROP TABLE temp.fts_check")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
 def get_messages_table_creation_query() -> str:
     """Returns the table creation query"""
     return """
@@ -55,27 +74,186 @@ def get_usernames_table_creation_query() -> str:
     """
 
 
-def get_bot_triggers_table_creation_query() -> str:
-    """Returns the bot triggers table creation query"""
-    return """
-    CREATE TABLE IF NOT EXISTS bot_triggers (
-      ChatID      int,
-      UserID      int,
-      MessageTime int
-    )
+def get_messages_migrations() -> List[List[str]]:
+    """Returns the messages and usernames tables migrations"""
+    return [
+        [
+            # the bot triggers are rate limited in memory now
+            "DROP TABLE IF EXISTS bot_triggers",
+        ],
+        [
+            """
+            DELETE FROM messages
+            WHERE rowid NOT IN (
+              SELECT MAX(rowid)
+              FROM messages
+              GROUP BY ChatID, MessageID
+            )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS messages_chat_message
+            ON messages (ChatID, MessageID)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS messages_sender_chat_time
+            ON messages (SenderID, ChatID, MessageTime)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS messages_chat_time
+            ON messages (ChatID, MessageTime)
+            """,
+        ],
+        [
+            """
+            DELETE FROM usernames
+            WHERE rowid NOT IN (
+              SELECT MAX(rowid)
+              FROM usernames
+              GROUP BY UserID
+            )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS usernames_user
+            ON usernames (UserID)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS usernames_username
+            ON usernames (Username)
+            """,
+        ],
+    ]
+
+
+def get_messages_fts_migrations() -> List[List[str]]:
+    """Returns the messages full-text index migrations"""
+    # the index points to the implicit rowids of the messages table: a VACUUM could
+    # renumber them, it needs to be followed by a 'rebuild' of the index
+    return [
+        [
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+              Message,
+              content='messages',
+              content_rowid='rowid',
+              tokenize='trigram'
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert
+            AFTER INSERT ON messages
+            WHEN new.Message IS NOT NULL
+            BEGIN
+              INSERT INTO messages_fts (rowid, Message)
+              VALUES (new.rowid, new.Message);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete
+            AFTER DELETE ON messages
+            WHEN old.Message IS NOT NULL
+            BEGIN
+              INSERT INTO messages_fts (messages_fts, rowid, Message)
+              VALUES ('delete', old.rowid, old.Message);
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update
+            AFTER UPDATE OF Message ON messages
+            BEGIN
+              INSERT INTO messages_fts (messages_fts, rowid, Message)
+              SELECT 'delete', old.rowid, old.Message
+              WHERE old.Message IS NOT NULL;
+              INSERT INTO messages_fts (rowid, Message)
+              SELECT new.rowid, new.Message
+              WHERE new.Message IS NOT NULL;
+            END
+            """,
+            "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')",
+        ],
+    ]
+
+
+def get_message_counts_migrations() -> List[List[str]]:
+    """Returns the message counts rollup table migrations"""
+    return [
+        [
+            """
+            CREATE TABLE IF NOT EXISTS message_counts (
+              ChatID   int,
+              Hour     int,
+              SenderID int,
+              Count    int,
+              PRIMARY KEY (ChatID, Hour, SenderID)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS message_counts_insert
+            AFTER INSERT ON messages
+            WHEN new.MessageTime IS NOT NULL AND new.ChatID IS NOT NULL
+            BEGIN
+              INSERT INTO message_counts (ChatID, Hour, SenderID, Count)
+              VALUES (
+                new.ChatID, new.MessageTime / 3600, COALESCE(new.SenderID, 0), 1
+              )
+              ON CONFLICT (ChatID, Hour, SenderID) DO UPDATE SET Count = Count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS message_counts_delete
+            AFTER DELETE ON messages
+            WHEN old.MessageTime IS NOT NULL AND old.ChatID IS NOT NULL
+            BEGIN
+              UPDATE message_counts
+              SET Count = Count - 1
+              WHERE ChatID = old.ChatID
+              AND Hour = old.MessageTime / 3600
+              AND SenderID = COALESCE(old.SenderID, 0);
+            END
+            """,
+            get_message_counts_backfill_query(),
+        ],
+    ]
+
+
+def get_message_counts_backfill_query(per_chat: bool = False) -> str:
+    """Returns the query counting the messages already in the messages table, or
+    only the ones of the chat given as its parameter"""
+    return f"""
+    INSERT OR REPLACE INTO message_counts (ChatID, Hour, SenderID, Count)
+    SELECT ChatID, MessageTime / 3600, COALESCE(SenderID, 0), count(*)
+    FROM messages
+    WHERE MessageTime IS NOT NULL AND ChatID IS NOT NULL
+    {"AND ChatID = ?" if per_chat else ""}
+    GROUP BY ChatID, MessageTime / 3600, COALESCE(SenderID, 0)
     """
 
 
 class MessageRepository:  # pylint: disable=R0904
     """This class handles the messages database"""
 
-    def __init__(self, con: sqlite3.Connection) -> None:
+    def __init__(self, con: Database, regex_sandbox: RegexSandbox) -> None:
         """Initializes the message repository class"""
         self.con = con
+        self.regex_sandbox = regex_sandbox
+        self.regex_sandbox.register("previous_message", self.find_previous_message)
         self.con.create_function("regexp", 2, regex_lambda)
         self.con.execute(get_messages_table_creation_query())
         self.con.execute(get_usernames_table_creation_query())
-        self.con.execute(get_bot_triggers_table_creation_query())
+        migrate(
+            cast(sqlite3.Connection, self.con), "messages", get_messages_migrations()
+        )
+        self.fts_enabled = is_fts_available(cast(sqlite3.Connection, self.con))
+        if self.fts_enabled:
+            migrate(
+                cast(sqlite3.Connection, self.con),
+                "messages_fts",
+                get_messages_fts_migrations(),
+            )
+        migrate(
+            cast(sqlite3.Connection, self.con),
+            "message_counts",
+            get_message_counts_migrations(),
+        )
         self.heal_database()
 
     def heal_database(self) -> None:
@@ -108,16 +286,6 @@ class MessageRepository:  # pylint: disable=R0904
         cur.execute(query)
         return cur.fetchall()
 
-    def delete_old_bot_triggers_logs(self, time: int) -> None:
-        """Deletes old bot triggers"""
-        query = """
-        DELETE FROM bot_triggers
-        WHERE MessageTime < ?
-        """
-        message_time = datetime.datetime.utcnow().timestamp() - time
-        self.con.execute(query, [message_time])
-        self.con.commit()
-
     def get_count_messages_sent_in_range(
         self, begin: int, end: int, chat_id: int
     ) -> int:
@@ -139,64 +307,50 @@ class MessageRepository:  # pylint: disable=R0904
             return 0
         return data[0][2]
 
-    def get_n_timestamp_chat(self, chat_id: int, message_number: int) -> int:
-        """Returns the timestamp of the last n message sent in a specific chat"""
-        if message_number == 0:
-            return 0
+    def get_hourly_message_counts(
+        self, begin: int, end: int, chat_id: int, user_id: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """Returns the start time and the count of messages of every hour with some
+        messages in a range of time, from the rollup table"""
         cur = self.con.cursor()
         query = """
         SELECT
-          ChatID,
-          UserID,
-          MessageTime
-        FROM bot_triggers
+          Hour * 3600,
+          SUM(Count)
+        FROM message_counts
         WHERE ChatID = ?
-        ORDER BY MessageTime DESC
-        LIMIT ?
+        AND Hour >= ?
+        AND Hour < ?
+        AND (? IS NULL OR SenderID = ?)
+        GROUP BY Hour
+        ORDER BY Hour
         """
-        cur.execute(query, [chat_id, message_number])
-        data = cur.fetchall()
-        if not data:
-            return 0
-        if len(data) < message_number:
-            return 0
-        return data[-1][2]
+        cur.execute(query, [chat_id, begin // 3600, -(-end // 3600), user_id, user_id])
+        return cur.fetchall()
 
-    def get_n_timestamp_user(self, user_id: int, message_number: int) -> int:
-        """Returns the timestamp of the last n message sent by a specific user"""
-        if message_number == 0:
-            return 0
+    def rebuild_message_counts(self) -> None:
+        """Counts again all the messages in the rollup table, one chat at a time, so
+        that the other processes are never locked out of the database for long.
+        The messages still queued in the write batches of the other processes aren't
+        there yet: they're counted by the triggers when they're written"""
         cur = self.con.cursor()
-        query = """
-        SELECT
-          ChatID,
-          UserID,
-          MessageTime
-        FROM bot_triggers
-        WHERE UserID = ?
-        ORDER BY MessageTime DESC
-        LIMIT ?
-        """
-        cur.execute(query, [user_id, message_number])
-        data = cur.fetchall()
-        if not data:
-            return 0
-        if len(data) < message_number:
-            return 0
-        return data[-1][2]
-
-    def log_bot_trigger(self, chat_id: int, user_id: int) -> None:
-        """Logs a bot trigger"""
-        query = """
-        INSERT INTO bot_triggers (
-          ChatID,
-          UserID,
-          MessageTime
-        ) VALUES (?, ?, ?)
-        """
-        message_time = datetime.datetime.utcnow().timestamp()
-        self.con.execute(query, [chat_id, user_id, message_time])
-        self.con.commit()
+        cur.execute("""
+            SELECT DISTINCT ChatID FROM messages WHERE ChatID IS NOT NULL
+            UNION
+            SELECT DISTINCT ChatID FROM message_counts
+            """)
+        for (chat_id,) in cur.fetchall():
+            self.con.execute("BEGIN")
+            try:
+                self.con.execute(
+                    "DELETE FROM message_counts WHERE ChatID = ?", [chat_id]
+                )
+                self.con.execute(get_message_counts_backfill_query(True), [chat_id])
+                self.con.commit()
+            except sqlite3.Error as error:
+                self.con.rollback()
+                logging.error("Failed rebuilding the message counts of %s", chat_id)
+                logging.error(error)
 
     def get_user_id_from_username(self, username: str) -> Optional[int]:
         """Checks if a username is in the usernames table"""
@@ -260,41 +414,26 @@ class MessageRepository:  # pylint: disable=R0904
             return None
         return User(data[0], data[1])
 
-    def update_username(self, user_id: int, username: str) -> bool:
-        """Updates a username"""
-        query = """
-          UPDATE usernames
-          SET Username = ?
-          WHERE UserID = ?
-        """
-        self.con.execute(query, [username, user_id])
-        self.con.commit()
-        return True
-
     def insert_username(self, user_id: int, username: Optional[str]) -> bool:
-        """Inserts a username into the usernames table"""
+        """Inserts or updates a username into the usernames table"""
         if username is None:
             return False
-        db_username = self.get_username_from_id(user_id)
-        if db_username is not None:
-            if db_username != username:
-                return self.update_username(user_id, username)
-            return False
         query = """
           INSERT INTO usernames (
             UserID,
             Username
           ) VALUES (?, ?)
+          ON CONFLICT (UserID) DO UPDATE SET Username = excluded.Username
+          WHERE Username IS NOT excluded.Username
         """
-        self.con.execute(query, [user_id, username])
-        self.con.commit()
+        self.con.execute_batched(query, [user_id, username])
         return True
 
     def insert_message(self, message: Message) -> None:
         """Inserts a message into the database"""
         self.insert_username(message.sender_id, message.sender_username)
         query = """
-          INSERT INTO messages (
+          INSERT OR IGNORE INTO messages (
             MessageID,
             SenderName,
             SenderID,
@@ -311,7 +450,7 @@ class MessageRepository:  # pylint: disable=R0904
           ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         entities_dump = self.get_entities_dump(message.entities)
-        self.con.execute(
+        self.con.execute_batched(
             query,
             (
                 message.message_id,
@@ -329,31 +468,42 @@ class MessageRepository:  # pylint: disable=R0904
                 entities_dump,
             ),
         )
-        self.con.commit()
 
     def get_previous_message(
         self, message: Message, regex: Optional[str] = None
     ) -> Optional[Message]:
-        """Calls a worker which tries to retrieve, from the database, a message matching some things
-        or a regex pattern and  eventually kills it if it gets stuck"""
-        manager = Manager()
-        result_tuple: ListProxy = manager.list()
-        message_process = Process(
-            target=self.get_previous_message_worker, args=(result_tuple, message, regex)
-        )
-        message_process.start()
-        message_process.join(2)
-        message_process.kill()
-        message_process.join()
-        if not result_tuple:
+        """Retrieves a previous message matching some things or a regex pattern, the
+        regex lookups run in the sandbox, which kills them if they get stuck"""
+        if regex:
+            data = self.regex_sandbox.run("previous_message", regex, message)
+        else:
+            data = self.find_previous_message(regex, message)
+        if data is None:
             return None
-        result_list = list(result_tuple)
-        result_tuple[12] = self.load_entities_list(result_list[12])
+        result_list = list(data)
+        result_list[12] = self.load_entities_list(result_list[12])
         return Message(*result_list)
 
-    def get_previous_message_worker(
-        self, result_list: List, message: Message, regex: Optional[str] = None
-    ) -> None:
+    def get_search_window_start(self, chat_id: int) -> int:
+        """Returns the rowid where the recent messages window of a chat starts"""
+        cur = self.con.cursor()
+        query = """
+          SELECT
+            rowid
+          FROM messages
+          WHERE ChatID = ?
+          ORDER BY MessageID DESC
+          LIMIT 1 OFFSET ?
+        """
+        cur.execute(query, [chat_id, SED_SEARCH_WINDOW - 1])
+        data = cur.fetchone()
+        if data is None:
+            return 0
+        return data[0]
+
+    def find_previous_message(
+        self, regex: Optional[str], message: Message
+    ) -> Optional[List]:
         """Retrieves a previous message from the database matching some things or a regex pattern"""
         cur = self.con.cursor()
         query = """
@@ -385,25 +535,42 @@ class MessageRepository:  # pylint: disable=R0904
             query += " AND ChatID = ?"
             params.append(message.chat_id)
         if regex:
+            window_start = 0
+            if message.chat_id and SED_SEARCH_WINDOW > 0:
+                window_start = self.get_search_window_start(message.chat_id)
+                query += " AND rowid >= ?"
+                params.append(window_start)
+            literals = get_regex_literals(regex) if self.fts_enabled else []
+            if literals:
+                # cheap index prefilter, the regex has the last word on its candidates
+                query += """
+                  AND rowid IN (
+                    SELECT rowid
+                    FROM messages_fts
+                    WHERE messages_fts MATCH ?
+                    AND rowid >= ?
+                  )
+                """
+                params += [get_fts_query(literals), window_start]
             query += " AND Message REGEXP ?"
             params.append(regex)
         query += " ORDER BY MessageID DESC"
         cur.execute(query, params)
         data = cur.fetchone()
-        if data is not None:
-            for element in data:
-                result_list.append(element)
+        if data is None:
+            return None
+        return list(data)
 
-    def edit_message(self, message_id: int, message_text: str) -> None:
+    def edit_message(self, message_id: int, chat_id: int, message_text: str) -> None:
         """Edits a message in the messages table and updates the events table"""
         query = """
           UPDATE messages
           SET Message = ?
           WHERE MessageID = ?
+          AND ChatID = ?
         """
-        params = [message_text, message_id]
-        self.con.execute(query, params)
-        self.con.commit()
+        params = [message_text, message_id, chat_id]
+        self.con.execute_batched(query, params)
 
     def get_reply_message(self, message: Message) -> Optional[Message]:
         """Retrieve the reply to a message from DB"""
@@ -0,0 +1,60 @@
+"""This module contains the versioned schema migrations helper"""
+
+import logging
+import sqlite3
+from typing import List
+
+
+def get_migrations_table_creation_query() -> str:
+    """Returns the migrations table creation query"""
+    return """
+    CREATE TABLE IF NOT EXISTS migrations (
+      Namespace text PRIMARY KEY,
+      Version   int
+    )
+    """
+
+
+def get_schema_version(con: sqlite3.Connection, namespace: str) -> int:
+    """Returns the number of migrations applied to a namespace"""
+    cur = con.cursor()
+    cur.execute("SELECT Version FROM migrations WHERE Namespace = ?", [namespace])
+    data = cur.fetchone()
+    if data is None:
+        return 0
+    return data[0]
+
+
+def migrate(
+    con: sqlite3.Connection, namespace: str, migrations: List[List[str]]
+) -> None:
+    """Applies the migrations of a namespace that haven't been applied yet.
+
+    Every migration is a list of queries run in a single transaction, and the
+    migrations are never edited or reordered once released: new ones are appended."""
+    con.execute(get_migrations_table_creation_query())
+    con.commit()
+    version = get_schema_version(con, namespace)
+    for new_version, queries in enumerate(migrations[version:], start=version + 1):
+        try:
+            con.execute("BEGIN")
+            for query in queries:
+                con.execute(query)
+            con.execute(
+                """
+                INSERT INTO migrations (
+                  Namespace,
+                  Version
+                ) VALUES (?, ?)
+                ON CONFLICT (Namespace) DO UPDATE SET Version = excluded.Version
+                """,
+                [namespace, new_version],
+            )
+            con.commit()
+        except sqlite3.Error as error:
+            con.rollback()
+            logging.error(
+                "Failed applying the migration %s of %s", new_version, namespace
+            )
+            logging.error(error)
+            raise
@@ -0,0 +1,122 @@
+"""This module contains the OutgoingQueue class"""
+
+import heapq
+import itertools
+import multiprocessing
+import queue
+import time
+from typing import List, Optional, Tuple
+
+from sadbot.message import Message
+from sadbot.bot_action import (
+    BotAction,
+    BOT_ACTION_PRIORITY_LOW,
+    BOT_ACTION_PRIORITY_MEDIUM,
+    BOT_ACTION_PRIORITY_HIGH,
+)
+
+BOT_ACTION_PRIORITIES = [
+    BOT_ACTION_PRIORITY_HIGH,
+    BOT_ACTION_PRIORITY_MEDIUM,
+    BOT_ACTION_PRIORITY_LOW,
+]
+
+
+def get_destination_chat_id(message: Message, reply_info: BotAction) -> int:
+    """Returns the id of the chat an outgoing action is sent to"""
+    if reply_info.reply_chat_id is not None:
+        return reply_info.reply_chat_id
+    return message.chat_id
+
+
+def get_priority_lane(reply_info: BotAction) -> int:
+    """Returns the index of the lane of an outgoing action, 0 is the fastest one"""
+    if reply_info.reply_priority in BOT_ACTION_PRIORITIES:
+        return BOT_ACTION_PRIORITIES.index(reply_info.reply_priority)
+    return len(BOT_ACTION_PRIORITIES) - 1
+
+
+class OutgoingQueue:
+    """Outgoing actions queue shared by the processes.
+
+    It's split in shards, one for each sender worker: every chat always goes to the
+    same shard, so its actions are sent in order. Every shard has a lane for each
+    priority, and the higher priority lanes are always emptied first. The actions
+    held back by the rate limits are deferred, without holding up the shard."""
+
+    def __init__(self, shards_number: int) -> None:
+        """Initializes the outgoing queue"""
+        self.shards_number = max(1, shards_number)
+        self.queues: List[multiprocessing.Queue] = [
+            multiprocessing.Queue() for _ in range(self.shards_number)
+        ]
+        # the lanes live in the sender of each shard: the actions received are kept
+        # there, ordered by lane and then by arrival, until they are taken
+        self.lanes: List[List[Tuple[int, int, Tuple[Message, BotAction]]]] = [
+            [] for _ in range(self.shards_number)
+        ]
+        # the deferred actions of every shard, ordered by the time they are due
+        self.deferred: List[
+            List[Tuple[float, int, Tuple[Message, BotAction, float]]]
+        ] = [[] for _ in range(self.shards_number)]
+        self.arrivals = itertools.count()
+
+    def get_shard(self, chat_id: int) -> int:
+        """Returns the shard of a chat"""
+        return chat_id % self.shards_number
+
+    def put(self, message: Message, reply_info: BotAction) -> None:
+        """Queues an outgoing action"""
+        shard = self.get_shard(get_destination_chat_id(message, reply_info))
+        self.queues[shard].put((message, reply_info))
+
+    def receive(self, shard: int, timeout: Optional[float]) -> None:
+        """Moves the actions received by a shard into its lanes, waiting for them
+        if the lanes are empty"""
+        lanes = self.lanes[shard]
+        block = not lanes
+        while True:
+            try:
+                message, reply_info = self.queues[shard].get(block, timeout)
+            except queue.Empty:
+                return
+            heapq.heappush(
+                lanes,
+                (
+                    get_priority_lane(reply_info),
+                    next(self.arrivals),
+                    (message, reply_info),
+                ),
+            )
+            block = False
+
+    def get(self, shard: int) -> Tuple[Message, BotAction, float]:
+        """Waits for an outgoing action of a shard and returns it, with the seconds
+        it has already been deferred for"""
+        deferred = self.deferred[shard]
+        while True:
+            now = time.time()
+            if deferred and deferred[0][0] <= now:
+                return heapq.heappop(deferred)[2]
+            self.receive(shard, deferred[0][0] - now if deferred else None)
+            if self.lanes[shard]:
+                message, reply_info = heapq.heappop(self.lanes[shard])[2]
+                return message, reply_info, 0.0
+
+    def defer(
+        self,
+        shard: int,
+        message: Message,
+        reply_info: BotAction,
+        delay: float,
+        wait: float,
+    ) -> None:
+        """Gives an action back to its shard, to be returned again after a while"""
+        heapq.heappush(
+            self.deferred[shard],
+            (
+                time.time() + wait,
+                next(self.arrivals),
+                (message, reply_info, delay + wait),
+            ),
+        )
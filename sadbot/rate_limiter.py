@@ -0,0 +1,227 @@
+"""This module contains the RateLimiter class"""
+
+import multiprocessing
+import sqlite3
+import time
+from typing import List, Tuple
+
+from sadbot.message import Message
+from sadbot.bot_action import BotAction, BOT_ACTION_PRIORITY_HIGH
+from sadbot.outgoing_queue import get_destination_chat_id
+from sadbot.config import (
+    MESSAGES_CHAT_RATE_NUMBER,
+    MESSAGES_CHAT_RATE_PERIOD,
+    MESSAGES_USER_RATE_NUMBER,
+    MESSAGES_USER_RATE_PERIOD,
+    TELEGRAM_GLOBAL_RATE_NUMBER,
+    TELEGRAM_GLOBAL_RATE_PERIOD,
+    TELEGRAM_GROUP_RATE_NUMBER,
+    TELEGRAM_GROUP_RATE_PERIOD,
+    RATE_LIMITER_SLOTS,
+    RATE_LIMITER_PERSISTENCE_INTERVAL,
+)
+
+# every bucket slot is made of: key, tokens, last refill time
+BUCKET_SLOT_SIZE = 3
+
+
+def get_rate_limits_table_creation_query() -> str:
+    """Returns the rate limits table creation query"""
+    return """
+    CREATE TABLE IF NOT EXISTS rate_limits (
+      Bucket     text,
+      BucketKey  int,
+      Tokens     real,
+      LastRefill real
+    )
+    """
+
+
+class TokenBuckets:
+    """A fixed size table of token buckets living in shared memory.
+
+    Every key is hashed to a slot: when two keys collide the older bucket is simply
+    replaced by a full one, so the table never grows and never needs to be pruned."""
+
+    def __init__(self, name: str, capacity: int, period: float, slots: int) -> None:
+        """Initializes the token buckets"""
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = capacity / period if period > 0 else 0
+        self.slots = max(1, slots)
+        self.values = multiprocessing.RawArray("d", self.slots * BUCKET_SLOT_SIZE)
+
+    def get_offset(self, key: int) -> int:
+        """Returns the offset of the slot of a key"""
+        return (hash(key) % self.slots) * BUCKET_SLOT_SIZE
+
+    def get_tokens(self, key: int, now: float) -> float:
+        """Returns the tokens available in the bucket of a key"""
+        offset = self.get_offset(key)
+        if self.values[offset + 2] == 0 or self.values[offset] != key:
+            return self.capacity
+        elapsed = max(0.0, now - self.values[offset + 2])
+        return min(self.capacity, self.values[offset + 1] + elapsed * self.refill_rate)
+
+    def get_wait(self, key: int, now: float) -> float:
+        """Returns how long to wait before a token is available, 0 if it already is"""
+        if self.capacity <= 0:
+            return 0
+        tokens = self.get_tokens(key, now)
+        if tokens >= 1:
+            return 0
+        if self.refill_rate <= 0:
+            return float("inf")
+        return (1 - tokens) / self.refill_rate
+
+    def take(self, key: int, now: float) -> None:
+        """Takes a token from the bucket of a key"""
+        if self.capacity <= 0:
+            return
+        tokens = self.get_tokens(key, now)
+        offset = self.get_offset(key)
+        self.values[offset] = key
+        self.values[offset + 1] = tokens - 1
+        self.values[offset + 2] = now
+
+    def dump(self) -> List[Tuple[str, int, float, float]]:
+        """Returns the buckets in use"""
+        return [
+            (
+                self.name,
+                int(self.values[offset]),
+                self.values[offset + 1],
+                self.values[offset + 2],
+            )
+            for offset in range(0, self.slots * BUCKET_SLOT_SIZE, BUCKET_SLOT_SIZE)
+            if self.values[offset + 2] != 0
+        ]
+
+    def restore(self, key: int, tokens: float, last_refill: float) -> None:
+        """Restores a bucket"""
+        offset = self.get_offset(key)
+        self.values[offset] = key
+        self.values[offset + 1] = tokens
+        self.values[offset + 2] = last_refill
+
+
+class RateLimiter:
+    """Token bucket rate limiter for the outgoing actions, shared by the processes.
+
+    It enforces the bot limits per user and per chat, which the high priority actions
+    bypass, and Telegram's own limits, global and per group, which apply to every
+    outgoing message. The messages over Telegram's limits are only delayed."""
+
+    def __init__(self, con: sqlite3.Connection) -> None:
+        """Initializes the rate limiter"""
+        self.con = con
+        self.lock = multiprocessing.Lock()
+        self.users = TokenBuckets(
+            "user",
+            MESSAGES_USER_RATE_NUMBER,
+            MESSAGES_USER_RATE_PERIOD,
+            RATE_LIMITER_SLOTS,
+        )
+        self.chats = TokenBuckets(
+            "chat",
+            MESSAGES_CHAT_RATE_NUMBER,
+            MESSAGES_CHAT_RATE_PERIOD,
+            RATE_LIMITER_SLOTS,
+        )
+        self.groups = TokenBuckets(
+            "group",
+            TELEGRAM_GROUP_RATE_NUMBER,
+            TELEGRAM_GROUP_RATE_PERIOD,
+            RATE_LIMITER_SLOTS,
+        )
+        self.bot = TokenBuckets(
+            "bot", TELEGRAM_GLOBAL_RATE_NUMBER, TELEGRAM_GLOBAL_RATE_PERIOD, 1
+        )
+        # the bot's own limits, the actions held back by them may be dropped
+        self.antiflood = [self.users, self.chats]
+        self.last_save_time = time.time()
+        if RATE_LIMITER_PERSISTENCE_INTERVAL > 0:
+            self.con.execute(get_rate_limits_table_creation_query())
+            self.load()
+
+    def get_buckets(
+        self, message: Message, reply_info: BotAction, is_message: bool
+    ) -> List[Tuple[TokenBuckets, int]]:
+        """Returns the buckets an outgoing action goes through"""
+        buckets = []
+        if reply_info.reply_priority != BOT_ACTION_PRIORITY_HIGH:
+            if message.sender_id is not None:
+                buckets.append((self.users, message.sender_id))
+            buckets.append((self.chats, message.chat_id))
+        if is_message:
+            buckets.append((self.bot, 0))
+            chat_id = get_destination_chat_id(message, reply_info)
+            if chat_id < 0:
+                buckets.append((self.groups, chat_id))
+        return buckets
+
+    def acquire(
+        self, message: Message, reply_info: BotAction, is_message: bool
+    ) -> Tuple[float, bool]:
+        """Takes the tokens needed to send an outgoing action: returns 0 if they are
+        taken, otherwise how many seconds to wait before trying again, along with
+        whether it's the bot's own antiflood limits that are holding it back"""
+        buckets = self.get_buckets(message, reply_info, is_message)
+        with self.lock:
+            now = time.time()
+            waits = [
+                (token_buckets.get_wait(key, now), token_buckets in self.antiflood)
+                for token_buckets, key in buckets
+            ]
+            antiflood_wait = max(
+                (wait for wait, antiflood in waits if antiflood), default=0
+            )
+            if antiflood_wait > 0:
+                return antiflood_wait, True
+            wait = max((wait for wait, _ in waits), default=0)
+            if wait > 0:
+                return wait, False
+            for token_buckets, key in buckets:
+                token_buckets.take(key, now)
+        return 0, False
+
+    def load(self) -> None:
+        """Loads the saved buckets"""
+        buckets = {
+            token_buckets.name: token_buckets
+            for token_buckets in [self.users, self.chats, self.groups, self.bot]
+        }
+        cur = self.con.cursor()
+        cur.execute("SELECT Bucket, BucketKey, Tokens, LastRefill FROM rate_limits")
+        for name, key, tokens, last_refill in cur.fetchall():
+            if name in buckets:
+                buckets[name].restore(key, tokens, last_refill)
+
+    def save(self) -> None:
+        """Saves the buckets, so that the limits survive a restart"""
+        with self.lock:
+            rows = []
+            for token_buckets in [self.users, self.chats, self.groups, self.bot]:
+                rows += token_buckets.dump()
+        self.con.execute("DELETE FROM rate_limits")
+        self.con.executemany(
+            """
+            INSERT INTO rate_limits (
+              Bucket,
+              BucketKey,
+              Tokens,
+              LastRefill
+            ) VALUES (?, ?, ?, ?)
+            """,
+            rows,
+        )
+        self.con.commit()
+
+    def save_if_due(self) -> None:
+        """Saves the buckets every once in a while, if the persistence is enabled"""
+        if RATE_LIMITER_PERSISTENCE_INTERVAL <= 0:
+            return
+        if time.time() - self.last_save_time < RATE_LIMITER_PERSISTENCE_INTERVAL:
+            return
+        self.last_save_time = time.time()
+        self.save()
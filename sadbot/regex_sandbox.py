@@ -0,0 +1,362 @@
+"""This module contains the RegexSandbox class and some regex helpers"""
+
+import functools
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse  # type: ignore
+    from re import _constants as sre_constants  # type: ignore
+except ImportError:  # python < 3.11
+    import sre_parse  # pylint: disable=deprecated-module
+    import sre_constants  # pylint: disable=deprecated-module
+
+from sadbot.config import (
+    REGEX_SANDBOX_WORKERS,
+    REGEX_SANDBOX_TIMEOUT,
+    REGEX_CACHE_SIZE,
+    REGEX_BLACKLIST_SIZE,
+)
+
+# pylint: disable=no-member
+REGEX_REPEATS = [sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT]
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):  # python >= 3.11
+    REGEX_REPEATS.append(sre_constants.POSSESSIVE_REPEAT)
+
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compile_regex(regex: str) -> re.Pattern:
+    """Compiles a regex, the sandbox workers live long enough to cache them"""
+    return re.compile(regex)
+
+
+def parse_regex(regex: str) -> Optional[Any]:
+    """Parses a regex, returns None if it's not valid"""
+    try:
+        return sre_parse.parse(regex)
+    except (re.error, RecursionError, OverflowError):
+        return None
+
+
+def get_regex_literals(regex: str) -> List[str]:
+    """Returns the literal strings, long enough to be searched in the full-text
+    index, that every match of a regex contains"""
+    parsed = parse_regex(regex)
+    if parsed is None:
+        return []
+    literals = []
+    literal = ""
+    for opcode, value in parsed:
+        if opcode == sre_constants.LITERAL:
+            literal += chr(value)
+            continue
+        literals.append(literal)
+        literal = ""
+    literals.append(literal)
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def get_regex_subpatterns(opcode: Any, value: Any) -> List[Any]:
+    """Returns the subpatterns nested in a regex node"""
+    if opcode == sre_constants.SUBPATTERN:
+        return [value[-1]]
+    if opcode == sre_constants.BRANCH:
+        return list(value[1])
+    if opcode in [sre_constants.ASSERT, sre_constants.ASSERT_NOT]:
+        return [value[1]]
+    if opcode == sre_constants.GROUPREF_EXISTS:
+        return [pattern for pattern in value[1:] if pattern is not None]
+    if opcode == getattr(sre_constants, "ATOMIC_GROUP", None):
+        return [value]
+    return []
+
+
+# the characters tried when comparing character sets, along with the literals and the
+# range bounds of the regex: two ranges overlap only if a bound of one is in the other
+REGEX_SAMPLE_CHARACTERS = "".join(map(chr, range(0x300))) + "\u00a0\u2003ßжΩ中٣"
+REGEX_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: re.compile(r"\d"),
+    sre_constants.CATEGORY_NOT_DIGIT: re.compile(r"\D"),
+    sre_constants.CATEGORY_SPACE: re.compile(r"\s"),
+    sre_constants.CATEGORY_NOT_SPACE: re.compile(r"\S"),
+    sre_constants.CATEGORY_WORD: re.compile(r"\w"),
+    sre_constants.CATEGORY_NOT_WORD: re.compile(r"\W"),
+}
+
+
+def get_regex_characters(parsed: Any) -> str:
+    """Returns the literal characters and the range bounds of a parsed regex"""
+    characters = ""
+    for opcode, value in parsed:
+        if opcode in [sre_constants.LITERAL, sre_constants.NOT_LITERAL]:
+            characters += chr(value)
+        elif opcode == sre_constants.RANGE:
+            characters += chr(value[0]) + chr(value[1])
+        elif opcode == sre_constants.IN:
+            characters += get_regex_characters(value)
+        elif opcode in REGEX_REPEATS:
+            characters += get_regex_characters(value[2])
+        for subpattern in get_regex_subpatterns(opcode, value):
+            characters += get_regex_characters(subpattern)
+    return characters
+
+
+class RepeatsChecker:
+    """Finds the repeats of a regex that make its backtracking catastrophic.
+
+    A repeat nested in an unbounded repeat is ambiguous when the text it matches
+    could be matched by what follows it too, the next outer iteration included, like
+    (a+)+ or (\\w+\\s?)+: there are exponentially many ways to split the text
+    between them. (\\w+\\s)+ isn't, as \\w+ has to stop where \\s starts."""
+
+    def __init__(self, parsed: Any) -> None:
+        """Initializes the checker of a parsed regex"""
+        self.parsed = parsed
+        self.ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+        self.alphabet = frozenset(
+            REGEX_SAMPLE_CHARACTERS + get_regex_characters(parsed)
+        )
+
+    def matches_character(  # pylint: disable=too-many-return-statements
+        self, opcode: Any, value: Any, character: str
+    ) -> bool:
+        """Checks if a node matching a single character matches the given one"""
+        if opcode == sre_constants.LITERAL:
+            return character == chr(value)
+        if opcode == sre_constants.NOT_LITERAL:
+            return character != chr(value)
+        if opcode == sre_constants.RANGE:
+            return value[0] <= ord(character) <= value[1]
+        if opcode == sre_constants.CATEGORY:
+            if value not in REGEX_CATEGORIES:
+                return True
+            return REGEX_CATEGORIES[value].match(character) is not None
+        if opcode == sre_constants.IN:
+            negate = bool(value) and value[0][0] == sre_constants.NEGATE
+            items = value[1:] if negate else value
+            return negate != any(
+                self.matches_character(item_opcode, item_value, character)
+                for item_opcode, item_value in items
+            )
+        return True  # ANY
+
+    def get_characters(self, opcode: Any, value: Any) -> frozenset:
+        """Returns the characters matched by a node matching a single character"""
+        return frozenset(
+            character
+            for character in self.alphabet
+            if any(
+                self.matches_character(opcode, value, variant)
+                for variant in (
+                    {character, character.lower(), character.upper()}
+                    if self.ignore_case
+                    else {character}
+                )
+            )
+        )
+
+    def get_first(self, parsed: Any) -> Tuple[frozenset, bool]:
+        """Returns the characters a match of a sequence can start with, and whether
+        it can match an empty string"""
+        first: frozenset = frozenset()
+        for opcode, value in parsed:
+            node_first, nullable = self.get_node_first(opcode, value)
+            first |= node_first
+            if not nullable:
+                return first, False
+        return first, True
+
+    def get_node_first(self, opcode: Any, value: Any) -> Tuple[frozenset, bool]:
+        """Returns the characters a match of a node can start with, and whether it
+        can match an empty string"""
+        if opcode in [
+            sre_constants.LITERAL,
+            sre_constants.NOT_LITERAL,
+            sre_constants.IN,
+            sre_constants.ANY,
+        ]:
+            return self.get_characters(opcode, value), False
+        if opcode in REGEX_REPEATS:
+            first, nullable = self.get_first(value[2])
+            return first, nullable or value[0] == 0
+        if opcode in [sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT]:
+            return frozenset(), True
+        if opcode == sre_constants.GROUPREF_EXISTS and value[2] is None:
+            first, _ = self.get_first(value[1])
+            return first, True
+        subpatterns = get_regex_subpatterns(opcode, value)
+        if not subpatterns:
+            # a backreference, or something unknown: it may match anything
+            return self.alphabet, True
+        firsts = [self.get_first(subpattern) for subpattern in subpatterns]
+        return (
+            frozenset().union(*(first for first, _ in firsts)),
+            any(nullable for _, nullable in firsts),
+        )
+
+    def has_ambiguous_repeats(
+        self, parsed: Any, follow: frozenset = frozenset(), nested: bool = False
+    ) -> bool:
+        """Checks if a sequence has an ambiguous repeat, the follow is what can come
+        after it and nested tells if it's repeated by an unbounded repeat"""
+        for index, (opcode, value) in enumerate(parsed):
+            rest_first, rest_nullable = self.get_first(parsed[index + 1 :])
+            node_follow = rest_first | follow if rest_nullable else rest_first
+            if opcode not in REGEX_REPEATS:
+                for subpattern in get_regex_subpatterns(opcode, value):
+                    if self.has_ambiguous_repeats(subpattern, node_follow, nested):
+                        return True
+                continue
+            unbounded = value[1] > 1
+            body_first, _ = self.get_first(value[2])
+            if unbounded and nested and body_first & node_follow:
+                return True
+            # inside an unbounded repeat, its next iteration can follow too
+            if self.has_ambiguous_repeats(
+                value[2],
+                node_follow | body_first if unbounded else node_follow,
+                nested or unbounded,
+            ):
+                return True
+        return False
+
+
+# pylint: enable=no-member
+
+
+def regex_substitution(old: str, new: str, text: str, max_replace: int) -> str:
+    """Performs a regex substitution"""
+    return compile_regex(old).sub(new, text, count=max_replace)
+
+
+def run_sandbox_worker(
+    connection: Connection, parent_connection: Connection, tasks: Dict[str, Callable]
+) -> None:
+    """Sandbox worker main loop: runs the tasks it receives and sends back their
+    results, until the pipe gets closed"""
+    parent_connection.close()
+    while True:
+        try:
+            task_name, args = connection.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            result = (True, tasks[task_name](*args))
+        except Exception as error:  # pylint: disable=broad-except
+            result = (False, str(error))
+        connection.send(result)
+
+
+class RegexSandbox:
+    """Pool of pre-forked processes running the regex work with a hard time limit.
+
+    Every process gets its own pool, forked the first time it needs it, so the
+    workers inherit the already loaded bot. A worker that exceeds the time limit is
+    killed and replaced, and its pattern is blacklisted; patterns with ambiguous
+    nested repeats are refused upfront."""
+
+    def __init__(self) -> None:
+        """Initializes the regex sandbox"""
+        self.tasks: Dict[str, Callable] = {"substitution": regex_substitution}
+        self.lock = threading.Lock()
+        self.idle_workers: List[Tuple[multiprocessing.Process, Connection]] = []
+        self.blacklist: OrderedDict = OrderedDict()
+        os.register_at_fork(after_in_child=self.reset_workers)
+
+    def reset_workers(self) -> None:
+        """Resets the pool in a forked process, the workers belong to the parent"""
+        self.lock = threading.Lock()
+        self.idle_workers = []
+
+    def register(self, task_name: str, task: Callable) -> None:
+        """Registers a task, the workers take the pattern as first argument"""
+        self.tasks[task_name] = task
+
+    def is_regex_safe(self, regex: str) -> bool:
+        """Checks if a regex can be run"""
+        with self.lock:
+            if regex in self.blacklist:
+                return False
+        parsed = parse_regex(regex)
+        return parsed is not None and not RepeatsChecker(parsed).has_ambiguous_repeats(
+            parsed
+        )
+
+    def blacklist_regex(self, regex: str) -> None:
+        """Blacklists a regex that exceeded the time limit"""
+        with self.lock:
+            self.blacklist[regex] = True
+            if len(self.blacklist) > REGEX_BLACKLIST_SIZE:
+                self.blacklist.popitem(last=False)
+
+    def start_worker(self) -> Tuple[multiprocessing.Process, Connection]:
+        """Forks a new worker"""
+        connection, worker_connection = multiprocessing.Pipe()
+        worker = multiprocessing.Process(
+            target=run_sandbox_worker,
+            args=(worker_connection, connection, self.tasks),
+            daemon=True,
+        )
+        worker.start()
+        worker_connection.close()
+        return worker, connection
+
+    def get_worker(self) -> Tuple[multiprocessing.Process, Connection]:
+        """Returns an idle worker of the current process, forking one if needed"""
+        with self.lock:
+            if self.idle_workers:
+                return self.idle_workers.pop()
+        return self.start_worker()
+
+    def release_worker(
+        self, worker: Tuple[multiprocessing.Process, Connection]
+    ) -> None:
+        """Puts back a worker in the pool, or stops it if the pool is full"""
+        with self.lock:
+            if len(self.idle_workers) < REGEX_SANDBOX_WORKERS:
+                self.idle_workers.append(worker)
+                return
+        worker[1].close()
+        worker[0].join()
+
+    def run(
+        self,
+        task_name: str,
+        regex: str,
+        *args: Any,
+        timeout: float = REGEX_SANDBOX_TIMEOUT,
+    ) -> Optional[Any]:
+        """Runs a task in the sandbox, returns None if it fails or takes too long"""
+        if not self.is_regex_safe(regex):
+            logging.warning("Refusing to run the unsafe regex %s", regex)
+            return None
+        worker = self.get_worker()
+        process, connection = worker
+        try:
+            connection.send((task_name, (regex,) + args))
+            if not connection.poll(timeout):
+                logging.warning("Killing regex sandbox worker: %s timed out", regex)
+                self.blacklist_regex(regex)
+                process.kill()
+                process.join()
+                connection.close()
+                return None
+            success, result = connection.recv()
+        except (EOFError, OSError) as error:
+            logging.error("Regex sandbox worker died")
+            logging.error(error)
+            process.kill()
+            process.join()
+            connection.close()
+            return None
+        self.release_worker(worker)
+        if not success:
+            logging.error("Regex sandbox task %s failed: %s", task_name, result)
+            return None
+        return result
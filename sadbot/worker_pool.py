@@ -0,0 +1,73 @@
+"""This module contains the WorkerPool class"""
+
+import logging
+import multiprocessing
+import time
+from typing import Any, Callable, List, Optional
+
+
+class WorkerPool:
+    """A fixed size pool of long-lived worker processes.
+
+    The workers are forked once, so they inherit an already warm interpreter (with
+    the commands loaded), and then keep pulling jobs from a shared queue. A job that
+    runs for longer than the given timeout gets its worker killed and replaced."""
+
+    def __init__(
+        self, target: Callable[[Any], None], workers_number: int, job_timeout: int
+    ) -> None:
+        """Initializes the worker pool"""
+        self.target = target
+        self.workers_number = max(1, workers_number)
+        self.job_timeout = job_timeout
+        self.jobs: multiprocessing.Queue = multiprocessing.Queue()
+        # start time of the job each worker is processing, 0 when it's idle
+        self.jobs_start_times = multiprocessing.Array("d", self.workers_number)
+        self.workers: List[Optional[multiprocessing.Process]] = [
+            None
+        ] * self.workers_number
+
+    def start(self) -> None:
+        """Starts the workers"""
+        for worker_index in range(self.workers_number):
+            self.start_worker(worker_index)
+
+    def start_worker(self, worker_index: int) -> None:
+        """Starts (or restarts) a single worker"""
+        self.jobs_start_times[worker_index] = 0
+        # not a daemon: the commands fork their own processes, like sed does
+        worker = multiprocessing.Process(target=self.work, args=(worker_index,))
+        worker.start()
+        self.workers[worker_index] = worker
+
+    def submit(self, job: Any) -> None:
+        """Submits a new job to the pool"""
+        self.jobs.put(job)
+
+    def work(self, worker_index: int) -> None:
+        """Worker main loop: processes the jobs one by one"""
+        while True:
+            job = self.jobs.get()
+            self.jobs_start_times[worker_index] = time.time()
+            try:
+                self.target(job)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("An error occurred processing a job")
+            self.jobs_start_times[worker_index] = 0
+
+    def supervise(self) -> None:
+        """Kills and replaces the workers that are stuck or dead"""
+        now = time.time()
+        for worker_index, worker in enumerate(self.workers):
+            if worker is None:
+                continue
+            start_time = self.jobs_start_times[worker_index]
+            if worker.is_alive() and (
+                start_time == 0 or now - start_time < self.job_timeout
+            ):
+                continue
+            if worker.is_alive():
+                logging.warning("Killing worker %s: job timeout exceeded", worker_index)
+                worker.kill()
+            worker.join()
+            self.start_worker(worker_index)